@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Ablaufplan fuer die Vorbereitung der Exportabschnitte
+  =====================================================
+
+  Die Abschnitte des Exports werden weiterhin nacheinander in die HE-Datenbank geschrieben, damit
+  die Vergabe der IDs unveraendert bleibt. Vorbereitende Arbeiten auf der QKan-Datenbank, von denen
+  keine anderen Abschnitte abhaengen (z.B. die Verschneidung der Flaechen), koennen dagegen als
+  Aufgaben in einem Ablaufplan beschrieben werden. Jede Aufgabe laeuft in einem eigenen Thread,
+  sobald die Aufgaben, von denen sie abhaengt, abgeschlossen sind. Der Export holt das Ergebnis mit
+  ergebnis() ab, wenn er den betreffenden Abschnitt erreicht.
+
+  Am Ende jedes Exports, auch nach einem Fehler, wird beenden() aufgerufen: Es werden keine weiteren
+  Aufgaben gestartet und die laufenden abgewartet, bevor aufgeraeumt wird.
+
+  Eine Aufgabe muss eine eigene Verbindung zur QKan-Datenbank oeffnen, weil eine SpatiaLite-
+  Verbindung nur in dem Thread verwendet werden kann, in dem sie geoeffnet wurde.
+
+  | Dateiname            : abschnittsplan.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger('QKan')
+
+
+class _Aufgabe(object):
+
+    def __init__(self, name, funktion, abhaengig):
+        self.name = name
+        self.funktion = funktion
+        self.abhaengig = tuple(abhaengig)
+        self.gestartet = False
+        self.fertig = False
+        self.ergebnis = None
+        self.fehler = None
+        self.dauer = 0.
+
+
+class Abschnittsplan(object):
+    """Abhaengigkeitsgraph vorbereitender Aufgaben, die parallel zum Export ausgefuehrt werden.
+
+    :threads:       Hoechstzahl gleichzeitig laufender Aufgaben
+    :type threads:  Integer
+    """
+
+    def __init__(self, threads=2):
+        self.threads = max(1, threads)
+        self.aufgaben = {}
+        self._bedingung = threading.Condition()
+        self._laufend = 0
+        self._threads = []
+        self._beendet = False
+
+    def hinzufuegen(self, name, funktion, abhaengig=()):
+        """Fuegt eine Aufgabe hinzu. funktion wird ohne Argumente aufgerufen, ihr Rueckgabewert ist
+        das Ergebnis der Aufgabe. abhaengig enthaelt die Namen der Aufgaben, die vorher abgeschlossen
+        sein muessen."""
+        for vorher in abhaengig:
+            if vorher not in self.aufgaben:
+                raise ValueError(u'Abschnittsplan: Aufgabe {} haengt von unbekannter Aufgabe {} ab'.format(
+                    name, vorher))
+        self.aufgaben[name] = _Aufgabe(name, funktion, abhaengig)
+
+    def enthaelt(self, name):
+        return name in self.aufgaben
+
+    def starten(self):
+        """Startet alle Aufgaben, deren Abhaengigkeiten erfuellt sind."""
+        with self._bedingung:
+            self._starten()
+
+    def _starten(self):
+        if self._beendet:
+            return
+        for aufgabe in self.aufgaben.values():
+            if self._laufend >= self.threads:
+                return
+            if aufgabe.gestartet:
+                continue
+            if all(self.aufgaben[vorher].fertig for vorher in aufgabe.abhaengig):
+                aufgabe.gestartet = True
+                self._laufend += 1
+                thread = threading.Thread(target=self._ausfuehren, args=(aufgabe,),
+                                          name=u'QKan-{}'.format(aufgabe.name))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+
+    def _ausfuehren(self, aufgabe):
+        start = time.time()
+        try:
+            fehlgeschlagen = [vorher for vorher in aufgabe.abhaengig if self.aufgaben[vorher].fehler]
+            if fehlgeschlagen:
+                raise RuntimeError(u'Abschnittsplan: {} abgebrochen, weil {} fehlgeschlagen ist'.format(
+                    aufgabe.name, u', '.join(fehlgeschlagen)))
+            aufgabe.ergebnis = aufgabe.funktion()
+        except BaseException as err:
+            aufgabe.fehler = err
+            logger.debug(u'abschnittsplan: Aufgabe {} fehlgeschlagen: {}'.format(aufgabe.name, err))
+        aufgabe.dauer = time.time() - start
+        with self._bedingung:
+            aufgabe.fertig = True
+            self._laufend -= 1
+            self._starten()
+            self._bedingung.notify_all()
+        logger.debug(u'abschnittsplan: Aufgabe {} nach {:.2f} s abgeschlossen'.format(aufgabe.name, aufgabe.dauer))
+
+    def ergebnis(self, name):
+        """Wartet auf den Abschluss einer Aufgabe und liefert ihr Ergebnis. Ist die Aufgabe
+        fehlgeschlagen, wird deren Fehler ausgeloest."""
+        aufgabe = self.aufgaben[name]
+        with self._bedingung:
+            if not aufgabe.gestartet:
+                self._starten()
+            if not aufgabe.gestartet and self._beendet:
+                raise RuntimeError(u'Abschnittsplan: {} wurde nach dem Beenden nicht mehr gestartet'.format(name))
+            while not aufgabe.fertig:
+                self._bedingung.wait()
+        if aufgabe.fehler is not None:
+            raise aufgabe.fehler
+        return aufgabe.ergebnis
+
+    def beenden(self):
+        """Startet keine weiteren Aufgaben und wartet, bis die laufenden abgeschlossen sind. Danach
+        greift keine Aufgabe mehr auf die QKan-Datenbank zu."""
+        with self._bedingung:
+            self._beendet = True
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join()
@@ -21,7 +21,7 @@
 
 """
 from PyQt4.QtCore import QSettings, QTranslator, qVersion, QCoreApplication
-from PyQt4.QtGui import QAction, QIcon, QFileDialog, QListWidgetItem
+from PyQt4.QtGui import QAction, QIcon, QFileDialog, QListWidgetItem, QProgressBar, QPushButton
 # Initialize Qt resources from file resources.py
 import resources_rc
 # Import the code for the dialog
@@ -32,10 +32,11 @@ import site, os.path
 import json
 import logging
 
-# from qgis.gui import QgsMessageBar
+from qgis.gui import QgsMessageBar
 from qgis.utils import iface
 from qgis.core import QgsProject, QgsMessageLog
-from k_qkhe import exportKanaldaten
+from export_task import ExportTask
+from exportoptionen import STANDARD_OPTIONEN, ZUSATZOPTIONEN
 from QKan_Database.qgis_utils import get_database_QKan, get_editable_layers
 from QKan_Database.dbfunc import DBConnection
 import codecs
@@ -90,6 +91,9 @@ class ExportToHE:
         self.toolbar = self.iface.addToolBar(u'ExportToHE')
         self.toolbar.setObjectName(u'ExportToHE')
 
+        # Laufender Export im Hintergrund
+        self.task = None
+
         # Anfang Eigene Funktionen -------------------------------------------------
         # (jh, 08.02.2017)
 
@@ -160,58 +164,58 @@ class ExportToHE:
 
         # Eigene Funktion für die zahlreichen Checkboxen
 
-        def cb_set(name, cbox, default):
+        def cb_set(name, cbox):
             if name in self.config:
                 checked = self.config[name]
             else:
-                checked = default
+                checked = STANDARD_OPTIONEN[name]
             cbox.setChecked(checked)
             return checked
 
-        export_schaechte =          cb_set('export_schaechte',          self.dlg.cb_export_schaechte, True)
-        export_auslaesse =          cb_set('export_auslaesse',          self.dlg.cb_export_auslaesse, True)
-        export_speicher =           cb_set('export_speicher',           self.dlg.cb_export_speicher, True)
-        export_haltungen =          cb_set('export_haltungen',          self.dlg.cb_export_haltungen, True)
-        export_pumpen =             cb_set('export_pumpen',             self.dlg.cb_export_pumpen, False)
-        export_wehre =              cb_set('export_wehre',              self.dlg.cb_export_wehre, False)
-        export_flaechenrw =         cb_set('export_flaechenrw',         self.dlg.cb_export_flaechenrw, True)
-        export_flaechensw =         cb_set('export_flaechensw',         self.dlg.cb_export_flaechensw, True)
-        export_abflussparameter =   cb_set('export_abflussparameter',   self.dlg.cb_export_abflussparameter, True)
-        export_regenschreiber =     cb_set('export_regenschreiber',     self.dlg.cb_export_regenschreiber, False)
-        export_rohrprofile =        cb_set('export_rohrprofile',        self.dlg.cb_export_rohrprofile, False)
-        export_speicherkennlinien = cb_set('export_speicherkennlinien', self.dlg.cb_export_speicherkennlinien, False)
-        export_bodenklassen =       cb_set('export_bodenklassen',       self.dlg.cb_export_bodenklassen, False)
-
-        modify_schaechte =          cb_set('modify_schaechte',          self.dlg.cb_modify_schaechte, False)
-        modify_auslaesse =          cb_set('modify_auslaesse',          self.dlg.cb_modify_auslaesse, False)
-        modify_speicher =           cb_set('modify_speicher',           self.dlg.cb_modify_speicher, False)
-        modify_haltungen =          cb_set('modify_haltungen',          self.dlg.cb_modify_haltungen, False)
-        modify_pumpen =             cb_set('modify_pumpen',             self.dlg.cb_modify_pumpen, False)
-        modify_wehre =              cb_set('modify_wehre',              self.dlg.cb_modify_wehre, False)
-        modify_flaechenrw =         cb_set('modify_flaechenrw',         self.dlg.cb_modify_flaechenrw, False)
-        modify_flaechensw =         cb_set('modify_flaechensw',         self.dlg.cb_modify_flaechensw, False)
-        modify_abflussparameter =   cb_set('modify_abflussparameter',   self.dlg.cb_modify_abflussparameter, False)
-        modify_regenschreiber =     cb_set('modify_regenschreiber',     self.dlg.cb_modify_regenschreiber, False)
-        modify_rohrprofile =        cb_set('modify_rohrprofile',        self.dlg.cb_modify_rohrprofile, False)
-        modify_speicherkennlinien = cb_set('modify_speicherkennlinien', self.dlg.cb_modify_speicherkennlinien, False)
-        modify_bodenklassen =       cb_set('modify_bodenklassen',       self.dlg.cb_modify_bodenklassen, False)
-
-        init_schaechte =            cb_set('init_schaechte',            self.dlg.cb_init_schaechte, False)
-        init_auslaesse =            cb_set('init_auslaesse',            self.dlg.cb_init_auslaesse, False)
-        init_speicher =             cb_set('init_speicher',             self.dlg.cb_init_speicher, False)
-        init_haltungen =            cb_set('init_haltungen',            self.dlg.cb_init_haltungen, False)
-        init_pumpen =               cb_set('init_pumpen',               self.dlg.cb_init_pumpen, False)
-        init_wehre =                cb_set('init_wehre',                self.dlg.cb_init_wehre, False)
-        init_flaechenrw =           cb_set('init_flaechenrw',           self.dlg.cb_init_flaechenrw, False)
-        init_flaechensw =           cb_set('init_flaechensw',           self.dlg.cb_init_flaechensw, False)
-        init_abflussparameter =     cb_set('init_abflussparameter',     self.dlg.cb_init_abflussparameter, False)
-        init_regenschreiber =       cb_set('init_regenschreiber',       self.dlg.cb_init_regenschreiber, False)
-        init_rohrprofile =          cb_set('init_rohrprofile',          self.dlg.cb_init_rohrprofile, False)
-        init_speicherkennlinien =   cb_set('init_speicherkennlinien',   self.dlg.cb_init_speicherkennlinien, False)
-        init_bodenklassen =         cb_set('init_bodenklassen',         self.dlg.cb_init_bodenklassen, False)
-
-        export_difftezg =           cb_set('export_difftezg',           self.dlg.cb_export_difftezg, True)
-        export_verschneidung =      cb_set('export_verschneidung',      self.dlg.cb_export_verschneidung, True)
+        export_schaechte =          cb_set('export_schaechte',          self.dlg.cb_export_schaechte)
+        export_auslaesse =          cb_set('export_auslaesse',          self.dlg.cb_export_auslaesse)
+        export_speicher =           cb_set('export_speicher',           self.dlg.cb_export_speicher)
+        export_haltungen =          cb_set('export_haltungen',          self.dlg.cb_export_haltungen)
+        export_pumpen =             cb_set('export_pumpen',             self.dlg.cb_export_pumpen)
+        export_wehre =              cb_set('export_wehre',              self.dlg.cb_export_wehre)
+        export_flaechenrw =         cb_set('export_flaechenrw',         self.dlg.cb_export_flaechenrw)
+        export_flaechensw =         cb_set('export_flaechensw',         self.dlg.cb_export_flaechensw)
+        export_abflussparameter =   cb_set('export_abflussparameter',   self.dlg.cb_export_abflussparameter)
+        export_regenschreiber =     cb_set('export_regenschreiber',     self.dlg.cb_export_regenschreiber)
+        export_rohrprofile =        cb_set('export_rohrprofile',        self.dlg.cb_export_rohrprofile)
+        export_speicherkennlinien = cb_set('export_speicherkennlinien', self.dlg.cb_export_speicherkennlinien)
+        export_bodenklassen =       cb_set('export_bodenklassen',       self.dlg.cb_export_bodenklassen)
+
+        modify_schaechte =          cb_set('modify_schaechte',          self.dlg.cb_modify_schaechte)
+        modify_auslaesse =          cb_set('modify_auslaesse',          self.dlg.cb_modify_auslaesse)
+        modify_speicher =           cb_set('modify_speicher',           self.dlg.cb_modify_speicher)
+        modify_haltungen =          cb_set('modify_haltungen',          self.dlg.cb_modify_haltungen)
+        modify_pumpen =             cb_set('modify_pumpen',             self.dlg.cb_modify_pumpen)
+        modify_wehre =              cb_set('modify_wehre',              self.dlg.cb_modify_wehre)
+        modify_flaechenrw =         cb_set('modify_flaechenrw',         self.dlg.cb_modify_flaechenrw)
+        modify_flaechensw =         cb_set('modify_flaechensw',         self.dlg.cb_modify_flaechensw)
+        modify_abflussparameter =   cb_set('modify_abflussparameter',   self.dlg.cb_modify_abflussparameter)
+        modify_regenschreiber =     cb_set('modify_regenschreiber',     self.dlg.cb_modify_regenschreiber)
+        modify_rohrprofile =        cb_set('modify_rohrprofile',        self.dlg.cb_modify_rohrprofile)
+        modify_speicherkennlinien = cb_set('modify_speicherkennlinien', self.dlg.cb_modify_speicherkennlinien)
+        modify_bodenklassen =       cb_set('modify_bodenklassen',       self.dlg.cb_modify_bodenklassen)
+
+        init_schaechte =            cb_set('init_schaechte',            self.dlg.cb_init_schaechte)
+        init_auslaesse =            cb_set('init_auslaesse',            self.dlg.cb_init_auslaesse)
+        init_speicher =             cb_set('init_speicher',             self.dlg.cb_init_speicher)
+        init_haltungen =            cb_set('init_haltungen',            self.dlg.cb_init_haltungen)
+        init_pumpen =               cb_set('init_pumpen',               self.dlg.cb_init_pumpen)
+        init_wehre =                cb_set('init_wehre',                self.dlg.cb_init_wehre)
+        init_flaechenrw =           cb_set('init_flaechenrw',           self.dlg.cb_init_flaechenrw)
+        init_flaechensw =           cb_set('init_flaechensw',           self.dlg.cb_init_flaechensw)
+        init_abflussparameter =     cb_set('init_abflussparameter',     self.dlg.cb_init_abflussparameter)
+        init_regenschreiber =       cb_set('init_regenschreiber',       self.dlg.cb_init_regenschreiber)
+        init_rohrprofile =          cb_set('init_rohrprofile',          self.dlg.cb_init_rohrprofile)
+        init_speicherkennlinien =   cb_set('init_speicherkennlinien',   self.dlg.cb_init_speicherkennlinien)
+        init_bodenklassen =         cb_set('init_bodenklassen',         self.dlg.cb_init_bodenklassen)
+
+        export_difftezg =           cb_set('export_difftezg',           self.dlg.cb_export_difftezg)
+        export_verschneidung =      cb_set('export_verschneidung',      self.dlg.cb_export_verschneidung)
 
         # Ende Eigene Funktionen ---------------------------------------------------
 
@@ -545,6 +549,45 @@ class ExportToHE:
             liste.append(elem.text())
         return liste
 
+    # -------------------------------------------------------------------------
+    # Export im Hintergrund mit Fortschrittsanzeige in der Meldungsleiste
+
+    def exportStarten(self, *args):
+        """Startet exportKanaldaten in einem Hintergrund-Thread
+
+        :param args: Argumente fuer exportKanaldaten
+        :type args: tuple
+        """
+        meldung = iface.messageBar().createMessage(u'Export nach HE', u'Datenexport läuft...')
+        self.progress = QProgressBar()
+        self.progress.setMaximum(100)
+        abbrechen = QPushButton(u'Abbrechen')
+        meldung.layout().addWidget(self.progress)
+        meldung.layout().addWidget(abbrechen)
+        self.meldung = iface.messageBar().pushWidget(meldung, QgsMessageBar.INFO)
+
+        self.task = ExportTask(*args)
+        abbrechen.clicked.connect(self.task.abbrechen)
+        self.task.fortschrittGemeldet.connect(self.exportFortschritt)
+        self.task.meldungGemeldet.connect(self.exportMeldung)
+        self.task.exportBeendet.connect(self.exportBeendet)
+        self.task.start()
+
+    def exportFortschritt(self, text, prozent):
+        """Zeigt den Fortschritt des Exports an (im GUI-Thread)"""
+        if prozent > 0:
+            self.progress.setValue(max(self.progress.value(), min(int(prozent * 100), 100)))
+
+    def exportMeldung(self, title, text, level, dauer):
+        """Zeigt eine Meldung des Exports in der Meldungsleiste an (im GUI-Thread)"""
+        iface.messageBar().pushMessage(title, text, level=level, duration=dauer)
+
+    def exportBeendet(self, erfolg):
+        """Entfernt die Fortschrittsanzeige nach Ende des Exports (im GUI-Thread)"""
+        iface.messageBar().popWidget(self.meldung)
+        self.task.wait()
+        self.task = None
+
 
     # Ende Eigene Funktionen ---------------------------------------------------
 
@@ -553,6 +596,11 @@ class ExportToHE:
         """Run method that performs all the real work"""
         # show the dialog
 
+        if self.task is not None:
+            iface.messageBar().pushMessage(u"Bedienerfehler: ",
+                   u'Es läuft bereits ein Export nach HE.', level=QgsMessageBar.WARNING, duration=5)
+            return False
+
         # Check, ob die relevanten Layer nicht editable sind.
         if len({'flaechen', 'haltungen', 'linkfl', 'tezg', 'schaechte'} & get_editable_layers()) > 0:
             iface.messageBar().pushMessage(u"Bedienerfehler: ", 
@@ -716,6 +764,11 @@ class ExportToHE:
             check_export['export_difftezg'] = self.dlg.cb_export_difftezg.isChecked()
             check_export['export_verschneidung'] = self.dlg.cb_export_verschneidung.isChecked()
 
+            # Weitere Optionen ohne Formularelement, nur über qkan.json einstellbar (siehe exportoptionen.py)
+            for el, standard, beschreibung in ZUSATZOPTIONEN:
+                if el in self.config:
+                    check_export[el] = self.config[el]
+
             # Konfigurationsdaten schreiben
             self.config['database_HE'] = database_HE
             self.config['dbtemplate_HE'] = dbtemplate_HE
@@ -730,5 +783,6 @@ class ExportToHE:
                 fileconfig.write(json.dumps(self.config))
 
 
-            exportKanaldaten(iface, database_HE, dbtemplate_HE, database_Qkan, liste_teilgebiete, 
-                             0.1, datenbanktyp, check_export)
+            # Der Export laeuft im Hintergrund, damit QGIS bedienbar bleibt.
+            self.exportStarten(iface, database_HE, dbtemplate_HE, database_Qkan, liste_teilgebiete,
+                               0.1, datenbanktyp, check_export)
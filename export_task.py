@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Export im Hintergrund
+  =====================
+
+  Fuehrt exportKanaldaten in einem eigenen Thread aus, damit QGIS waehrend des Exports bedienbar
+  bleibt. Fortschritts- und Fehlermeldungen werden ueber Signale an den GUI-Thread weitergereicht,
+  ein Abbruch wird vor jedem geschriebenen Block geprueft.
+
+  | Dateiname            : export_task.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import logging
+
+from PyQt4.QtCore import QThread, pyqtSignal
+
+import k_qkhe
+
+logger = logging.getLogger('QKan')
+
+
+class ExportTask(QThread):
+    """Hintergrund-Thread fuer exportKanaldaten.
+
+    Die Argumente werden unveraendert an exportKanaldaten uebergeben. Der Thread dient waehrend
+    des Exports als Empfaenger der Meldungen (k_qkhe.empfaenger_setzen), die Signale werden im
+    GUI-Thread verarbeitet.
+    """
+
+    fortschrittGemeldet = pyqtSignal(str, float)
+    meldungGemeldet = pyqtSignal(str, str, int, int)
+    exportBeendet = pyqtSignal(bool)
+
+    def __init__(self, *args, **kwargs):
+        QThread.__init__(self)
+        self.args = args
+        self.kwargs = kwargs
+        self.ergebnis = False
+        self._abgebrochen = False
+
+    def run(self):
+        k_qkhe.empfaenger_setzen(self)
+        try:
+            self.ergebnis = k_qkhe.exportKanaldaten(*self.args, **self.kwargs) is True
+        except BaseException as err:
+            logger.exception(u'export_task: Export mit Fehler beendet: {}'.format(err))
+            self.ergebnis = False
+        finally:
+            k_qkhe.empfaenger_setzen(None)
+        self.exportBeendet.emit(self.ergebnis)
+
+    def abbrechen(self):
+        """Fordert den Abbruch an. Der Export wird vor dem naechsten Block zurueckgerollt."""
+        self._abgebrochen = True
+
+    # Schnittstelle fuer k_qkhe
+
+    def abgebrochen(self):
+        return self._abgebrochen
+
+    def fortschritt(self, text, prozent):
+        self.fortschrittGemeldet.emit(text, prozent)
+
+    def fehlermeldung(self, title, text, dauer):
+        self.meldungGemeldet.emit(title, u'{}'.format(text), k_qkhe.QgsMessageBar.CRITICAL, dauer)
+
+    def meldung(self, title, text, level, dauer):
+        self.meldungGemeldet.emit(title, u'{}'.format(text), level, dauer)
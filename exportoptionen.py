@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Exportoptionen
+  ==============
+
+  Tabelle der Exportoptionen (check_export) mit ihren Standardwerten. Sie wird vom Formular
+  (application.py), von der Kommandozeile (k_qkhe_cli.py) und vom Stapelexport (k_qkhe_batch.py)
+  verwendet, exportKanaldaten ergaenzt fehlende Optionen daraus. Das Modul benoetigt kein QGIS.
+
+  | Dateiname            : exportoptionen.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+# Abschnitte mit den Optionen export_<abschnitt>, modify_<abschnitt> und init_<abschnitt> und dem
+# Standardwert von export_<abschnitt> (modify_* und init_*: False). Im Formular hat jede dieser
+# Optionen ein Kontrollkaestchen.
+ABSCHNITTE = (
+    ('schaechte', True),
+    ('auslaesse', True),
+    ('speicher', True),
+    ('haltungen', True),
+    ('pumpen', False),
+    ('wehre', False),
+    ('flaechenrw', True),
+    ('flaechensw', True),
+    ('abflussparameter', True),
+    ('regenschreiber', False),
+    ('rohrprofile', False),
+    ('speicherkennlinien', False),
+    ('bodenklassen', False),
+)
+
+# Weitere Optionen mit Kontrollkaestchen im Formular: Name, Standardwert, Beschreibung
+FORMULAROPTIONEN = (
+    ('export_difftezg', True, u'Unbefestigte Flaechen aus der Differenz zu den tezg-Flaechen erzeugen'),
+    ('export_verschneidung', True, u'Aufzuteilende Flaechen mit den tezg-Flaechen verschneiden'),
+)
+
+# Optionen ohne Formularelement, nur ueber qkan.json bzw. k_qkhe_cli.py --option einstellbar:
+# Name, Standardwert, Beschreibung
+ZUSATZOPTIONEN = (
+    ('commitintervall', 0, u'Commit nach jeweils n geschriebenen Datensaetzen (0: ein Commit am Ende)'),
+    ('statistikdatei', None, u'Datei der Laufzeitstatistik, sonst <HE-Datenbank>_statistik.json'),
+    ('verschneidungscache', False, u'Verschneidungen in der QKan-Datenbank zwischenspeichern'),
+    ('geometrieprozesse', 0, u'Verschneidung mit shapely in n Prozessen (true: je Prozessor einer)'),
+    ('inkrementell', False, u'Nur die seit dem letzten Export geaenderten Objekte schreiben'),
+    ('vorlagencache', False, u'Vorbereitete Kopien der Vorlage verwenden (true oder Verzeichnis)'),
+    ('schnellinit', False, u'Tabellen der init_*-Optionen vor dem Export mit deaktivierten Indizes leeren'),
+    ('indexpause', False, u'Indizes der Zieltabellen waehrend des Ladens deaktivieren'),
+    ('pipeline', 0, u'Anzahl der Bloecke, die in einem eigenen Thread geschrieben werden'),
+    ('parallele_vorbereitung', False, u'Raeumliche Indizes und Verschneidung parallel vorbereiten'),
+    ('hebackend', 'firebird', u'Ziel: firebird, sqlite (Ersatzdatenbank) oder skript (SQL-Skript)'),
+    ('skript_je_tabelle', False, u'Beim Backend skript ein Skript je Tabelle schreiben'),
+    ('executeblock', False, u'Mehrere Datensaetze je EXECUTE BLOCK an Firebird uebertragen'),
+)
+
+# Standardwerte aller Optionen: Vorhandene Daten werden weder geaendert noch geloescht, alle
+# Zusatzoptionen sind ausgeschaltet
+STANDARD_OPTIONEN = {}
+for _abschnitt, _export in ABSCHNITTE:
+    STANDARD_OPTIONEN['export_' + _abschnitt] = _export
+    STANDARD_OPTIONEN['modify_' + _abschnitt] = False
+    STANDARD_OPTIONEN['init_' + _abschnitt] = False
+for _name, _standard, _beschreibung in FORMULAROPTIONEN + ZUSATZOPTIONEN:
+    STANDARD_OPTIONEN[_name] = _standard
+
+
+def vervollstaendigen(check_export):
+    """Liefert die Exportoptionen, ergaenzt um die Standardwerte der nicht angegebenen Optionen.
+
+    :check_export:  Exportoptionen
+    :type check_export: Dictionary
+
+    :returns: Neues Dictionary mit allen Optionen aus STANDARD_OPTIONEN
+    """
+    optionen = dict(STANDARD_OPTIONEN)
+    optionen.update(check_export)
+    return optionen
+
+
+def beschreibung():
+    """Liefert die Zusatzoptionen mit Standardwert und Beschreibung als Text (z.B. fuer --help)."""
+    def _text(wert):
+        if isinstance(wert, bool):
+            return u'true' if wert else u'false'
+        return u'-' if wert is None else u'{}'.format(wert)
+    return u'\n'.join([u'  {:<24s} {} (Standard: {})'.format(name, text, _text(standard))
+                       for name, standard, text in ZUSATZOPTIONEN])
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Exportstand fuer den inkrementellen Export
+  ==========================================
+
+  Speichert fuer jede HE-Tabelle die Namen der zuletzt exportierten Objekte mit einer Pruefsumme
+  ihrer Werte. Beim inkrementellen Export werden nur Objekte eingefuegt, geaendert oder geloescht,
+  deren Pruefsumme sich gegenueber dem letzten Export geaendert hat.
+
+  Der Exportstand wird als JSON-Datei neben der HE-Datenbank gespeichert
+  (<ziel>_exportstand.json), weil er zum Inhalt dieser HE-Datenbank gehoert und eine
+  QKan-Datenbank in mehrere HE-Datenbanken exportiert werden kann.
+
+  | Dateiname            : exportstand.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import codecs
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger('QKan')
+
+
+def standdatei(database_HE):
+    """Dateiname des Exportstands zu einer HE-Datenbank."""
+    return u'{}_exportstand.json'.format(os.path.splitext(database_HE)[0])
+
+
+class Exportstand(object):
+    """Pruefsummen der exportierten Objekte je HE-Tabelle.
+
+    :dateiname:     JSON-Datei, in der der Exportstand gespeichert wird
+    :type dateiname: String
+
+    :vorlage:       Vorlage der HE-Datenbank. Ein Exportstand zu einer anderen Vorlage wird nicht
+                    verwendet.
+    :type vorlage:  String
+    """
+
+    VERSION = 1
+
+    def __init__(self, dateiname, vorlage=None):
+        self.dateiname = dateiname
+        self.vorlage = vorlage
+        self.tabellen = {}              # Stand des letzten Exports: Tabelle -> {Name: Pruefsumme}
+        self.neu = {}                   # Stand dieses Exports fuer die exportierten Tabellen
+
+    @staticmethod
+    def pruefsumme(werte):
+        """Pruefsumme eines Parametersatzes."""
+        return hashlib.md5(json.dumps(list(werte), default=str).encode('utf-8')).hexdigest()
+
+    def laden(self):
+        """Liest den Exportstand des letzten Exports.
+
+        :returns: False, wenn kein verwendbarer Exportstand vorhanden ist.
+        """
+        if not os.path.exists(self.dateiname):
+            return False
+        try:
+            with codecs.open(self.dateiname, 'r', 'utf-8') as datei:
+                daten = json.loads(datei.read())
+        except BaseException as err:
+            logger.warning(u'exportstand: {} kann nicht gelesen werden: {}'.format(self.dateiname, err))
+            return False
+        if daten.get('version') != self.VERSION or daten.get('vorlage') != self.vorlage:
+            logger.info(u'exportstand: {} gehoert zu einer anderen Version oder Vorlage'.format(self.dateiname))
+            return False
+        self.tabellen = daten.get('tabellen', {})
+        return True
+
+    def alt(self, tabelle, name):
+        """Pruefsumme des Objekts beim letzten Export oder None."""
+        return self.tabellen.get(tabelle, {}).get(name)
+
+    def merken(self, tabelle, name, pruefsumme):
+        """Vermerkt ein in diesem Export enthaltenes Objekt."""
+        self.neu.setdefault(tabelle, {})[name] = pruefsumme
+
+    def beginnen(self, tabelle):
+        """Setzt den Stand einer Tabelle fuer diesen Export zurueck."""
+        self.neu[tabelle] = {}
+
+    def entfernt(self, tabelle):
+        """Namen der Objekte, die beim letzten Export vorhanden waren und in diesem fehlen."""
+        neu = self.neu.get(tabelle, {})
+        return [name for name in self.tabellen.get(tabelle, {}) if name not in neu]
+
+    def speichern(self):
+        """Schreibt den Exportstand. Tabellen, die in diesem Export nicht geschrieben wurden,
+        behalten ihren bisherigen Stand."""
+        tabellen = dict(self.tabellen)
+        tabellen.update(self.neu)
+        with codecs.open(self.dateiname, 'w', 'utf-8') as datei:
+            datei.write(json.dumps({'version': self.VERSION, 'vorlage': self.vorlage, 'tabellen': tabellen}))
+        self.tabellen = tabellen
+        self.neu = {}
+
+    def datei_entfernen(self):
+        """Entfernt die Datei des Exportstands, z.B. wenn die HE-Datenbank neu erstellt wird."""
+        if os.path.exists(self.dateiname):
+            os.remove(self.dateiname)
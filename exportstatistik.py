@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Laufzeitstatistik fuer den Export nach HYSTEM-EXTRAN
+  ====================================================
+
+  Erfasst je Exportabschnitt die Laufzeit, die Anzahl der gelesenen, geschriebenen und
+  uebersprungenen Datensaetze sowie die Zeit, die fuer das Schreiben in die HE-Datenbank benoetigt
+  wurde. Die verbleibende Zeit eines Abschnitts entfaellt auf das Lesen aus der QKan-Datenbank
+  und die Aufbereitung der Daten. Am Ende des Exports wird ein Bericht im JSON-Format erstellt.
+
+  | Dateiname            : exportstatistik.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import codecs
+import json
+import logging
+import time
+
+logger = logging.getLogger('QKan')
+
+
+def _rate(anzahl, sekunden):
+    if sekunden <= 0.:
+        return None
+    return round(anzahl / sekunden, 1)
+
+
+class Abschnittsstatistik(object):
+    """Zaehler und Zeiten eines Exportabschnitts."""
+
+    def __init__(self, name, schreiben=False):
+        self.name = name
+        self.schreiben = schreiben
+        self.start = time.time()
+        self.dauer = 0.
+        self.schreibzeit = 0.
+        self.gelesen = 0
+        self.geschrieben = 0
+        self.uebersprungen = 0
+        self.geaendert = 0
+
+    def bericht(self):
+        lesezeit = max(self.dauer - self.schreibzeit, 0.)
+        return {
+            'abschnitt': self.name,
+            'dauer': round(self.dauer, 3),
+            'lesezeit': round(lesezeit, 3),
+            'schreibzeit': round(self.schreibzeit, 3),
+            'gelesen': self.gelesen,
+            'geschrieben': self.geschrieben,
+            'uebersprungen': self.uebersprungen,
+            'geaendert': self.geaendert,
+            'gelesen_je_s': _rate(self.gelesen, lesezeit),
+            'geschrieben_je_s': _rate(self.geschrieben, self.schreibzeit),
+        }
+
+
+class Exportstatistik(object):
+    """Laufzeitstatistik eines Exports.
+
+    Die Abschnitte werden mit abschnitt() begonnen und mit ende() bzw. dem Beginn des naechsten
+    Abschnitts abgeschlossen. Leseschicht (qk_reader) und Schreibschicht (he_writer) melden ihre
+    Zaehler und Zeiten an den jeweils laufenden Abschnitt.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.abschnitte = []
+        self.aktuell = None
+
+    def abschnitt(self, name, schreiben=False):
+        """Beginnt einen neuen Abschnitt. Bei schreiben=True wird die gesamte Laufzeit des
+        Abschnitts als Schreibzeit gezaehlt (z.B. fuer Anweisungen direkt auf der HE-Datenbank)."""
+        self.ende()
+        self.aktuell = Abschnittsstatistik(name, schreiben)
+
+    def ende(self):
+        """Schliesst den laufenden Abschnitt ab."""
+        if self.aktuell is not None:
+            self.aktuell.dauer = time.time() - self.aktuell.start
+            if self.aktuell.schreiben:
+                self.aktuell.schreibzeit = self.aktuell.dauer
+            self.abschnitte.append(self.aktuell)
+            self.aktuell = None
+
+    def gelesen(self, anzahl=1):
+        if self.aktuell is not None:
+            self.aktuell.gelesen += anzahl
+
+    def geschrieben(self, anzahl, sekunden):
+        if self.aktuell is not None:
+            self.aktuell.geschrieben += anzahl
+            self.aktuell.schreibzeit += sekunden
+
+    def geaendert(self, anzahl, sekunden):
+        if self.aktuell is not None:
+            self.aktuell.geaendert += anzahl
+            self.aktuell.schreibzeit += sekunden
+
+    def uebersprungen(self, anzahl=1):
+        if self.aktuell is not None:
+            self.aktuell.uebersprungen += anzahl
+
+    def bericht(self, erfolg=None):
+        """Liefert den Bericht als Dictionary."""
+        self.ende()
+        abschnitte = [abschnitt.bericht() for abschnitt in self.abschnitte]
+        return {
+            'erfolg': erfolg,
+            'dauer': round(time.time() - self.start, 3),
+            'lesezeit': round(sum(a['lesezeit'] for a in abschnitte), 3),
+            'schreibzeit': round(sum(a['schreibzeit'] for a in abschnitte), 3),
+            'abschnitte': abschnitte,
+        }
+
+    def speichern(self, dateiname, erfolg=None):
+        """Schreibt den Bericht als JSON-Datei und liefert ihn zurueck."""
+        bericht = self.bericht(erfolg)
+        with codecs.open(dateiname, 'w', 'utf-8') as datei:
+            datei.write(json.dumps(bericht, indent=2))
+        return bericht
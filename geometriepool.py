@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Verschneidung von Flaechen in einem Pool von Prozessen
+  ======================================================
+
+  Berechnet die Verschneidung der aufzuteilenden Flaechen mit den tezg-Flaechen und deren
+  Flaecheninhalt ausserhalb von SpatiaLite. Die Geometrien werden als WKB gelesen, die Paare nach
+  der Lage der Flaechen in Kacheln eingeteilt und die Kacheln auf die Prozesse verteilt. Die
+  Ergebnisse werden in die Tabelle des Verschneidungscaches (siehe qk_reader.py) geschrieben, aus
+  der der Export der Flaechen (Teil 2) liest.
+
+  Benoetigt das Paket shapely. Ist es nicht vorhanden, wird die Verschneidung wie bisher in
+  SpatiaLite ausgefuehrt.
+
+  | Dateiname            : geometriepool.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import sys
+
+try:
+    from shapely import wkb
+    from shapely.geometry import MultiPolygon
+except ImportError:
+    wkb = None
+
+logger = logging.getLogger('QKan')
+
+
+def verfuegbar():
+    """True, wenn shapely fuer die Berechnung in den Prozessen vorhanden ist."""
+    return wkb is not None
+
+
+def _polygone(geom):
+    """Liefert den flaechenhaften Anteil einer Verschneidung als MultiPolygon oder None."""
+    if geom.is_empty:
+        return None
+    if geom.geom_type == 'Polygon':
+        return MultiPolygon([geom])
+    if geom.geom_type == 'MultiPolygon':
+        return geom
+    if geom.geom_type == 'GeometryCollection':
+        teile = []
+        for teil in geom.geoms:
+            if teil.geom_type == 'Polygon':
+                teile.append(teil)
+            elif teil.geom_type == 'MultiPolygon':
+                teile.extend(teil.geoms)
+        if teile:
+            return MultiPolygon(teile)
+    return None
+
+
+def kachel_verschneiden(kachel):
+    """Verschneidet die Paare einer Kachel. Wird in einem Prozess des Pools aufgerufen.
+
+    :kachel:        Tuple (paare, flaechen, tezg) mit der Liste der Paare (flnam, tezg_pk) und den
+                    WKB-Geometrien der beteiligten Flaechen und tezg-Flaechen als Dictionary
+    :type kachel:   tuple
+
+    :returns: Liste von Tuples (flnam, tezg_pk, wkb, flaeche). Fuer Paare ohne gemeinsame Flaeche
+              sind wkb und flaeche None.
+    """
+    paare, flaechen_wkb, tezg_wkb = kachel
+    flaechen = dict((flnam, wkb.loads(bytes(geom))) for flnam, geom in flaechen_wkb.items())
+    tezg = dict((pk, wkb.loads(bytes(geom))) for pk, geom in tezg_wkb.items())
+
+    ergebnis = []
+    for flnam, tezg_pk in paare:
+        geom_fl = flaechen[flnam]
+        geom_tezg = tezg[tezg_pk]
+        teil = None
+        if geom_fl.intersects(geom_tezg):
+            teil = _polygone(geom_fl.intersection(geom_tezg))
+        if teil is None:
+            ergebnis.append((flnam, tezg_pk, None, None))
+        else:
+            ergebnis.append((flnam, tezg_pk, teil.wkb, teil.area))
+    return ergebnis
+
+
+def kacheln_bilden(paare, flaechen, tezg, anzahl):
+    """Teilt die Paare nach der Lage der Flaechen in etwa anzahl Kacheln eines regelmaessigen Rasters.
+
+    :paare:         Liste von Tuples (flnam, tezg_pk, x, y) mit dem Mittelpunkt der Flaeche
+    :type paare:    list
+
+    :flaechen:      WKB-Geometrien der Flaechen nach flnam
+    :type flaechen: dict
+
+    :tezg:          WKB-Geometrien der tezg-Flaechen nach pk
+    :type tezg:     dict
+
+    :returns: Liste der Kacheln fuer kachel_verschneiden. Jede Kachel enthaelt nur die Geometrien
+              ihrer Paare.
+    """
+    if not paare:
+        return []
+    n = max(1, int(math.ceil(math.sqrt(anzahl))))
+    xmin = min(p[2] for p in paare)
+    ymin = min(p[3] for p in paare)
+    dx = (max(p[2] for p in paare) - xmin) / n or 1.
+    dy = (max(p[3] for p in paare) - ymin) / n or 1.
+
+    raster = {}
+    for flnam, tezg_pk, x, y in paare:
+        schluessel = (min(int((x - xmin) / dx), n - 1), min(int((y - ymin) / dy), n - 1))
+        raster.setdefault(schluessel, []).append((flnam, tezg_pk))
+
+    kacheln = []
+    for schluessel in sorted(raster):
+        kachelpaare = raster[schluessel]
+        kacheln.append((kachelpaare,
+                        dict((flnam, flaechen[flnam]) for flnam in set(p[0] for p in kachelpaare)),
+                        dict((pk, tezg[pk]) for pk in set(p[1] for p in kachelpaare))))
+    return kacheln
+
+
+class Geometriepool(object):
+    """Pool von Prozessen fuer die Verschneidung der Flaechen mit den tezg-Flaechen.
+
+    :prozesse:      Anzahl der Prozesse. 0 oder None: Anzahl der Prozessoren
+    :type prozesse: Integer
+
+    :kacheln_je_prozess: Anzahl der Kacheln je Prozess, damit die Prozesse auch bei ungleich
+                    verteilten Flaechen gleichmaessig ausgelastet sind
+    :type kacheln_je_prozess: Integer
+    """
+
+    def __init__(self, prozesse=None, kacheln_je_prozess=4):
+        self.prozesse = prozesse or multiprocessing.cpu_count()
+        self.kacheln_je_prozess = kacheln_je_prozess
+
+    def verschneiden(self, paare, flaechen, tezg):
+        """Verschneidet alle Paare und liefert die Ergebnisse wie kachel_verschneiden."""
+        kacheln = kacheln_bilden(paare, flaechen, tezg, self.prozesse * self.kacheln_je_prozess)
+        if not kacheln:
+            return []
+        prozesse = min(self.prozesse, len(kacheln))
+        if prozesse > 1 and multiprocessing.current_process().daemon:
+            # Ein Prozess eines Pools (z.B. ein Auftrag von k_qkhe_batch.py) darf keine eigenen
+            # Prozesse starten, die Kacheln werden dann nacheinander verschnitten.
+            logger.debug(u'geometriepool: Aufruf in einem Daemon-Prozess, Verschneidung ohne Pool')
+            prozesse = 1
+        if prozesse == 1:
+            ergebnisse = [kachel_verschneiden(kachel) for kachel in kacheln]
+        else:
+            _interpreter_setzen()
+            pool = multiprocessing.Pool(prozesse)
+            try:
+                ergebnisse = pool.map(kachel_verschneiden, kacheln, chunksize=1)
+            finally:
+                pool.close()
+                pool.join()
+        logger.debug(u'geometriepool: {} Paare in {} Kacheln mit {} Prozessen verschnitten'.format(
+            len(paare), len(kacheln), prozesse))
+        return [zeile for ergebnis in ergebnisse for zeile in ergebnis]
+
+
+def _interpreter_setzen():
+    """Innerhalb von QGIS unter Windows ist sys.executable die QGIS-Anwendung. Die Prozesse des
+    Pools muessen dann mit dem Python-Interpreter der QGIS-Installation gestartet werden."""
+    if os.name == 'nt' and not os.path.basename(sys.executable).lower().startswith('python'):
+        interpreter = os.path.join(sys.exec_prefix, 'pythonw.exe')
+        if os.path.exists(interpreter):
+            multiprocessing.set_executable(interpreter)
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Datenbanksysteme fuer die HE-Datenbank
+  ======================================
+
+  Der Export schreibt ueber ein Verbindungsobjekt mit der Schnittstelle von
+  QKan_Database.fbfunc.FBConnection (Attribute confb, curfb und Methoden sql, fetchone, fetchall,
+  commit) in die HE-Datenbank. Ein Backend erstellt die HE-Datenbank aus der Vorlage und liefert
+  dieses Verbindungsobjekt:
+
+  - "firebird": Kopie der Vorlage templates/itwh.idbf, Verbindung mit FBConnection (Standard).
+  - "sqlite": Ersatzdatenbank in SQLite mit demselben Tabellenaufbau wie die Vorlage. Damit laesst
+    sich der Export ohne Firebird-Installation ausfuehren, testen und vermessen. Die Datei ist keine
+    gueltige HE-Datenbank und kann nicht in HYSTEM-EXTRAN geoeffnet werden.
+  - "skript": Der Export schreibt in eine temporaere Ersatzdatenbank, aus der am Ende ein
+    Firebird-SQL-Skript fuer eine Kopie der Vorlage erstellt wird (siehe he_skript). Die HE-Datenbank
+    des Exports ist dann der Pfad des Skripts.
+
+  Der Tabellenaufbau der Vorlage (Tabellen, Spalten, eindeutige Indizes und die Datensaetze der
+  Programmtabellen ITWH$...) wird in <vorlage>_layout.json neben der Vorlage abgelegt. Nach einer
+  Aenderung der Vorlage wird die Datei mit Firebird neu erstellt:
+
+      python he_backend.py --vorlage templates/itwh.idbf
+
+  | Dateiname            : he_backend.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import argparse
+import codecs
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+from he_writer import feldtyp
+from he_skript import skript_schreiben
+
+logger = logging.getLogger('QKan')
+
+# Tabellen mit mehr Datensaetzen werden nicht in den Tabellenaufbau uebernommen
+MAX_DATENSAETZE = 100
+
+
+def layout_datei(vorlage):
+    """Liefert den Namen der Datei mit dem Tabellenaufbau zu einer Vorlage."""
+    return os.path.splitext(vorlage)[0] + u'_layout.json'
+
+
+class SQLiteHE(object):
+    """Verbindung zur SQLite-Ersatzdatenbank mit der Schnittstelle von FBConnection.
+
+    Wie bei Firebird laeuft immer eine Transaktion, die mit commit() abgeschlossen bzw. mit rollback()
+    verworfen und sofort wieder geoeffnet wird. Die Transaktion wird selbst gesteuert
+    (isolation_level=None), weil das Modul sqlite3 unter Python 2 vor Anweisungen wie SAVEPOINT oder
+    CREATE TABLE eigenmaechtig ein Commit ausfuehrt und damit die Sicherungspunkte der Abschnitte aufhebt.
+
+    :dateiname:     Pfad zur Ersatzdatenbank
+    :type dateiname: String
+    """
+
+    dialekt = 'sqlite'
+
+    def __init__(self, dateiname):
+        # Der Export schreibt mit der Option "pipeline" aus einem eigenen Thread
+        self.confb = sqlite3.connect(dateiname, isolation_level=None, check_same_thread=False)
+        self.curfb = self.confb.cursor()
+        self.curfb.execute(u'BEGIN')
+
+    def __del__(self):
+        try:
+            self.confb.close()
+        except BaseException:
+            pass
+
+    def sql(self, sql, errormessage=u''):
+        try:
+            self.curfb.execute(sql)
+            return True
+        except sqlite3.Error as err:
+            logger.error(u'{}\n{}\n{}'.format(errormessage, sql, err))
+            return False
+
+    def fetchone(self):
+        return self.curfb.fetchone()
+
+    def fetchall(self):
+        return self.curfb.fetchall()
+
+    def commit(self):
+        self.curfb.execute(u'COMMIT')
+        self.curfb.execute(u'BEGIN')
+
+    def rollback(self):
+        self.curfb.execute(u'ROLLBACK')
+        self.curfb.execute(u'BEGIN')
+
+
+class Backend(object):
+    """Gemeinsame Schnittstelle der Backends.
+
+    :optionen:      Optionen des Backends (z.B. je_tabelle fuer "skript")
+    :type optionen: dict
+    """
+
+    name = None
+    firebird = False
+    offline = False                 # Keine vorhandene HE-Datenbank (kein inkrementeller Export)
+
+    def __init__(self, **optionen):
+        self.optionen = optionen
+
+    def erstellen(self, vorlage, ziel):
+        """Erstellt die HE-Datenbank ziel aus der Vorlage."""
+        raise NotImplementedError
+
+    def verbinden(self, ziel):
+        """Liefert das Verbindungsobjekt zur HE-Datenbank ziel."""
+        raise NotImplementedError
+
+    def abschliessen(self, dbHE):
+        """Wird nach dem erfolgreichen Export aufgerufen."""
+        pass
+
+
+class FirebirdBackend(Backend):
+    """HE-Datenbank in Firebird als Kopie der Vorlage."""
+
+    name = 'firebird'
+    firebird = True
+
+    def erstellen(self, vorlage, ziel):
+        shutil.copyfile(vorlage, ziel)
+
+    def verbinden(self, ziel):
+        from QKan_Database.fbfunc import FBConnection
+        return FBConnection(ziel)
+
+
+class SQLiteBackend(Backend):
+    """SQLite-Ersatzdatenbank mit dem Tabellenaufbau der Vorlage (siehe layout_datei)."""
+
+    name = 'sqlite'
+    firebird = False
+
+    def erstellen(self, vorlage, ziel):
+        dateiname = layout_datei(vorlage)
+        if not os.path.exists(dateiname):
+            raise IOError(u'Tabellenaufbau der Vorlage fehlt: {}. Erstellen mit '
+                          u'"python he_backend.py --vorlage {}"'.format(dateiname, vorlage))
+        with codecs.open(dateiname, 'r', 'utf-8') as datei:
+            layout = json.load(datei)
+
+        if os.path.exists(ziel):
+            os.remove(ziel)
+        con = sqlite3.connect(ziel)
+        try:
+            for tabelle, spalten in sorted(layout['tabellen'].items()):
+                con.execute(u'CREATE TABLE "{}" ({})'.format(
+                    tabelle, u', '.join([u'"{}" {}'.format(sp, typ.split(u' SUB_TYPE')[0])
+                                         for sp, typ in spalten])))
+            for name, tabelle, eindeutig, spalten in layout['indizes']:
+                con.execute(u'CREATE {}INDEX "{}" ON "{}" ({})'.format(
+                    u'UNIQUE ' if eindeutig else u'', name, tabelle,
+                    u', '.join([u'"{}"'.format(sp) for sp in spalten])))
+            for tabelle, zeilen in sorted(layout['daten'].items()):
+                if zeilen:
+                    con.executemany(u'INSERT INTO "{}" VALUES ({})'.format(
+                        tabelle, u', '.join(u'?' * len(zeilen[0]))), zeilen)
+            con.commit()
+        finally:
+            con.close()
+        return layout
+
+    def verbinden(self, ziel):
+        return SQLiteHE(ziel)
+
+
+class SkriptHE(SQLiteHE):
+    """Temporaere Ersatzdatenbank des Backends "skript". Die Datei wird mit der Verbindung geloescht."""
+
+    def __init__(self, dateiname):
+        SQLiteHE.__init__(self, dateiname)
+        self.dateiname = dateiname
+
+    def schliessen(self):
+        self.confb.close()
+        if os.path.exists(self.dateiname):
+            os.remove(self.dateiname)
+
+    def __del__(self):
+        try:
+            self.schliessen()
+        except BaseException:
+            pass
+
+
+class SkriptBackend(SQLiteBackend):
+    """Firebird-SQL-Skript statt HE-Datenbank (siehe he_skript). Mit der Option je_tabelle wird je
+    Tabelle ein eigenes Skript geschrieben."""
+
+    name = 'skript'
+    offline = True
+
+    def erstellen(self, vorlage, ziel):
+        handle, self.ersatz = tempfile.mkstemp(suffix='.sqlite', prefix='qkan_he_')
+        os.close(handle)
+        self.layout = SQLiteBackend.erstellen(self, vorlage, self.ersatz)
+
+    def verbinden(self, ziel):
+        self.ziel = ziel
+        return SkriptHE(self.ersatz)
+
+    def abschliessen(self, dbHE):
+        dbHE.commit()
+        zaehler = skript_schreiben(dbHE.confb, self.layout, self.ziel, self.optionen.get('je_tabelle', False))
+        dbHE.schliessen()
+        return zaehler
+
+
+BACKENDS = dict((klasse.name, klasse) for klasse in (FirebirdBackend, SQLiteBackend, SkriptBackend))
+
+
+def backend(name='firebird', **optionen):
+    """Liefert das Backend zum Namen der Option "hebackend"."""
+    try:
+        return BACKENDS[name or 'firebird'](**optionen)
+    except KeyError:
+        raise ValueError(u'Unbekanntes HE-Backend "{}" (moeglich: {})'.format(
+            name, u', '.join(sorted(BACKENDS))))
+
+
+def layout_auslesen(dbHE):
+    """Liest den Tabellenaufbau einer Firebird-Datenbank aus den Systemtabellen.
+
+    :dbHE:          Datenbankobjekt der HE-Datenbank (FBConnection)
+    :type dbHE:     FBConnection
+
+    :returns: Tabellen mit Spalten und Typen, eindeutige Indizes und kleine Datentabellen
+    :rtype: dict
+    """
+    cursor = dbHE.curfb
+    cursor.execute(u"""
+        SELECT TRIM(rf.RDB$RELATION_NAME), TRIM(rf.RDB$FIELD_NAME),
+               f.RDB$FIELD_TYPE, f.RDB$FIELD_SUB_TYPE, f.RDB$FIELD_SCALE, f.RDB$FIELD_PRECISION,
+               f.RDB$CHARACTER_LENGTH, f.RDB$FIELD_LENGTH
+        FROM RDB$RELATION_FIELDS rf
+        JOIN RDB$RELATIONS r ON r.RDB$RELATION_NAME = rf.RDB$RELATION_NAME
+        JOIN RDB$FIELDS f ON f.RDB$FIELD_NAME = rf.RDB$FIELD_SOURCE
+        WHERE COALESCE(r.RDB$SYSTEM_FLAG, 0) = 0 AND r.RDB$VIEW_BLR IS NULL
+          AND r.RDB$RELATION_TYPE IN (0, 1)
+        ORDER BY rf.RDB$RELATION_NAME, rf.RDB$FIELD_POSITION""")
+    tabellen = {}
+    for zeile in cursor.fetchall():
+        tabellen.setdefault(zeile[0], []).append([zeile[1], feldtyp(*zeile[2:])])
+
+    cursor.execute(u"""
+        SELECT TRIM(i.RDB$INDEX_NAME), TRIM(i.RDB$RELATION_NAME), COALESCE(i.RDB$UNIQUE_FLAG, 0),
+               TRIM(s.RDB$FIELD_NAME)
+        FROM RDB$INDICES i
+        JOIN RDB$INDEX_SEGMENTS s ON s.RDB$INDEX_NAME = i.RDB$INDEX_NAME
+        WHERE COALESCE(i.RDB$SYSTEM_FLAG, 0) = 0
+        ORDER BY i.RDB$INDEX_NAME, s.RDB$FIELD_POSITION""")
+    indizes = []
+    for name, tabelle, eindeutig, spalte in cursor.fetchall():
+        if not indizes or indizes[-1][0] != name:
+            indizes.append([name, tabelle, bool(eindeutig), []])
+        indizes[-1][3].append(spalte)
+
+    daten = {}
+    for tabelle in sorted(tabellen):
+        cursor.execute(u'SELECT COUNT(*) FROM "{}"'.format(tabelle))
+        anzahl = int(cursor.fetchone()[0])
+        if 0 < anzahl <= MAX_DATENSAETZE:
+            cursor.execute(u'SELECT {} FROM "{}"'.format(
+                u', '.join([u'"{}"'.format(sp) for sp, typ in tabellen[tabelle]]), tabelle))
+            daten[tabelle] = [[None if typ == u'BLOB'
+                               else (wert if wert is None or isinstance(wert, (int, float)) else u'{}'.format(wert))
+                               for wert, (sp, typ) in zip(zeile, tabellen[tabelle])]
+                              for zeile in cursor.fetchall()]
+
+    return {'tabellen': tabellen, 'indizes': indizes, 'daten': daten}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=u'Tabellenaufbau einer HE-Vorlage fuer die SQLite-Ersatzdatenbank auslesen')
+    parser.add_argument('--vorlage', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          'templates', 'itwh.idbf'),
+                        help=u'HE-Vorlage (Firebird)')
+    parser.add_argument('--ziel', help=u'JSON-Datei (Standard: <vorlage>_layout.json)')
+    args = parser.parse_args(argv)
+
+    dbHE = FirebirdBackend().verbinden(args.vorlage)
+    layout = layout_auslesen(dbHE)
+    layout['vorlage'] = os.path.basename(args.vorlage)
+    ziel = args.ziel or layout_datei(args.vorlage)
+    with codecs.open(ziel, 'w', 'utf-8') as datei:
+        json.dump(layout, datei, indent=1, sort_keys=True)
+    print(u'{} Tabellen, {} Indizes -> {}'.format(len(layout['tabellen']), len(layout['indizes']), ziel))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
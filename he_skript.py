@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+"""
+  SQL-Skripte fuer HYSTEM-EXTRAN-Datenbanken
+  ==========================================
+
+  Mit dem Backend "skript" (siehe he_backend) schreibt der Export nicht in eine Firebird-Datenbank,
+  sondern in eine SQLite-Ersatzdatenbank mit dem Tabellenaufbau der Vorlage. Nach dem Export werden
+  die Unterschiede zur Vorlage als Firebird-SQL-Skript ausgegeben. Das Skript wird spaeter mit isql
+  auf eine Kopie derselben Vorlage angewendet, z.B.:
+
+      copy itwh.idbf netz.idbf
+      isql -bail -i netz.sql netz.idbf
+
+  Neue Datensaetze werden mit mehrzeiligen Anweisungen INSERT INTO ... SELECT ... UNION ALL ...
+  eingefuegt. Das Skript enthaelt nur ein COMMIT am Ende, d.h. es wird ganz oder gar nicht
+  uebernommen. Mit je_tabelle=True wird je Tabelle ein eigenes Skript geschrieben, das vom
+  Hauptskript mit INPUT eingelesen wird (isql im Verzeichnis der Skripte starten).
+
+  | Dateiname            : he_skript.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import binascii
+import codecs
+import logging
+import math
+import numbers
+import os
+import time
+
+logger = logging.getLogger('QKan')
+
+# Grenzen von Firebird 2.5 je Anweisung: 64 KB Text und 255 Kontexte (je Zeile ein RDB$DATABASE)
+ZEILEN_JE_ANWEISUNG = 200
+MAX_ANWEISUNG = 60000
+
+# Zeichensatz der Verbindung (SET NAMES) und Kodierung der Skriptdatei
+ZEICHENSATZ = (u'UTF8', 'utf-8')
+
+ZEITTYPEN = (u'TIMESTAMP', u'DATE', u'TIME')
+
+
+def literal(wert, typ=None, typisiert=False):
+    """Liefert einen Wert als Firebird-SQL-Literal.
+
+    :wert:          Wert aus der Ersatzdatenbank
+    :typ:           SQL-Datentyp der Spalte (aus dem Tabellenaufbau der Vorlage)
+    :typisiert:     True: Der Wert wird in den Datentyp der Spalte umgewandelt. Das ist fuer die
+                    erste Zeile einer UNION-Abfrage noetig, damit NULL und Texte den Typ der Spalte
+                    erhalten (Texte sonst als CHAR mit aufgefuellten Leerzeichen).
+    :type typisiert: Boolean
+
+    :returns: SQL-Literal
+    :rtype: String
+    """
+    if wert is None or isinstance(wert, float) and (math.isnan(wert) or math.isinf(wert)):
+        text = u'NULL'
+        typisiert = typ is not None
+    elif isinstance(wert, bool):
+        text = u'1' if wert else u'0'
+    elif isinstance(wert, numbers.Integral):
+        text = u'{:d}'.format(wert)
+    elif isinstance(wert, numbers.Real):
+        text = repr(float(wert))
+    elif isinstance(wert, (bytes, bytearray)):
+        text = u"X'{}'".format(binascii.hexlify(bytes(wert)).decode('ascii').upper())
+    else:
+        text = u"'{}'".format(u'{}'.format(wert).replace(u"'", u"''"))
+        typisiert = typisiert or (typ is not None and typ in ZEITTYPEN)
+    if typisiert and typ is not None:
+        return u'CAST({} AS {})'.format(text, typ)
+    return text
+
+
+def einfuegen(tabelle, spalten, typen, zeilen, zeilen_je_anweisung=ZEILEN_JE_ANWEISUNG,
+              max_laenge=MAX_ANWEISUNG):
+    """Liefert die mehrzeiligen INSERT-Anweisungen fuer die Datensaetze einer Tabelle.
+
+    :tabelle:       Name der Tabelle
+    :spalten:       Spaltennamen
+    :typen:         SQL-Datentypen der Spalten
+    :zeilen:        Datensaetze in der Reihenfolge der Spalten (iterierbar)
+
+    :returns: Generator der Anweisungen ohne abschliessendes Semikolon
+    """
+    kopf = u'INSERT INTO {} ({})\n'.format(tabelle, u', '.join(spalten))
+    auswahl = []
+    laenge = len(kopf)
+    for zeile in zeilen:
+        sql = u'SELECT {} FROM RDB$DATABASE'.format(u', '.join(
+            [literal(wert, typ, typisiert=not auswahl) for wert, typ in zip(zeile, typen)]))
+        if auswahl and (len(auswahl) >= zeilen_je_anweisung or laenge + len(sql) + 11 > max_laenge):
+            yield kopf + u'\nUNION ALL '.join(auswahl)
+            sql = u'SELECT {} FROM RDB$DATABASE'.format(u', '.join(
+                [literal(wert, typ, typisiert=True) for wert, typ in zip(zeile, typen)]))
+            auswahl = []
+            laenge = len(kopf)
+        auswahl.append(sql)
+        laenge += len(sql) + 11
+    if auswahl:
+        yield kopf + u'\nUNION ALL '.join(auswahl)
+
+
+def tabellenanweisungen(con, tabelle, spalten, vorlage, zaehler):
+    """Liefert die Anweisungen, die eine Tabelle der Vorlage in den Stand der Ersatzdatenbank
+    ueberfuehren. Die Datensaetze werden ueber die Spalte ID zugeordnet.
+
+    :con:           Verbindung zur Ersatzdatenbank
+    :type con:      sqlite3.Connection
+
+    :spalten:       Spaltennamen und -typen der Tabelle aus dem Tabellenaufbau der Vorlage
+    :type spalten:  list
+
+    :vorlage:       Datensaetze der Tabelle in der Vorlage
+    :type vorlage:  list
+
+    :zaehler:       Anzahl der eingefuegten, geaenderten und geloeschten Datensaetze je Tabelle
+    :type zaehler:  dict
+
+    :returns: Generator der Anweisungen ohne abschliessendes Semikolon
+    """
+    namen = [sp for sp, typ in spalten]
+    typen = [typ for sp, typ in spalten]
+    cursor = con.cursor()
+
+    # Spalten, die in keinem Datensatz belegt sind, werden nicht eingefuegt. Wie beim Export in die
+    # Firebird-Datenbank gelten dort die Standardwerte der Vorlage.
+    cursor.execute(u'SELECT {} FROM "{}"'.format(u', '.join([u'COUNT("{}")'.format(sp) for sp in namen]), tabelle))
+    belegt = [i for i, anzahl in enumerate(cursor.fetchone()) if anzahl]
+    cursor.execute(u'SELECT {} FROM "{}"{}'.format(u', '.join([u'"{}"'.format(sp) for sp in namen]), tabelle,
+                                                   u' ORDER BY "ID"' if u'ID' in namen else u''))
+    anzahl = {'eingefuegt': 0, 'geaendert': 0, 'geloescht': 0}
+    zaehler[tabelle] = anzahl
+
+    if u'ID' not in namen:
+        # Ohne Schluessel wird die Tabelle vollstaendig ersetzt
+        zeilen = [list(zeile) for zeile in cursor.fetchall()]
+        if zeilen == vorlage:
+            return
+        if vorlage:
+            anzahl['geloescht'] = len(vorlage)
+            yield u'DELETE FROM {}'.format(tabelle)
+        anzahl['eingefuegt'] = len(zeilen)
+        for sql in einfuegen(tabelle, [namen[i] for i in belegt], [typen[i] for i in belegt],
+                             [[zeile[i] for i in belegt] for zeile in zeilen]):
+            yield sql
+        return
+
+    pos = namen.index(u'ID')
+    alt = dict((zeile[pos], zeile) for zeile in vorlage)
+
+    def neue():
+        for zeile in cursor:
+            zeile = list(zeile)
+            vorher = alt.pop(zeile[pos], None)
+            if vorher is None:
+                anzahl['eingefuegt'] += 1
+                yield [zeile[i] for i in belegt]
+            elif vorher != zeile:
+                geaendert.append((zeile, vorher))
+
+    geaendert = []
+    for sql in einfuegen(tabelle, [namen[i] for i in belegt], [typen[i] for i in belegt], neue()):
+        yield sql
+    for zeile, vorher in geaendert:
+        anzahl['geaendert'] += 1
+        yield u'UPDATE {} SET {} WHERE ID = {}'.format(tabelle, u', '.join(
+            [u'{} = {}'.format(sp, literal(wert, typ))
+             for sp, typ, wert, alt_wert in zip(namen, typen, zeile, vorher) if wert != alt_wert]),
+            literal(zeile[pos]))
+    for kennung in sorted(alt):
+        anzahl['geloescht'] += 1
+        yield u'DELETE FROM {} WHERE ID = {}'.format(tabelle, literal(kennung))
+
+
+def skript_schreiben(con, layout, dateiname, je_tabelle=False):
+    """Schreibt die Unterschiede der Ersatzdatenbank zur Vorlage als Firebird-SQL-Skript.
+
+    :con:           Verbindung zur Ersatzdatenbank (alle Aenderungen abgeschlossen)
+    :type con:      sqlite3.Connection
+
+    :layout:        Tabellenaufbau der Vorlage (siehe he_backend.layout_datei)
+    :type layout:   dict
+
+    :dateiname:     Pfad des Skripts
+    :type dateiname: String
+
+    :je_tabelle:    Je Tabelle ein eigenes Skript <skript>_<tabelle>.sql schreiben
+    :type je_tabelle: Boolean
+
+    :returns: Anzahl der eingefuegten, geaenderten und geloeschten Datensaetze je Tabelle
+    :rtype: dict
+    """
+    start = time.time()
+    basis = os.path.splitext(dateiname)[0]
+    zaehler = {}
+    # Programmtabellen (ITWH$...) zuletzt, wie im Export (NEXTID nach dem Schreiben der Daten)
+    tabellen = sorted(layout['tabellen'], key=lambda tabelle: (tabelle.startswith(u'ITWH$'), tabelle))
+    with codecs.open(dateiname, 'w', ZEICHENSATZ[1]) as skript:
+        skript.write(u'-- HYSTEM-EXTRAN-Daten aus QKan ({})\n'.format(time.strftime('%Y-%m-%d %H:%M:%S')))
+        skript.write(u'-- Anzuwenden auf eine Kopie der Vorlage {}, z.B.: isql -bail -i {} <datenbank>\n'.format(
+            layout.get('vorlage', u''), os.path.basename(dateiname)))
+        skript.write(u'SET SQL DIALECT 3;\nSET NAMES {};\n'.format(ZEICHENSATZ[0]))
+        for tabelle in tabellen:
+            anweisungen = tabellenanweisungen(con, tabelle, layout['tabellen'][tabelle],
+                                              layout['daten'].get(tabelle, []), zaehler)
+            if not je_tabelle:
+                for sql in anweisungen:
+                    skript.write(u'{};\n'.format(sql))
+                continue
+            teil = u'{}_{}.sql'.format(basis, tabelle)
+            with codecs.open(teil, 'w', ZEICHENSATZ[1]) as teilskript:
+                for sql in anweisungen:
+                    teilskript.write(u'{};\n'.format(sql))
+            if any(zaehler[tabelle].values()):
+                skript.write(u"INPUT '{}';\n".format(os.path.basename(teil)))
+            else:
+                os.remove(teil)
+        skript.write(u'COMMIT;\n')
+
+    zaehler = dict((tabelle, anzahl) for tabelle, anzahl in zaehler.items() if any(anzahl.values()))
+    logger.debug(u'he_skript: {} in {:.2f} s geschrieben ({})'.format(
+        dateiname, time.time() - start, u', '.join([u'{} +{eingefuegt} ~{geaendert} -{geloescht}'.format(
+            tabelle, **anzahl) for tabelle, anzahl in sorted(zaehler.items())])))
+    return zaehler
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Vorlagen fuer HYSTEM-EXTRAN-Datenbanken
+  =======================================
+
+  Zu Beginn eines Exports wird die HE-Datenbank aus einer Vorlage (z.B. templates/itwh.idbf) erstellt
+  und anschliessend fuer die init_*-Optionen geleert. Der Vorlagencache haelt Kopien der Vorlagen
+  lokal vor, die fuer die jeweilige Kombination der init_*-Optionen bereits geleert sind. Die Kopien
+  werden ueber die Pruefsumme der Vorlage zugeordnet und beim naechsten Export nur noch geklont.
+
+  Geklont wird nach Moeglichkeit als Reflink (Copy-on-Write: Linux mit btrfs/XFS, macOS mit APFS),
+  sonst als einfache Kopie. Harte Links werden nicht verwendet, weil Firebird die Datenbankdatei
+  direkt beschreibt und damit auch die Kopie im Cache veraendern wuerde.
+
+  | Dateiname            : he_vorlage.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import codecs
+import contextlib
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+logger = logging.getLogger('QKan')
+
+# Anweisungen zum Leeren der HE-Tabellen je init_*-Option (ohne "init_"), in der Reihenfolge des Exports
+INIT_ANWEISUNGEN = (
+    ('schaechte', (u'DELETE FROM SCHACHT',)),
+    ('speicher', (u'DELETE FROM TABELLENINHALTE WHERE ID IN (SELECT ID FROM SPEICHERSCHACHT)',
+                  u'DELETE FROM SPEICHERSCHACHT')),
+    ('auslaesse', (u'DELETE FROM AUSLASS',)),
+    ('haltungen', (u'DELETE FROM ROHR',)),
+    ('bodenklassen', (u'DELETE FROM BODENKLASSE',)),
+    ('abflussparameter', (u'DELETE FROM ABFLUSSPARAMETER',)),
+    ('regenschreiber', (u'DELETE FROM REGENSCHREIBER',)),
+    ('flaechenrw', (u'DELETE FROM FLAECHE',)),
+    ('flaechensw', (u'DELETE FROM EINZELEINLEITER',)),
+)
+
+# Schnelles Leeren (Option "schnellinit"): Betroffene Tabellen und Anweisungen, soweit sie von
+# INIT_ANWEISUNGEN abweichen. Die Speicherkennlinien werden ueber EXISTS mit dem Primaerschluessel
+# von SPEICHERSCHACHT geloescht statt ueber eine IN-Liste.
+INIT_TABELLEN = {
+    'schaechte': ('SCHACHT',),
+    'speicher': ('TABELLENINHALTE', 'SPEICHERSCHACHT'),
+    'auslaesse': ('AUSLASS',),
+    'haltungen': ('ROHR',),
+    'bodenklassen': ('BODENKLASSE',),
+    'abflussparameter': ('ABFLUSSPARAMETER',),
+    'regenschreiber': ('REGENSCHREIBER',),
+    'flaechenrw': ('FLAECHE',),
+    'flaechensw': ('EINZELEINLEITER',),
+}
+
+SCHNELL_ANWEISUNGEN = {
+    'speicher': (u"""DELETE FROM TABELLENINHALTE t
+                     WHERE EXISTS (SELECT 1 FROM SPEICHERSCHACHT s WHERE s.ID = t.ID)""",
+                 u'DELETE FROM SPEICHERSCHACHT'),
+}
+
+# Sperrdatei des Vorlagencaches: Wartezeit in Sekunden, nach der eine Sperre als verwaist gilt
+# (z.B. nach einem abgebrochenen Prozess) und entfernt wird
+SPERRE_WARTEN = 60.
+SPERRE_VERWAIST = 300.
+
+
+def init_abschnitte(check_export):
+    """Liefert die Abschnitte, deren HE-Tabellen beim Export geleert werden. Das ist der Fall, wenn
+    die init_*-Option gesetzt ist und der Abschnitt exportiert oder geaendert wird."""
+    return tuple(abschnitt for abschnitt, anweisungen in INIT_ANWEISUNGEN
+                 if check_export.get('init_' + abschnitt)
+                 and (check_export.get('export_' + abschnitt) or check_export.get('modify_' + abschnitt)))
+
+
+def leeren(dbHE, abschnitt):
+    """Leert die HE-Tabellen eines Abschnitts fuer die init_*-Option."""
+    for sql in dict(INIT_ANWEISUNGEN)[abschnitt]:
+        dbHE.sql(sql)
+
+
+def schnell_leeren(writer, abschnitte, statistik=None):
+    """Leert die HE-Tabellen der Abschnitte vor Beginn der Exporttransaktion.
+
+    Je Abschnitt werden die Indizes der Tabellen deaktiviert, die Tabellen in einer eigenen
+    Transaktion geleert, die geloeschten Datensaetze durch Lesen der Tabellen aufgeraeumt (garbage
+    collection) und die Indizes anschliessend neu aufgebaut. Die Loeschungen sind damit abgeschlossen
+    und werden bei einem Fehler im Export nicht zurueckgenommen.
+
+    :writer:        Schreibobjekt der HE-Datenbank
+    :type writer:   HEWriter
+
+    :abschnitte:    Abschnitte, deren Tabellen geleert werden (siehe init_abschnitte)
+    :type abschnitte: Tuple
+
+    :statistik:     Laufzeitstatistik, in der jeder Abschnitt als "Init <abschnitt>" erfasst wird
+    :type statistik: Exportstatistik
+
+    :returns: Dauer je Abschnitt in Sekunden
+    :rtype: dict
+    """
+    dauer = {}
+    for abschnitt in abschnitte:
+        if statistik is not None:
+            statistik.abschnitt(u'Init {}'.format(abschnitt), schreiben=True)
+        start = time.time()
+        tabellen = INIT_TABELLEN[abschnitt]
+        indizes = []
+        try:
+            writer.indizes_deaktivieren(tabellen, indizes)
+            anweisungen = dict(INIT_ANWEISUNGEN)[abschnitt]
+            if writer.firebird:
+                anweisungen = SCHNELL_ANWEISUNGEN.get(abschnitt, anweisungen)
+            writer.separat(anweisungen)
+            for tabelle in tabellen:
+                writer.separat([], u'SELECT COUNT(*) FROM {}'.format(tabelle))
+        finally:
+            writer.indizes_aktivieren(indizes)
+        dauer[abschnitt] = time.time() - start
+        logger.debug(u'he_vorlage: {} in {:.2f} s geleert ({} Indizes neu aufgebaut)'.format(
+            u', '.join(tabellen), dauer[abschnitt], len(indizes)))
+    if statistik is not None:
+        statistik.ende()
+    return dauer
+
+
+def _reflink(quelle, ziel):
+    """Klont eine Datei als Reflink. Loest OSError aus, wenn das Dateisystem das nicht unterstuetzt."""
+    if sys.platform.startswith('linux'):
+        import fcntl
+        FICLONE = 0x40049409
+        with open(quelle, 'rb') as q:
+            with open(ziel, 'wb') as z:
+                fcntl.ioctl(z.fileno(), FICLONE, q.fileno())
+    elif sys.platform == 'darwin':
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if libc.clonefile(quelle.encode('utf-8'), ziel.encode('utf-8'), 0) != 0:
+            raise OSError(ctypes.get_errno(), u'clonefile fehlgeschlagen')
+    else:
+        raise OSError(u'Reflink wird auf {} nicht unterstuetzt'.format(sys.platform))
+
+
+def klonen(quelle, ziel):
+    """Erstellt ziel als Klon von quelle, als Reflink oder, wenn das nicht moeglich ist, als Kopie.
+
+    :returns: Verwendetes Verfahren ('reflink' oder 'kopie')
+    """
+    try:
+        _reflink(quelle, ziel)
+        return 'reflink'
+    except (OSError, IOError, AttributeError) as err:
+        logger.debug(u'he_vorlage: Reflink nicht moeglich ({}), Datei wird kopiert'.format(err))
+        if os.path.exists(ziel):
+            os.remove(ziel)
+    shutil.copyfile(quelle, ziel)
+    return 'kopie'
+
+
+def _ersetzen(quelle, ziel):
+    """Benennt quelle in ziel um und ersetzt dabei eine vorhandene Datei ziel in einem Schritt.
+    Unter Windows und Python 2 ist os.rename auf eine vorhandene Datei nicht moeglich."""
+    if hasattr(os, 'replace'):
+        os.replace(quelle, ziel)
+        return
+    if os.name == 'nt' and os.path.exists(ziel):
+        os.remove(ziel)
+    os.rename(quelle, ziel)
+
+
+class Vorlagencache(object):
+    """Zwischenspeicher fuer vorbereitete Kopien der HE-Vorlagen.
+
+    Der Cache kann von mehreren Exporten gleichzeitig verwendet werden (z.B. k_qkhe_batch.py). Der
+    Index vorlagen.json wird dazu unter einer Sperrdatei geaendert und als Ganzes ersetzt, so dass
+    Leser immer einen vollstaendigen Index sehen.
+
+    :verzeichnis:   Verzeichnis fuer die Kopien. Standard: qkan_he_vorlagen im temporaeren Verzeichnis
+    :type verzeichnis: String
+
+    :verbinden:     Funktion, die zu einem Dateinamen eine Verbindung zur Firebird-Datenbank liefert
+                    (FBConnection). Sie wird nur zum Leeren einer neuen Kopie aufgerufen.
+    :type verbinden: Function
+    """
+
+    def __init__(self, verzeichnis=None, verbinden=None):
+        self.verzeichnis = verzeichnis or os.path.join(tempfile.gettempdir(), u'qkan_he_vorlagen')
+        self.verbinden = verbinden
+        self.indexdatei = os.path.join(self.verzeichnis, u'vorlagen.json')
+        self.sperrdatei = os.path.join(self.verzeichnis, u'vorlagen.lock')
+
+    @contextlib.contextmanager
+    def _sperre(self):
+        """Sperrt den Index fuer andere Prozesse. Die Sperrdatei wird exklusiv angelegt, eine
+        verwaiste Sperre nach SPERRE_VERWAIST Sekunden entfernt. Loest OSError aus, wenn die Sperre
+        nicht innerhalb von SPERRE_WARTEN Sekunden erhalten wird."""
+        start = time.time()
+        while True:
+            try:
+                os.close(os.open(self.sperrdatei, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise
+            try:
+                if time.time() - os.path.getmtime(self.sperrdatei) > SPERRE_VERWAIST:
+                    logger.debug(u'he_vorlage: Verwaiste Sperre {} entfernt'.format(self.sperrdatei))
+                    os.remove(self.sperrdatei)
+                    continue
+            except OSError:
+                continue                # Sperre inzwischen freigegeben
+            if time.time() - start > SPERRE_WARTEN:
+                raise OSError(errno.EAGAIN, u'Vorlagencache ist gesperrt', self.sperrdatei)
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.remove(self.sperrdatei)
+
+    def _index_schreiben(self, index):
+        temp = u'{}.{}.tmp'.format(self.indexdatei, os.getpid())
+        with codecs.open(temp, 'w', 'utf-8') as datei:
+            datei.write(json.dumps(index, indent=2))
+        _ersetzen(temp, self.indexdatei)
+
+    def _index(self):
+        if not os.path.exists(self.indexdatei):
+            return {}
+        try:
+            with codecs.open(self.indexdatei, 'r', 'utf-8') as datei:
+                return json.loads(datei.read())
+        except BaseException as err:
+            logger.debug(u'he_vorlage: Index {} nicht lesbar: {}'.format(self.indexdatei, err))
+            return {}
+
+    def pruefsumme(self, vorlage):
+        """Pruefsumme (MD5) der Vorlage. Solange Groesse und Aenderungszeit der Vorlage gleich bleiben,
+        wird die gespeicherte Pruefsumme verwendet, damit die Vorlage nicht bei jedem Export
+        (z.B. ueber das Netzwerk) vollstaendig gelesen werden muss."""
+        pfad = os.path.abspath(vorlage)
+        info = os.stat(pfad)
+        eintrag = self._index().get(pfad)
+        if eintrag and eintrag['groesse'] == info.st_size and eintrag['mtime'] == info.st_mtime:
+            return eintrag['md5']
+
+        md5 = hashlib.md5()
+        with open(pfad, 'rb') as datei:
+            for block in iter(lambda: datei.read(1 << 20), b''):
+                md5.update(block)
+        pruefsumme = md5.hexdigest()
+
+        # Der Index wird unter der Sperre neu gelesen, damit Eintraege anderer Prozesse erhalten bleiben
+        with self._sperre():
+            index = self._index()
+            eintrag = index.get(pfad)
+            # Kopien einer geaenderten Vorlage werden nicht mehr benoetigt
+            if eintrag and eintrag['md5'] != pruefsumme:
+                self._entfernen(eintrag['md5'])
+            index[pfad] = {'groesse': info.st_size, 'mtime': info.st_mtime, 'md5': pruefsumme}
+            self._index_schreiben(index)
+        return pruefsumme
+
+    def _entfernen(self, pruefsumme):
+        for name in os.listdir(self.verzeichnis):
+            if name.startswith(pruefsumme + u'_'):
+                try:
+                    os.remove(os.path.join(self.verzeichnis, name))
+                except OSError as err:
+                    logger.debug(u'he_vorlage: {} nicht entfernt: {}'.format(name, err))
+
+    def _vorbereiten(self, vorlage, kopie, abschnitte):
+        """Erstellt die geleerte Kopie der Vorlage im Cache."""
+        temp = u'{}.{}.tmp'.format(kopie, os.getpid())
+        shutil.copyfile(vorlage, temp)
+        try:
+            if abschnitte:
+                dbHE = self.verbinden(temp)
+                try:
+                    for abschnitt in abschnitte:
+                        leeren(dbHE, abschnitt)
+                    dbHE.commit()
+                finally:
+                    verbindung = getattr(dbHE, 'confb', None)
+                    if verbindung is not None:
+                        verbindung.close()
+                    del dbHE
+            # Ein gleichzeitig laufender Export kann dieselbe Kopie schon angelegt haben
+            if os.path.exists(kopie):
+                os.remove(temp)
+            else:
+                os.rename(temp, kopie)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def bereitstellen(self, vorlage, ziel, abschnitte=()):
+        """Erstellt die HE-Datenbank ziel aus der vorbereiteten Kopie der Vorlage.
+
+        :vorlage:       Vorlage der HE-Datenbank
+        :type vorlage:  String
+
+        :ziel:          Zu erstellende HE-Datenbank. Sie darf nicht vorhanden sein.
+        :type ziel:     String
+
+        :abschnitte:    Abschnitte, deren Tabellen geleert werden (siehe init_abschnitte)
+        :type abschnitte: Tuple
+
+        :returns: Verwendetes Verfahren ('reflink' oder 'kopie')
+        """
+        if not os.path.isdir(self.verzeichnis):
+            os.makedirs(self.verzeichnis)
+        pruefsumme = self.pruefsumme(vorlage)
+        schluessel = hashlib.md5(u','.join(sorted(abschnitte)).encode('utf-8')).hexdigest()[:8]
+        kopie = os.path.join(self.verzeichnis, u'{}_{}{}'.format(pruefsumme, schluessel,
+                                                                 os.path.splitext(vorlage)[1]))
+        if not os.path.exists(kopie):
+            logger.debug(u'he_vorlage: Kopie der Vorlage {} wird vorbereitet: {}'.format(vorlage, kopie))
+            self._vorbereiten(vorlage, kopie, abschnitte)
+        return klonen(kopie, ziel)
@@ -0,0 +1,1078 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Schreibschicht fuer HYSTEM-EXTRAN-Datenbanken
+  =============================================
+
+  Vorbereitete (prepared) SQL-Anweisungen fuer das Schreiben in die HE-Firebird-Datenbank.
+  Jede INSERT- bzw. UPDATE-Anweisung wird pro Tabelle nur einmal vorbereitet und anschliessend
+  blockweise mit gebundenen Parametern ausgefuehrt (executemany). Mit der Option "executeblock"
+  werden jeweils mehrere Datensaetze in einer EXECUTE BLOCK-Anweisung uebertragen (HEExecuteBlock).
+
+  | Dateiname            : he_writer.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+logger = logging.getLogger('QKan')
+
+
+# Abbildung der Firebird-Datentypen (RDB$FIELDS.RDB$FIELD_TYPE) auf SQL-Datentypen
+FELDTYPEN = {7: u'SMALLINT', 8: u'INTEGER', 16: u'BIGINT', 10: u'FLOAT', 27: u'DOUBLE PRECISION',
+             12: u'DATE', 13: u'TIME', 35: u'TIMESTAMP', 14: u'CHAR', 37: u'VARCHAR', 261: u'BLOB'}
+
+
+def feldtyp(typ, subtyp, scale, precision, zeichen, laenge):
+    """SQL-Datentyp zu den Angaben einer Spalte aus RDB$FIELDS."""
+    sqltyp = FELDTYPEN.get(typ, u'VARCHAR')
+    if typ in (7, 8, 16) and scale and scale < 0:
+        sqltyp = u'NUMERIC({}, {})'.format(precision or 18, -scale)
+    elif sqltyp in (u'CHAR', u'VARCHAR'):
+        sqltyp = u'{}({})'.format(sqltyp, zeichen or laenge or 255)
+    elif sqltyp == u'BLOB':
+        sqltyp = u'BLOB SUB_TYPE {}'.format(subtyp or 0)
+    return sqltyp
+
+
+def parameterbytes(typ):
+    """Laenge eines Parameters des SQL-Datentyps typ in der Eingabenachricht einschliesslich
+    NULL-Kennzeichen und Ausrichtung (geschaetzt, Texte mit einem Byte je Zeichen)."""
+    if typ.startswith((u'CHAR(', u'VARCHAR(')):
+        return int(typ[typ.index(u'(') + 1:typ.index(u')')]) + 6
+    return {u'SMALLINT': 2, u'INTEGER': 4, u'FLOAT': 4, u'DATE': 4, u'TIME': 4}.get(typ, 8) + 4
+
+
+class ExportAbbruch(Exception):
+    """Der Export wurde vom Benutzer abgebrochen."""
+    pass
+
+
+class IndexFehler(Exception):
+    """Deaktivierte Indizes konnten nicht wieder aktiviert werden. Die Daten der HE-Datenbank sind
+    vollstaendig, die Indizes muessen aber von Hand aktiviert werden (ALTER INDEX ... ACTIVE).
+
+    :indizes:       Namen der weiterhin deaktivierten Indizes
+    :type indizes:  list
+    """
+
+    def __init__(self, indizes, fehler):
+        Exception.__init__(self, u'Indizes {} konnten nicht wieder aktiviert werden: {}'.format(
+            u', '.join(indizes), fehler))
+        self.indizes = indizes
+
+
+class HEStatement(object):
+    """Vorbereitete Anweisung, deren Parametersaetze gesammelt und blockweise ausgefuehrt werden.
+
+    :writer:        Schreibobjekt, zu dem die Anweisung gehoert
+    :type writer:   HEWriter
+
+    :sql:           SQL-Anweisung mit Platzhaltern "?"
+    :type sql:      String
+
+    :schluessel:    Position des Namensfeldes in den Parametersaetzen. Ist diese angegeben, werden
+                    Datensaetze, deren Name in der Zieltabelle schon vorhanden ist, nicht eingefuegt.
+    :type schluessel: Integer
+    """
+
+    def __init__(self, writer, sql, tabelle=None, schluessel=None, bloecke=None):
+        self.writer = writer
+        self.sql = sql
+        self.tabelle = tabelle
+        self.schluessel = schluessel
+        self.bloecke = bloecke          # HEExecuteBlock oder None: executemany
+        self.puffer = []
+        self.namen = set()              # Namen in der Zieltabelle einschliesslich Puffer
+        self._vorbereitet = None
+
+    def vorbereiten(self):
+        """Bereitet die Anweisung einmalig auf dem Cursor vor (fdb: cursor.prep)."""
+        if self._vorbereitet is None:
+            cursor = self.writer.cursor
+            if hasattr(cursor, 'prep'):
+                self._vorbereitet = cursor.prep(self.sql)
+            else:
+                self._vorbereitet = self.sql
+        return self._vorbereitet
+
+    def namen_laden(self):
+        """Liest die in der Zieltabelle vorhandenen Namen einmalig in eine Menge ein.
+
+        Ersetzt die fruehere Pruefung "WHERE '...' NOT IN (SELECT NAME FROM ...)" je Datensatz,
+        deren Aufwand mit der Fuellung der Zieltabelle quadratisch anwuchs.
+        """
+        self.flush()
+        cursor = self.writer.cursor
+        cursor.execute(u'SELECT NAME FROM {}'.format(self.tabelle))
+        self.namen = set(row[0] for row in cursor.fetchall())
+
+    def execute(self, parameter):
+        """Uebernimmt einen Parametersatz in den Puffer und schreibt den Puffer, wenn er voll ist.
+
+        :returns: False, wenn der Datensatz wegen eines vorhandenen Namens uebersprungen wurde.
+        """
+        if self.schluessel is not None:
+            name = parameter[self.schluessel]
+            if name in self.namen:
+                self.writer.uebersprungen()
+                return False
+            self.namen.add(name)
+        self.puffer.append(tuple(parameter))
+        if len(self.puffer) >= self.writer.blockgroesse:
+            self.senden()
+        return True
+
+    def senden(self):
+        """Uebergibt den Puffer zum Schreiben: an die Pipeline, falls vorhanden, sonst direkt."""
+        if not self.puffer:
+            return
+        puffer, self.puffer = self.puffer, []
+        if self.writer.pipeline is not None:
+            self.writer.pipeline.senden(self, puffer)
+        else:
+            self.schreiben(puffer)
+
+    def flush(self):
+        """Schreibt alle gepufferten Parametersaetze und wartet, bis sie geschrieben sind."""
+        self.senden()
+        if self.writer.pipeline is not None:
+            self.writer.pipeline.warten()
+
+    def schreiben(self, puffer):
+        """Schreibt Parametersaetze mit einem executemany-Aufruf bzw. in EXECUTE BLOCK-Anweisungen."""
+        anzahl = len(puffer)
+        self.writer.pruefen()
+        start = time.time()
+        try:
+            if self.bloecke is not None:
+                self.bloecke.schreiben(self.writer.cursor, puffer)
+            else:
+                self.writer.cursor.executemany(self.vorbereiten(), puffer)
+        except BaseException:
+            logger.debug(u'he_writer: Fehler beim Schreiben von {} Datensaetzen:\n{}'.format(
+                anzahl, self.sql))
+            raise
+        self.writer.geschrieben(anzahl, time.time() - start)
+
+    def verwerfen(self):
+        """Verwirft die gepufferten, noch nicht geschriebenen Parametersaetze."""
+        self.puffer = []
+
+
+class HEExecuteBlock(object):
+    """Uebertraegt mehrere Parametersaetze einer Anweisung in einer EXECUTE BLOCK-Anweisung:
+
+        EXECUTE BLOCK (P0 INTEGER = ?, P1 VARCHAR(30) = ?, P2 INTEGER = ?, ...)
+        AS BEGIN
+          INSERT INTO SCHACHT (ID, NAME) VALUES (:P0, :P1);
+          INSERT INTO SCHACHT (ID, NAME) VALUES (:P2, :P3);
+          ...
+        END
+
+    Statt eines Netzwerkaufrufs je Datensatz wird damit ein Aufruf je Block benoetigt. Die Anzahl
+    der Datensaetze je Block ist durch die Laenge der Anweisung und der Eingabenachricht begrenzt,
+    die mit der Anzahl und Breite der Spalten waechst. Die moeglichen Blockgroessen sind die
+    Zweierpotenzen unterhalb dieser Grenze und die Grenze selbst, so dass nur wenige Bloecke
+    vorbereitet werden muessen. Beginnend mit START wird die naechstgroessere Stufe gewaehlt, solange
+    die gemessene Dauer je Datensatz dadurch abnimmt, und die naechstkleinere, wenn sie schneller war.
+
+    :sql:           Anweisung fuer einen Datensatz mit Platzhaltern "?"
+    :type sql:      String
+
+    :typen:         SQL-Datentypen der Parameter
+    :type typen:    List
+    """
+
+    # Grenzen von Firebird 2.5: 64 KB je Anweisung und je Eingabenachricht
+    MAX_ANWEISUNG = 60000
+    MAX_NACHRICHT = 60000
+    MAX_ZEILEN = 1024
+    START = 16
+
+    def __init__(self, sql, typen):
+        self.teile = sql.split(u'?')
+        self.typen = list(typen)
+        self.breite = sum(parameterbytes(typ) for typ in self.typen)
+        self.vorbereitet = {}           # Anzahl Datensaetze -> vorbereitete Anweisung
+        self.je_zeile = {}              # Anzahl Datensaetze -> gemittelte Dauer je Datensatz
+
+        self.stufen = [1]
+        while self.stufen[-1] * 2 <= self.MAX_ZEILEN and self.passt(self.stufen[-1] * 2):
+            self.stufen.append(self.stufen[-1] * 2)
+        unten, oben = self.stufen[-1], min(self.stufen[-1] * 2, self.MAX_ZEILEN + 1)
+        while oben - unten > 1:
+            mitte = (unten + oben) // 2
+            if self.passt(mitte):
+                unten = mitte
+            else:
+                oben = mitte
+        if unten > self.stufen[-1]:
+            self.stufen.append(unten)
+        self.stufe = max(i for i, zeilen in enumerate(self.stufen) if zeilen <= self.START)
+
+    @property
+    def zeilen(self):
+        """Aktuelle Anzahl Datensaetze je Block."""
+        return self.stufen[self.stufe]
+
+    @property
+    def max_zeilen(self):
+        return self.stufen[-1]
+
+    def passt(self, zeilen):
+        """True, wenn ein Block mit der angegebenen Anzahl Datensaetze die Grenzen einhaelt."""
+        return zeilen * self.breite <= self.MAX_NACHRICHT and len(self.text(zeilen)) <= self.MAX_ANWEISUNG
+
+    def text(self, zeilen):
+        """Liefert die EXECUTE BLOCK-Anweisung fuer die angegebene Anzahl Datensaetze."""
+        parameter = []
+        anweisungen = []
+        for zeile in range(zeilen):
+            namen = []
+            for typ in self.typen:
+                namen.append(u':P{}'.format(len(parameter)))
+                parameter.append(u'P{} {} = ?'.format(len(parameter), typ))
+            teile = [self.teile[0]]
+            for name, teil in zip(namen, self.teile[1:]):
+                teile.extend((name, teil))
+            anweisungen.append(u'  {};'.format(u''.join(teile)))
+        return u'EXECUTE BLOCK ({})\nAS BEGIN\n{}\nEND'.format(u', '.join(parameter), u'\n'.join(anweisungen))
+
+    def schreiben(self, cursor, puffer):
+        """Schreibt die Parametersaetze in Bloecken der aktuellen Groesse. Der Rest wird in
+        Bloecken der kleineren Stufen geschrieben."""
+        pos = 0
+        while pos < len(puffer):
+            zeilen = max(z for z in self.stufen[:self.stufe + 1] if z <= len(puffer) - pos)
+            if zeilen not in self.vorbereitet:
+                sql = self.text(zeilen)
+                self.vorbereitet[zeilen] = cursor.prep(sql) if hasattr(cursor, 'prep') else sql
+            parameter = []
+            for zeile in puffer[pos:pos + zeilen]:
+                parameter.extend(zeile)
+            start = time.time()
+            cursor.execute(self.vorbereitet[zeilen], parameter)
+            self.messen(zeilen, time.time() - start)
+            pos += zeilen
+
+    def messen(self, zeilen, dauer):
+        """Passt die Anzahl Datensaetze je Block an die gemessene Dauer eines Blocks an."""
+        if zeilen != self.zeilen:
+            return
+        je_zeile = dauer / zeilen
+        if zeilen in self.je_zeile:
+            je_zeile = 0.7 * self.je_zeile[zeilen] + 0.3 * je_zeile
+        self.je_zeile[zeilen] = je_zeile
+        kleiner = self.je_zeile.get(self.stufen[self.stufe - 1]) if self.stufe > 0 else None
+        groesser = self.je_zeile.get(self.stufen[self.stufe + 1]) if zeilen < self.max_zeilen else None
+        if zeilen < self.max_zeilen and (groesser is None and (kleiner is None or je_zeile < 0.95 * kleiner)
+                                         or groesser is not None and groesser < je_zeile):
+            self.stufe += 1
+        elif kleiner is not None and kleiner < 0.95 * je_zeile:
+            self.stufe -= 1
+        if self.zeilen != zeilen:
+            logger.debug(u'he_writer: EXECUTE BLOCK mit {} statt {} Datensaetzen ({:.3f} ms je Datensatz)'.format(
+                self.zeilen, zeilen, 1000. * je_zeile))
+
+
+class HEPipeline(object):
+    """Schreibt die Bloecke der Anweisungen in einem eigenen Thread.
+
+    Waehrend die Datensaetze im Exportthread aus der QKan-Datenbank gelesen und aufbereitet werden,
+    werden die vorherigen Bloecke in die HE-Datenbank geschrieben. Die Warteschlange ist begrenzt,
+    so dass das Lesen hoechstens tiefe Bloecke vorauslaeuft. Vor jedem anderen Zugriff auf die
+    HE-Datenbank (Abfragen, MERGE, Sicherungspunkte, Commit) wird mit warten() gewartet, bis alle
+    Bloecke geschrieben sind. Ein Fehler beim Schreiben wird beim naechsten senden() bzw. warten()
+    im Exportthread ausgeloest.
+
+    Die QKan-Datenbank wird weiterhin nur im Exportthread gelesen, weil die SpatiaLite-Verbindung
+    an den Thread gebunden ist, in dem sie geoeffnet wurde.
+
+    :tiefe:         Anzahl der Bloecke in der Warteschlange
+    :type tiefe:    Integer
+    """
+
+    def __init__(self, tiefe=4):
+        self.warteschlange = queue.Queue(maxsize=tiefe)
+        self.fehler = None
+        self._verwerfen = False
+        self.thread = threading.Thread(target=self._lauf, name='QKan-HE-Schreiben')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _lauf(self):
+        while True:
+            auftrag = self.warteschlange.get()
+            try:
+                if auftrag is None:
+                    return
+                if self.fehler is None and not self._verwerfen:
+                    anweisung, puffer = auftrag
+                    anweisung.schreiben(puffer)
+            except BaseException as err:
+                self.fehler = err
+            finally:
+                self.warteschlange.task_done()
+
+    def _fehler_ausloesen(self):
+        if self.fehler is not None:
+            fehler, self.fehler = self.fehler, None
+            raise fehler
+
+    def senden(self, anweisung, puffer):
+        """Stellt einen Block in die Warteschlange. Blockiert, wenn die Warteschlange voll ist."""
+        self._fehler_ausloesen()
+        self.warteschlange.put((anweisung, puffer))
+
+    def warten(self):
+        """Wartet, bis alle Bloecke geschrieben sind."""
+        self.warteschlange.join()
+        self._fehler_ausloesen()
+
+    def verwerfen(self):
+        """Verwirft die noch nicht geschriebenen Bloecke und einen aufgetretenen Fehler."""
+        self._verwerfen = True
+        self.warteschlange.join()
+        self._verwerfen = False
+        self.fehler = None
+
+    def beenden(self):
+        """Beendet den Thread, nachdem alle Bloecke geschrieben sind."""
+        self.warteschlange.put(None)
+        self.thread.join()
+
+
+class HEStaging(object):
+    """Sammelt geaenderte Datensaetze in einer temporaeren Firebird-Tabelle und uebertraegt sie
+    anschliessend mit einer einzigen MERGE-Anweisung in die Zieltabelle.
+
+    :writer:        Schreibobjekt, zu dem die Anweisung gehoert
+    :type writer:   HEWriter
+
+    :tabelle:       Name der HE-Zieltabelle
+    :type tabelle:  String
+
+    :spalten:       Liste der Spaltennamen in der Reihenfolge der Parametersaetze
+    :type spalten:  Tuple
+
+    :schluessel:    Spalte, ueber die die Datensaetze zugeordnet werden
+    :type schluessel: String
+
+    :ausgenommen:   Spalten, die in der Zieltabelle nicht geaendert werden (z.B. die ID)
+    :type ausgenommen: Tuple
+    """
+
+    def __init__(self, writer, tabelle, spalten, schluessel='NAME', ausgenommen=('ID',)):
+        self.writer = writer
+        self.tabelle = tabelle
+        self.spalten = tuple(spalten)
+        self.schluessel = schluessel
+        self.stage = u'QKAN_STAGE_{}'.format(tabelle)
+        self.pos = self.spalten.index(schluessel)
+        self.namen = set()
+        self.anzahl = 0
+
+        geaendert = [sp for sp in self.spalten if sp != schluessel and sp not in ausgenommen]
+        if writer.firebird:
+            self.sql = u"""MERGE INTO {tabelle} t USING {stage} s ON t.{schluessel} = s.{schluessel}
+                WHEN MATCHED THEN UPDATE SET {zuweisungen}""".format(
+                tabelle=tabelle, stage=self.stage, schluessel=schluessel,
+                zuweisungen=', '.join([u't.{sp} = s.{sp}'.format(sp=sp) for sp in geaendert]))
+        else:
+            # Ohne MERGE (SQLite): Zuweisung je Spalte ueber eine Unterabfrage
+            self.sql = u"""UPDATE {tabelle} SET {zuweisungen}
+                WHERE {schluessel} IN (SELECT {schluessel} FROM {stage})""".format(
+                tabelle=tabelle, stage=self.stage, schluessel=schluessel,
+                zuweisungen=', '.join([u'{sp} = (SELECT s.{sp} FROM {stage} s WHERE s.{schluessel} = {tabelle}.{schluessel})'.format(
+                    sp=sp, stage=self.stage, schluessel=schluessel, tabelle=tabelle) for sp in geaendert]))
+
+        self.writer.stagetabelle(self.stage, tabelle, self.spalten)
+        sql = u'INSERT INTO {stage} ({spalten}) VALUES ({platzhalter})'.format(
+            stage=self.stage, spalten=', '.join(self.spalten), platzhalter=', '.join(['?'] * len(self.spalten)))
+        self.einfuegen = HEStatement(writer, sql, self.stage, bloecke=writer.bloecke(sql, tabelle, self.spalten))
+
+    def execute(self, parameter):
+        """Uebernimmt einen geaenderten Datensatz in die temporaere Tabelle. Mehrfach vorkommende
+        Namen werden nur beim ersten Auftreten beruecksichtigt.
+
+        :returns: False, wenn der Datensatz wegen eines doppelten Namens uebersprungen wurde.
+        """
+        name = parameter[self.pos]
+        if name in self.namen:
+            self.writer.uebersprungen()
+            return False
+        self.namen.add(name)
+        self.anzahl += 1
+        return self.einfuegen.execute(parameter)
+
+    def flush(self):
+        self.einfuegen.flush()
+
+    def verwerfen(self):
+        self.einfuegen.verwerfen()
+        self.namen = set()
+        self.anzahl = 0
+
+    def anwenden(self):
+        """Uebertraegt alle gesammelten Datensaetze in die Zieltabelle.
+
+        :returns: Anzahl der zugeordneten und der nicht zugeordneten Datensaetze
+        :rtype: tuple
+        """
+        self.einfuegen.flush()
+        start = time.time()
+        cursor = self.writer.cursor
+        cursor.execute(u"""SELECT COUNT(*) FROM {stage} s
+            WHERE EXISTS (SELECT 1 FROM {tabelle} t WHERE t.{schluessel} = s.{schluessel})""".format(
+            stage=self.stage, tabelle=self.tabelle, schluessel=self.schluessel))
+        treffer = int(cursor.fetchone()[0])
+        cursor.execute(self.sql)
+        cursor.execute(u'DELETE FROM {}'.format(self.stage))
+        anzahl = self.anzahl
+        self.namen = set()
+        self.anzahl = 0
+        if self.writer.statistik is not None:
+            self.writer.statistik.geaendert(treffer, time.time() - start)
+            self.writer.statistik.uebersprungen(anzahl - treffer)
+        logger.debug(u'he_writer: {} {}: {} Datensaetze geaendert, {} nicht vorhanden'.format(
+            self.tabelle, self.schluessel, treffer, anzahl - treffer))
+        return treffer, anzahl - treffer
+
+
+class HEDelta(object):
+    """Einfuegeanweisung fuer den inkrementellen Export.
+
+    Objekte, die in der Zieltabelle fehlen, werden eingefuegt. Vorhandene Objekte werden nur
+    geaendert, wenn sich die Pruefsumme ihrer Werte gegenueber dem letzten Export geaendert hat.
+    Objekte des letzten Exports, die in diesem Export fehlen, werden mit abschliessen() geloescht.
+
+    :writer:        Schreibobjekt, zu dem die Anweisung gehoert
+    :type writer:   HEWriter
+
+    :einfuegen:     INSERT-Anweisung der Zieltabelle mit Namenspruefung
+    :type einfuegen: HEStatement
+
+    :spalten:       Liste der Spaltennamen in der Reihenfolge der Parametersaetze
+    :type spalten:  Tuple
+
+    :ausgenommen:   Spalten, die nicht in die Pruefsumme eingehen (ID und Zeitstempel)
+    :type ausgenommen: Tuple
+    """
+
+    # Tabellen mit abhaengigen Datensaetzen, die ueber die ID verknuepft sind
+    ABHAENGIG = {'SPEICHERSCHACHT': ('TABELLENINHALTE',)}
+
+    def __init__(self, writer, einfuegen, spalten, schluessel='NAME', ausgenommen=('ID', 'LASTMODIFIED')):
+        self.writer = writer
+        self.einfuegen = einfuegen
+        self.tabelle = einfuegen.tabelle
+        self.spalten = tuple(spalten)
+        self.schluessel = schluessel
+        self.sql = einfuegen.sql
+        self.pos = self.spalten.index(schluessel)
+        self.vergleich = [i for i, sp in enumerate(self.spalten) if sp not in ausgenommen]
+        self.aendern = None
+        self.gesehen = set()
+        self.offen = False
+
+    def beginnen(self):
+        """Beginnt den Export der Tabelle in einem Abschnitt."""
+        self.gesehen = set()
+        self.offen = True
+        self.writer.exportstand.beginnen(self.tabelle)
+
+    def execute(self, parameter):
+        """Uebernimmt einen Datensatz.
+
+        :returns: True, wenn der Datensatz neu eingefuegt wird (d.h. eine neue ID belegt).
+        """
+        name = parameter[self.pos]
+        if name in self.gesehen:
+            self.writer.uebersprungen()
+            return False
+        self.gesehen.add(name)
+
+        pruefsumme = self.writer.exportstand.pruefsumme([parameter[i] for i in self.vergleich])
+        self.writer.exportstand.merken(self.tabelle, name, pruefsumme)
+        if name not in self.einfuegen.namen:
+            return self.einfuegen.execute(parameter)
+        if self.writer.exportstand.alt(self.tabelle, name) == pruefsumme:
+            self.writer.uebersprungen()
+            return False
+        if self.aendern is None:
+            self.aendern = self.writer.merge(self.tabelle, self.spalten, self.schluessel)
+        self.aendern.execute(parameter)
+        return False
+
+    def flush(self):
+        self.einfuegen.flush()
+        if self.aendern is not None:
+            self.aendern.flush()
+
+    def verwerfen(self):
+        self.gesehen = set()
+        self.offen = False
+
+    def abschliessen(self):
+        """Uebertraegt die geaenderten Datensaetze und loescht die nicht mehr vorhandenen Objekte.
+
+        :returns: Anzahl der geaenderten und der geloeschten Datensaetze
+        :rtype: tuple
+        """
+        if not self.offen:
+            return 0, 0
+        self.offen = False
+        self.einfuegen.flush()
+        geaendert = 0
+        if self.aendern is not None:
+            geaendert = self.aendern.anwenden()[0]
+
+        entfernt = [(name,) for name in self.writer.exportstand.entfernt(self.tabelle)]
+        if entfernt:
+            start = time.time()
+            cursor = self.writer.cursor
+            for abhaengig in self.ABHAENGIG.get(self.tabelle, ()):
+                cursor.executemany(u'DELETE FROM {} WHERE ID IN (SELECT ID FROM {} WHERE {} = ?)'.format(
+                    abhaengig, self.tabelle, self.schluessel), entfernt)
+            cursor.executemany(u'DELETE FROM {} WHERE {} = ?'.format(self.tabelle, self.schluessel), entfernt)
+            if self.writer.statistik is not None:
+                self.writer.statistik.geaendert(len(entfernt), time.time() - start)
+        logger.debug(u'he_writer: {} inkrementell: {} Datensaetze geaendert, {} geloescht'.format(
+            self.tabelle, geaendert, len(entfernt)))
+        return geaendert, len(entfernt)
+
+
+class HEWriter(object):
+    """Anweisungsschicht oberhalb von FBConnection.
+
+    Die Anweisungen werden pro Tabelle und Spaltenliste nur einmal erzeugt und zwischengespeichert.
+
+    :dbHE:          Datenbankobjekt der HE-Datenbank
+    :type dbHE:     FBConnection
+
+    :blockgroesse:  Anzahl Datensaetze je executemany-Aufruf
+    :type blockgroesse: Integer
+
+    :commitintervall: Transaktionsregel: 0 = der gesamte Export in einer Transaktion, die nur mit
+                    commit() abgeschlossen wird; n > 0 = Commit nach jeweils n geschriebenen Datensaetzen.
+                    Sicherungspunkte je Abschnitt werden nur bei einer Transaktion verwendet, weil ein
+                    Commit alle Sicherungspunkte aufhebt.
+    :type commitintervall: Integer
+
+    :abbruch:       Funktion ohne Argumente, die True liefert, wenn der Export abgebrochen werden soll.
+                    Sie wird vor jedem Block abgefragt.
+    :type abbruch:  Function
+
+    :statistik:     Laufzeitstatistik, an die geschriebene und uebersprungene Datensaetze gemeldet werden
+    :type statistik: Exportstatistik
+
+    :exportstand:   Exportstand fuer den inkrementellen Export. Ist er angegeben, liefert insert() fuer
+                    Tabellen mit Namensspalte eine HEDelta-Anweisung.
+    :type exportstand: Exportstand
+
+    :indexpause:    Die Indizes einer Tabelle, die nicht zu einem Constraint gehoeren, werden vor dem
+                    ersten Einfuegen deaktiviert und nach dem Laden neu aufgebaut: mit Commitintervall
+                    am Ende des Abschnitts, sonst nach dem abschliessenden Commit. Tabellen, die ueber
+                    merge() geaendert werden, und der inkrementelle Export sind ausgenommen, weil die
+                    Zuordnung ueber den Namen den Index benoetigt.
+    :type indexpause: Boolean
+
+    :pipeline:      Anzahl der Bloecke, die in einem eigenen Thread geschrieben werden, waehrend die
+                    naechsten Datensaetze gelesen werden (siehe HEPipeline). 0: kein eigener Thread
+    :type pipeline: Integer
+
+    :executeblock:  INSERT- und UPDATE-Anweisungen werden mit mehreren Datensaetzen je EXECUTE BLOCK
+                    uebertragen (siehe HEExecuteBlock). Nur fuer Firebird.
+    :type executeblock: Boolean
+    """
+
+    def __init__(self, dbHE, blockgroesse=1000, commitintervall=0, abbruch=None, statistik=None,
+                 exportstand=None, indexpause=False, pipeline=0, executeblock=False):
+        self.dbHE = dbHE
+        self.blockgroesse = blockgroesse
+        self.commitintervall = commitintervall
+        self.abbruch = abbruch
+        self.statistik = statistik
+        self.exportstand = exportstand
+        self.indexpause = indexpause and exportstand is None
+        self.pausiert = []              # deaktivierte Indizes
+        self._pausiert_tabellen = set()
+        self._mit_index = set()         # Tabellen, deren Indizes aktiv bleiben
+        self.warnungen = []             # Meldungen fuer den Benutzer, die den Export nicht abbrechen
+        self.pipeline = HEPipeline(4 if pipeline is True else pipeline) if pipeline else None
+        self.executeblock = executeblock and self.firebird
+        self._typen = {}                # Spaltentypen je Tabelle fuer EXECUTE BLOCK
+        self.anweisungen = {}
+        self.stagetabellen = []
+        self.sicherungspunkt = None
+        self._seit_commit = 0           # Anzahl der seit dem letzten Commit geschriebenen Datensaetze
+
+    @property
+    def cursor(self):
+        return self.dbHE.curfb
+
+    @property
+    def firebird(self):
+        """True, wenn die HE-Datenbank eine Firebird-Datenbank ist. Die Ersatzdatenbank (siehe
+        he_backend.SQLiteHE) kennt weder Systemtabellen RDB$..., MERGE noch deaktivierbare Indizes."""
+        return getattr(self.dbHE, 'dialekt', 'firebird') == 'firebird'
+
+    def insert(self, tabelle, spalten, schluessel='NAME'):
+        """Liefert die vorbereitete INSERT-Anweisung fuer eine Tabelle. Ist eine Schluesselspalte
+        angegeben, werden bei jedem Aufruf (d.h. zu Beginn jedes Abschnitts) die vorhandenen Namen
+        der Zieltabelle neu eingelesen.
+
+        :tabelle:       Name der HE-Tabelle
+        :spalten:       Liste der Spaltennamen in der Reihenfolge der Parametersaetze
+        :schluessel:    Spalte mit dem Objektnamen zum Ausschluss von Duplikaten, None: keine Pruefung
+        """
+        if self.indexpause:
+            self._index_pausieren(tabelle)
+        key = ('INSERT', tabelle, tuple(spalten), schluessel)
+        if key not in self.anweisungen:
+            sql = u'INSERT INTO {tabelle} ({spalten}) VALUES ({platzhalter})'.format(
+                tabelle=tabelle, spalten=', '.join(spalten),
+                platzhalter=', '.join(['?'] * len(spalten)))
+            pos = None if schluessel is None else list(spalten).index(schluessel)
+            self.anweisungen[key] = HEStatement(self, sql, tabelle, pos, self.bloecke(sql, tabelle, spalten))
+        anweisung = self.anweisungen[key]
+        if anweisung.schluessel is not None:
+            anweisung.namen_laden()
+            if self.exportstand is not None:
+                key = ('DELTA', tabelle, tuple(spalten), schluessel)
+                if key not in self.anweisungen:
+                    self.anweisungen[key] = HEDelta(self, anweisung, spalten, schluessel)
+                anweisung = self.anweisungen[key]
+                anweisung.beginnen()
+        return anweisung
+
+    def update(self, tabelle, spalten, schluessel='NAME'):
+        """Liefert die vorbereitete UPDATE-Anweisung fuer eine Tabelle. Der Wert fuer die
+        Schluesselspalte wird als letzter Parameter angehaengt."""
+        key = ('UPDATE', tabelle, tuple(spalten), schluessel)
+        if key not in self.anweisungen:
+            sql = u'UPDATE {tabelle} SET {zuweisungen} WHERE {schluessel} = ?'.format(
+                tabelle=tabelle, zuweisungen=', '.join([u'{} = ?'.format(sp) for sp in spalten]),
+                schluessel=schluessel)
+            self.anweisungen[key] = HEStatement(self, sql, tabelle,
+                                                bloecke=self.bloecke(sql, tabelle, tuple(spalten) + (schluessel,)))
+        return self.anweisungen[key]
+
+    def bloecke(self, sql, tabelle, spalten):
+        """Liefert fuer die Option "executeblock" die Aufteilung einer Anweisung auf EXECUTE BLOCK-
+        Anweisungen, sonst None.
+
+        :sql:           Anweisung fuer einen Datensatz mit Platzhaltern "?"
+        :tabelle:       Tabelle, aus der die Datentypen der Parameter gelesen werden
+        :spalten:       Spalten der Parameter in der Reihenfolge der Platzhalter
+        """
+        if not self.executeblock:
+            return None
+        if tabelle not in self._typen:
+            self.warten()
+            self._typen[tabelle] = self.spaltentypen(tabelle)
+        return HEExecuteBlock(sql, [self._typen[tabelle].get(sp, u'VARCHAR(255)') for sp in spalten])
+
+    def merge(self, tabelle, spalten, schluessel='NAME'):
+        """Liefert die Anweisung zum gesammelten Aendern vorhandener Datensaetze einer Tabelle.
+        Die Aenderungen werden erst mit HEStaging.anwenden() in die Zieltabelle uebertragen.
+        """
+        self._mit_index.add(tabelle)
+        if tabelle in self._pausiert_tabellen:
+            logger.warning(u'he_writer: Die Indizes von {} sind fuer das Laden deaktiviert, '
+                           u'die Aenderungen werden ohne Index zugeordnet'.format(tabelle))
+        key = ('MERGE', tabelle, tuple(spalten), schluessel)
+        if key not in self.anweisungen:
+            self.anweisungen[key] = HEStaging(self, tabelle, spalten, schluessel)
+        return self.anweisungen[key]
+
+    def spaltentypen(self, tabelle):
+        """Liest die Datentypen der Spalten einer Tabelle aus den Systemtabellen.
+
+        :returns: Dictionary Spaltenname -> SQL-Datentyp
+        """
+        cursor = self.cursor
+        if not self.firebird:
+            cursor.execute(u'PRAGMA table_info("{}")'.format(tabelle))
+            return dict((zeile[1], zeile[2] or u'VARCHAR(255)') for zeile in cursor.fetchall())
+        cursor.execute(u"""
+            SELECT TRIM(rf.RDB$FIELD_NAME), f.RDB$FIELD_TYPE, f.RDB$FIELD_SUB_TYPE, f.RDB$FIELD_SCALE,
+                   f.RDB$FIELD_PRECISION, f.RDB$CHARACTER_LENGTH, f.RDB$FIELD_LENGTH
+            FROM RDB$RELATION_FIELDS rf
+            JOIN RDB$FIELDS f ON rf.RDB$FIELD_SOURCE = f.RDB$FIELD_NAME
+            WHERE rf.RDB$RELATION_NAME = ?""", (tabelle,))
+        return dict((zeile[0], feldtyp(*zeile[1:])) for zeile in cursor.fetchall())
+
+    def stagetabelle(self, stage, tabelle, spalten):
+        """Legt eine temporaere Tabelle (GLOBAL TEMPORARY) mit den Datentypen der Zieltabelle an."""
+        if stage in self.stagetabellen:
+            return
+        cursor = self.cursor
+        if not self.firebird:
+            typen = self.spaltentypen(tabelle)
+            cursor.execute(u'CREATE TEMP TABLE IF NOT EXISTS {stage} ({spalten})'.format(
+                stage=stage, spalten=', '.join([u'{} {}'.format(sp, typen.get(sp, u'VARCHAR(255)'))
+                                                for sp in spalten])))
+            self.stagetabellen.append(stage)
+            return
+        cursor.execute(u'SELECT COUNT(*) FROM RDB$RELATIONS WHERE RDB$RELATION_NAME = ?', (stage,))
+        if int(cursor.fetchone()[0]) == 0:
+            typen = self.spaltentypen(tabelle)
+            self.ddl(u'CREATE GLOBAL TEMPORARY TABLE {stage} ({spalten}) ON COMMIT PRESERVE ROWS'.format(
+                stage=stage, spalten=', '.join([u'{} {}'.format(sp, typen.get(sp, u'VARCHAR(255)'))
+                                                for sp in spalten])))
+        self.stagetabellen.append(stage)
+
+    def ddl(self, sql):
+        """Fuehrt eine DDL-Anweisung aus. DDL-Anweisungen werden in Firebird erst nach einem Commit
+        wirksam. Damit die Exporttransaktion nicht vorzeitig abgeschlossen wird, wird dafuer nach
+        Moeglichkeit eine eigene Transaktion verwendet (fdb: Connection.trans)."""
+        self.separat([sql])
+
+    def separat(self, anweisungen, abfrage=None, parameter=()):
+        """Fuehrt Anweisungen in einer eigenen, sofort abgeschlossenen Transaktion aus.
+
+        :anweisungen:   Liste von SQL-Anweisungen ohne Ergebnis
+        :abfrage:       Abschliessende Abfrage, deren Ergebnis geliefert wird
+        :parameter:     Parameter der Abfrage
+
+        :returns: Ergebnis der Abfrage (fetchall) oder None
+        """
+        self.warten()
+        ergebnis = None
+        verbindung = getattr(self.dbHE, 'confb', None)
+        if verbindung is not None and hasattr(verbindung, 'trans'):
+            transaktion = verbindung.trans()
+            transaktion.begin()
+            try:
+                cursor = transaktion.cursor()
+                for sql in anweisungen:
+                    cursor.execute(sql)
+                if abfrage is not None:
+                    cursor.execute(abfrage, parameter)
+                    ergebnis = cursor.fetchall()
+                transaktion.commit()
+            except BaseException:
+                transaktion.rollback()
+                raise
+        else:
+            for sql in anweisungen:
+                self.cursor.execute(sql)
+            if abfrage is not None:
+                self.cursor.execute(abfrage, parameter)
+                ergebnis = self.cursor.fetchall()
+            self.commit()
+        return ergebnis
+
+    def indizes(self, tabelle):
+        """Liefert die aktiven Indizes einer Tabelle, die nicht zu einem Constraint (Primaer- oder
+        Fremdschluessel, UNIQUE) gehoeren und daher deaktiviert werden koennen. SQLite kennt keine
+        deaktivierten Indizes, die Liste ist dort leer."""
+        if not self.firebird:
+            return []
+        ergebnis = self.separat([], u"""
+            SELECT TRIM(i.RDB$INDEX_NAME) FROM RDB$INDICES i
+            WHERE i.RDB$RELATION_NAME = ? AND COALESCE(i.RDB$SYSTEM_FLAG, 0) = 0
+              AND COALESCE(i.RDB$INDEX_INACTIVE, 0) = 0
+              AND NOT EXISTS (SELECT 1 FROM RDB$RELATION_CONSTRAINTS c
+                              WHERE c.RDB$INDEX_NAME = i.RDB$INDEX_NAME)""", (tabelle,))
+        return [zeile[0] for zeile in ergebnis]
+
+    def indizes_deaktivieren(self, tabellen, deaktiviert=None):
+        """Deaktiviert die Indizes der Tabellen (siehe indizes).
+
+        :deaktiviert:   Liste, an die jeder deaktivierte Index sofort angehaengt wird. Schlaegt die
+                        Deaktivierung eines Index fehl, enthaelt sie die bereits deaktivierten Indizes,
+                        die wieder aktiviert werden muessen.
+        :type deaktiviert: list
+
+        :returns: Liste der deaktivierten Indizes fuer indizes_aktivieren
+        """
+        deaktiviert = [] if deaktiviert is None else deaktiviert
+        for tabelle in tabellen:
+            for index in self.indizes(tabelle):
+                self.ddl(u'ALTER INDEX {} INACTIVE'.format(index))
+                deaktiviert.append(index)
+        return deaktiviert
+
+    def _index_pausieren(self, tabelle):
+        """Deaktiviert die Indizes einer Tabelle vor dem ersten Einfuegen (Option indexpause)."""
+        if tabelle in self._pausiert_tabellen or tabelle in self._mit_index:
+            return
+        self._pausiert_tabellen.add(tabelle)
+        try:
+            self.indizes_deaktivieren([tabelle], self.pausiert)
+        except BaseException as err:
+            # Der Export wird mit aktiven Indizes fortgesetzt, nur langsamer. Bereits deaktivierte
+            # Indizes stehen in self.pausiert und werden wie die uebrigen wiederhergestellt.
+            text = u'Indizes von {} konnten nicht deaktiviert werden, die Tabelle wird mit aktiven ' \
+                   u'Indizes geladen: {}'.format(tabelle, err)
+            logger.warning(u'he_writer: {}'.format(text))
+            self.warnungen.append(text)
+
+    def indizes_wiederherstellen(self):
+        """Baut die mit der Option indexpause deaktivierten Indizes wieder auf. Wird nach dem Commit,
+        nach einem Rollback und beim Aufraeumen aufgerufen, damit die HE-Datenbank in keinem Fall mit
+        deaktivierten Indizes zurueckbleibt.
+
+        Loest IndexFehler aus, wenn Indizes nicht wieder aktiviert werden konnten."""
+        if not self.pausiert:
+            return
+        start = time.time()
+        indizes, self.pausiert = self.pausiert, []
+        self.indizes_aktivieren(indizes)
+        logger.debug(u'he_writer: {} Indizes in {:.2f} s neu aufgebaut'.format(len(indizes), time.time() - start))
+
+    def indizes_aktivieren(self, indizes):
+        """Aktiviert die Indizes wieder. Firebird baut sie dabei neu auf. Schlaegt die Aktivierung
+        eines Index fehl, werden die uebrigen trotzdem aktiviert und anschliessend IndexFehler
+        ausgeloest."""
+        fehlend = []
+        fehler = None
+        for index in indizes:
+            try:
+                self.ddl(u'ALTER INDEX {} ACTIVE'.format(index))
+            except BaseException as err:
+                logger.error(u'he_writer: Index {} konnte nicht wieder aktiviert werden: {}'.format(index, err))
+                fehlend.append(index)
+                fehler = err
+        if fehlend:
+            raise IndexFehler(fehlend, fehler)
+
+    def flush(self):
+        """Schreibt die Puffer aller Anweisungen."""
+        for anweisung in self.anweisungen.values():
+            anweisung.flush()
+
+    def warten(self):
+        """Wartet, bis die Pipeline alle uebergebenen Bloecke geschrieben hat."""
+        if self.pipeline is not None:
+            self.pipeline.warten()
+
+    def ids(self, tabelle, schluessel='NAME'):
+        """Liefert die IDs der vorhandenen Datensaetze einer Tabelle.
+
+        :returns: Dictionary Name -> ID
+        """
+        self.warten()
+        cursor = self.cursor
+        cursor.execute(u'SELECT {}, ID FROM {}'.format(schluessel, tabelle))
+        return dict(cursor.fetchall())
+
+    # Transaktionssteuerung ---------------------------------------------------------------------
+
+    def pruefen(self):
+        """Loest ExportAbbruch aus, wenn der Export abgebrochen werden soll."""
+        if self.abbruch is not None and self.abbruch():
+            raise ExportAbbruch(u'Export durch Benutzer abgebrochen')
+
+    def uebersprungen(self, anzahl=1):
+        """Zaehlt wegen vorhandener Namen uebersprungene Datensaetze."""
+        if self.statistik is not None:
+            self.statistik.uebersprungen(anzahl)
+
+    def geschrieben(self, anzahl, sekunden=0.):
+        """Zaehlt geschriebene Datensaetze und schliesst bei gesetztem Commitintervall die
+        Transaktion ab, sobald das Intervall erreicht ist."""
+        if self.statistik is not None:
+            self.statistik.geschrieben(anzahl, sekunden)
+        self._seit_commit += anzahl
+        if self.commitintervall and self._seit_commit >= self.commitintervall:
+            if self.pipeline is not None:
+                # Aufruf im Thread der Pipeline: Ein Warten auf die Pipeline wuerde blockieren
+                self._abschliessen()
+            else:
+                self.commit()
+
+    def abschnitt(self, name):
+        """Beginnt einen Exportabschnitt. Bei einer einzigen Transaktion wird ein Sicherungspunkt
+        gesetzt, auf den bei einem Fehler im Abschnitt zurueckgesetzt werden kann."""
+        self.flush()
+        if not self.commitintervall:
+            self.sicherungspunkt = u'QKAN_{}'.format(name.upper())
+            self.cursor.execute(u'SAVEPOINT {}'.format(self.sicherungspunkt))
+
+    def abschnitt_ende(self):
+        """Schliesst einen Exportabschnitt ab und gibt den Sicherungspunkt frei. Beim inkrementellen
+        Export werden dabei die Aenderungen und Loeschungen des Abschnitts uebertragen."""
+        self.flush()
+        for key, anweisung in list(self.anweisungen.items()):
+            if key[0] == 'DELTA':
+                anweisung.abschliessen()
+        # Mit Commitintervall sind die geladenen Daten nach dem Commit abgeschlossen, die Indizes
+        # koennen je Abschnitt neu aufgebaut werden
+        if self.pausiert and self.commitintervall:
+            self.commit()
+            self.indizes_wiederherstellen()
+        if self.sicherungspunkt is not None:
+            self.cursor.execute(u'RELEASE SAVEPOINT {}'.format(self.sicherungspunkt))
+            self.sicherungspunkt = None
+
+    def abschnitt_verwerfen(self):
+        """Setzt die Aenderungen des laufenden Abschnitts auf den Sicherungspunkt zurueck."""
+        for anweisung in self.anweisungen.values():
+            anweisung.verwerfen()
+        if self.sicherungspunkt is not None:
+            self.cursor.execute(u'ROLLBACK TO SAVEPOINT {}'.format(self.sicherungspunkt))
+            self.sicherungspunkt = None
+
+    def commit(self):
+        """Schreibt alle Puffer und schliesst die Transaktion ab."""
+        self.flush()
+        self._abschliessen()
+
+    def _abschliessen(self):
+        self.dbHE.commit()
+        self._seit_commit = 0
+        self.sicherungspunkt = None
+
+    def rollback(self):
+        """Verwirft alle nicht abgeschlossenen Aenderungen. Bei gesetztem Commitintervall bleiben die
+        bereits abgeschlossenen Bloecke in der HE-Datenbank erhalten."""
+        try:
+            if self.pipeline is not None:
+                self.pipeline.verwerfen()
+                self.pipeline.beenden()
+                self.pipeline = None
+            try:
+                self.abschnitt_verwerfen()
+            except BaseException as err:
+                logger.debug(u'he_writer: Ruecksetzen auf Sicherungspunkt fehlgeschlagen: {}'.format(err))
+            verbindung = getattr(self.dbHE, 'confb', None)
+            if not self.firebird:
+                self.dbHE.rollback()
+            elif verbindung is not None:
+                verbindung.rollback()
+            self._seit_commit = 0
+        finally:
+            self.indizes_wiederherstellen()
+        if self.commitintervall:
+            logger.warning(u'he_writer: Export abgebrochen. Bereits abgeschlossene Bloecke '
+                           u'(Commitintervall {}) sind in der HE-Datenbank enthalten.'.format(self.commitintervall))
+
+    def aufraeumen(self):
+        """Entfernt die temporaeren Tabellen wieder aus der HE-Datenbank und baut die mit der Option
+        indexpause deaktivierten Indizes wieder auf. Der Thread der Pipeline wird beendet."""
+        try:
+            if self.pipeline is not None:
+                self.pipeline.beenden()
+                self.pipeline = None
+            self.stagetabellen_entfernen()
+        finally:
+            self.indizes_wiederherstellen()
+
+    def stagetabellen_entfernen(self):
+        """Entfernt die temporaeren Tabellen (QKAN_STAGE_*) aus der HE-Datenbank. In Firebird sind sie
+        nach dem Anlegen fester Bestandteil der Datenbank und muessen daher nach jedem Export entfernt
+        werden, auch nach einem Fehler oder Abbruch (nach rollback). Schlaegt das Entfernen einer
+        Tabelle fehl, werden die uebrigen trotzdem entfernt und anschliessend der Fehler ausgeloest."""
+        fehler = None
+        # In SQLite sind die Tabellen Teil der Exporttransaktion und nach einem Rollback nicht mehr vorhanden
+        sql = u'DROP TABLE {}' if self.firebird else u'DROP TABLE IF EXISTS {}'
+        stagetabellen, self.stagetabellen = self.stagetabellen, []
+        for stage in stagetabellen:
+            try:
+                self.ddl(sql.format(stage))
+            except BaseException as err:
+                logger.error(u'he_writer: Tabelle {} konnte nicht entfernt werden: {}'.format(stage, err))
+                fehler = err
+        self.anweisungen = dict((key, anw) for key, anw in self.anweisungen.items()
+                                if key[0] not in ('MERGE', 'DELTA'))
+        if fehler is not None:
+            raise fehler
+
+
+class HEIdBlock(object):
+    """Zusammenhaengender Bereich von IDs fuer einen Exportabschnitt.
+
+    Reicht der reservierte Bereich nicht aus, wird er bei der Vergabe um einen weiteren Bereich am
+    Ende der bisher reservierten IDs verlaengert. Die IDs bleiben damit eindeutig und aufsteigend.
+    """
+
+    def __init__(self, vergabe, name, start, anzahl):
+        self.vergabe = vergabe
+        self.name = name
+        self.start = start
+        self._aktuell = start           # naechste zu vergebende ID
+        self.ende = start + anzahl      # erste nicht mehr reservierte ID
+        self.anzahl = 0                 # Anzahl vergebener IDs
+
+    @property
+    def aktuell(self):
+        """Naechste zu vergebende ID."""
+        if self._aktuell >= self.ende:
+            self._aktuell, self.ende = self.vergabe.erweitern(self)
+        return self._aktuell
+
+    def weiter(self):
+        """Markiert die aktuelle ID als vergeben und schaltet auf die naechste ID weiter."""
+        self._aktuell = self.aktuell + 1
+        self.anzahl += 1
+
+
+class HEIdVergabe(object):
+    """Vergabe der IDs fuer die HE-Datenbank.
+
+    Besonderes Gimmick des ITWH-Programmiers: Die IDs der Tabellen muessen sequentiell vergeben
+    werden, weil u.a. die Tabelle "TABELLENINHALTE" mit verschiedenen Tabellen verknuepft ist.
+    ITWH$PROGINFO.NEXTID wird einmal gelesen; die Abschnitte erhalten vorab reservierte
+    zusammenhaengende Bereiche. NEXTID wird mit abschliessen() genau einmal zurueckgeschrieben.
+
+    :writer:        Schreibobjekt der HE-Datenbank
+    :type writer:   HEWriter
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        cursor = writer.cursor
+        cursor.execute(u'SELECT NEXTID FROM ITWH$PROGINFO')
+        self.nextid = int(cursor.fetchone()[0])
+        self.startid = self.nextid
+        self.bloecke = {}
+
+    def reservieren(self, name, anzahl):
+        """Reserviert einen zusammenhaengenden Bereich von IDs fuer einen Abschnitt."""
+        block = HEIdBlock(self, name, self.nextid, int(anzahl))
+        self.nextid = block.ende
+        self.bloecke[name] = block
+        return block
+
+    def block(self, name):
+        """Liefert den fuer einen Abschnitt reservierten Bereich. Ist fuer den Abschnitt nichts
+        reserviert, wird ein leerer Bereich angelegt, der bei Bedarf erweitert wird."""
+        if name not in self.bloecke:
+            return self.reservieren(name, 0)
+        return self.bloecke[name]
+
+    def erweitern(self, block):
+        """Verlaengert einen ausgeschoepften Bereich am Ende der reservierten IDs."""
+        anzahl = max(100, block.anzahl // 10)
+        logger.debug(u'he_writer: ID-Bereich {} um {} IDs erweitert'.format(block.name, anzahl))
+        start = self.nextid
+        self.nextid += anzahl
+        return start, self.nextid
+
+    def abschliessen(self):
+        """Schreibt NEXTID in die HE-Datenbank zurueck. Nicht genutzte IDs am Ende der
+        reservierten Bereiche werden dabei wieder freigegeben."""
+        self.writer.flush()
+        nextid = max([self.startid] + [block._aktuell for block in self.bloecke.values()])
+        self.writer.cursor.execute(u'UPDATE ITWH$PROGINFO SET NEXTID = ?', (nextid,))
+        return nextid
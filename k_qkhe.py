@@ -19,35 +19,110 @@
 
 """
 
-import os, shutil
+import os, json
 
-from QKan_Database.fbfunc import FBConnection
 from QKan_Database.dbfunc import DBConnection
+from he_writer import HEWriter, HEIdVergabe, ExportAbbruch, IndexFehler
+from qk_reader import datensaetze, Raumindizes, Verschneidungscache
+import geometriepool
+from exportstatistik import Exportstatistik
+from exportstand import Exportstand, standdatei
+from he_vorlage import Vorlagencache, init_abschnitte, leeren, schnell_leeren
+import he_backend
+import exportoptionen
+from abschnittsplan import Abschnittsplan
 
 # import pyspatialite.dbapi2 as splite
 # import site, shutil
 # import json
 import time
 import math
-from qgis.core import QgsMessageLog
 # from qgis.core import QgsGeometry, QgsFeature
 # import qgis.utils
-from qgis.gui import QgsMessageBar
-from qgis.utils import iface
+try:
+    from qgis.core import QgsMessageLog
+    from qgis.gui import QgsMessageBar
+    from qgis.utils import iface
+except ImportError:
+    # Aufruf ohne QGIS ueber die Kommandozeile (k_qkhe_cli.py): Die Meldungen werden nur
+    # protokolliert und an den Empfaenger weitergegeben.
+    QgsMessageLog = None
+    iface = None
+
+    class QgsMessageBar(object):
+        INFO, WARNING, CRITICAL = 0, 1, 2
 import logging
 
 logger = logging.getLogger('QKan')
 
 # Fortschritts- und Fehlermeldungen
 
+# Empfaenger der Meldungen, wenn der Export nicht im GUI-Thread laeuft (siehe export_task.py).
+# Er muss die Methoden fortschritt(text, prozent), fehlermeldung(title, text, dauer),
+# meldung(title, text, level, dauer) und abgebrochen() bereitstellen.
+_empfaenger = None
+
+def empfaenger_setzen(empfaenger):
+    global _empfaenger
+    _empfaenger = empfaenger
+
 def fortschritt(text,prozent=0.):
     logger.debug(u'{:s} ({:.0f}%)'.format(text,prozent*100.))
-    QgsMessageLog.logMessage(u'{:s} ({:.0f}%)'.format(text,prozent*100.), 'Export: ', QgsMessageLog.INFO)
+    if QgsMessageLog is not None:
+        QgsMessageLog.logMessage(u'{:s} ({:.0f}%)'.format(text,prozent*100.), 'Export: ', QgsMessageLog.INFO)
+    if _empfaenger is not None:
+        _empfaenger.fortschritt(text, prozent)
+
+def abgebrochen():
+    '''True, wenn der Benutzer den Export abgebrochen hat.'''
+    return _empfaenger is not None and _empfaenger.abgebrochen()
 
 def fehlermeldung(title, text, dauer = 0):
+    if abgebrochen():
+        # Nach einem Abbruch sind Fehler beim Lesen und Schreiben Folgen des Abbruchs (ExportAbbruch).
+        # Gemeldet wird nur der Abbruch selbst (siehe exportKanaldaten).
+        logger.debug(u'Nach Abbruch: {:s} {:s}'.format(title, text))
+        return
+    _fehler_melden(title, text, dauer)
+
+def _fehler_melden(title, text, dauer = 0):
     logger.debug(u'{:s} {:s}'.format(title,text))
-    QgsMessageLog.logMessage(u'{:s} {:s}'.format(title, text), level=QgsMessageLog.CRITICAL)
-    iface.messageBar().pushMessage(title, text, level=QgsMessageBar.CRITICAL, duration=dauer)
+    if QgsMessageLog is not None:
+        QgsMessageLog.logMessage(u'{:s} {:s}'.format(title, text), level=QgsMessageLog.CRITICAL)
+    if _empfaenger is not None:
+        _empfaenger.fehlermeldung(title, text, dauer)
+    elif iface is not None:
+        iface.messageBar().pushMessage(title, text, level=QgsMessageBar.CRITICAL, duration=dauer)
+
+def meldung(title, text, level=QgsMessageBar.INFO, dauer=0):
+    if _empfaenger is not None:
+        _empfaenger.meldung(title, text, level, dauer)
+    elif iface is not None:
+        iface.messageBar().pushMessage(title, text, level=level, duration=dauer)
+
+def _raumindizes_vorbereiten(database_QKan):
+    '''Legt in einer eigenen Verbindung die für den Export der Flächen benötigten räumlichen Indizes
+    an. Liefert die dabei angelegten Indizes, die am Ende des Exports wieder entfernt werden.'''
+    dbQK = DBConnection(database_QKan)
+    dbQK.sql(u'PRAGMA busy_timeout = 600000')
+    raumindizes = Raumindizes(dbQK)
+    for tabelle in ('flaechen', 'haltungen', 'tezg'):
+        raumindizes.sicherstellen(tabelle, 'geom')
+    angelegt = raumindizes.angelegt
+    del dbQK
+    return angelegt
+
+def _verschneidung_vorbereiten(database_QKan, auswahl, pool):
+    '''Aktualisiert in einer eigenen Verbindung den Verschneidungscache der Flächen. Liefert None,
+    wenn der Zwischenspeicher nicht verwendet werden kann, sonst das Ergebnis von aktualisieren().'''
+    dbQK = DBConnection(database_QKan)
+    dbQK.sql(u'PRAGMA busy_timeout = 600000')
+    cache = Verschneidungscache(dbQK, Raumindizes(dbQK), pool)
+    ergebnis = None
+    if cache.verfuegbar():
+        ergebnis = cache.aktualisieren(auswahl)
+    del dbQK
+    return ergebnis
 
 def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_teilgebiete,
                      fangradius = 0.1, datenbanktyp = 'spatialite', check_export = {}):
@@ -71,34 +146,218 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
     :check_export:       Liste von Export-Optionen
     :type check_export:  Dictionary
 
-    :returns: void
+    :returns: True, wenn der Export erfolgreich abgeschlossen wurde
     '''
 
-    # ITWH-Datenbank aus gewählter Vorlage kopieren
-    if os.path.exists(database_HE):
+    # Nicht angegebene Optionen erhalten die Standardwerte aus exportoptionen.py
+    check_export = exportoptionen.vervollstaendigen(check_export)
+
+    # Laufzeitstatistik je Abschnitt. Der Bericht wird am Ende jedes Exports erstellt, auch nach
+    # einem Fehler oder Abbruch.
+    statistik = Exportstatistik()
+    ressourcen = {}                         # Objekte des Exports, die am Ende aufzuräumen sind
+    ergebnis = None
+    try:
+        ergebnis = _exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_teilgebiete,
+                                     fangradius, datenbanktyp, check_export, statistik, ressourcen)
+    except BaseException as err:
+        # Fehler außerhalb der Fehlerbehandlung der einzelnen Abschnitte: Die Exporttransaktion wird
+        # zurückgesetzt, damit die HE-Datenbank nicht mit einer offenen Transaktion zurückbleibt.
+        if not isinstance(err, ExportAbbruch):
+            logger.exception(u'Export abgebrochen')
+            fehlermeldung(u"(38) Fehler in QKan_Export: \n{}\n".format(err), '')
+        writer = ressourcen.get('writer')
+        if writer is not None:
+            try:
+                writer.rollback()
+            except BaseException as fehler:
+                logger.warning(u'Rücksetzen der Exporttransaktion fehlgeschlagen: {}'.format(fehler))
+        ergebnis = False
+    finally:
+        if ergebnis is not True and abgebrochen():
+            meldung(u"Export nach HE: ", u"Der Export wurde abgebrochen.", level=QgsMessageBar.WARNING)
+        if not _ressourcen_freigeben(ressourcen):
+            ergebnis = False
+        statistik_ausgeben(statistik, ergebnis is True, database_HE, check_export)
+    return ergebnis
+
+
+def _ressourcen_freigeben(ressourcen):
+    '''Räumt nach jedem Export auf, auch nach einem Fehler oder Abbruch: Die Aufgaben der parallelen
+    Vorbereitung werden abgewartet, die temporären Tabellen der HE-Datenbank entfernt, mit der Option
+    "indexpause" deaktivierte Indizes wieder aktiviert und die vorübergehend angelegten räumlichen
+    Indizes der QKan-Datenbank entfernt.
+
+    :returns: False, wenn die HE-Datenbank dabei nicht in einen vollständigen Zustand gebracht werden konnte
+    '''
+    erfolg = True
+    plan = ressourcen.get('plan')
+    if plan is not None:
+        plan.beenden()
+
+    writer = ressourcen.get('writer')
+    if writer is not None:
+        # Die temporären Tabellen (QKAN_STAGE_*) bleiben in Firebird sonst in der HE-Datenbank
+        # und würden beim nächsten Export unabhängig von ihrem Tabellenaufbau weiterverwendet
         try:
-            os.remove(database_HE)
+            writer.stagetabellen_entfernen()
         except BaseException as err:
-            fehlermeldung(u'Fehler (33) in QKan_Export: Die HE-Datenbank ist schon vorhanden und kann nicht ersetzt werden: ',
-                str(err))
-            return False
+            _fehler_melden(u"(18) SQL-Fehler in Firebird beim Entfernen der temporären Tabellen: \n{}\n".format(err), '')
+            erfolg = False
+        try:
+            writer.aufraeumen()
+        except IndexFehler as err:
+            # Auch nach einem Abbruch melden: Die HE-Datenbank bleibt mit deaktivierten Indizes zurück
+            _fehler_melden(u"(39) Fehler in Firebird beim Aktivieren der Indizes: \n{}\n".format(err), '')
+            erfolg = False
+        for warnung in writer.warnungen:
+            meldung(u"Warnung: ", warnung, level=QgsMessageBar.WARNING)
+
+    raumindizes = ressourcen.get('raumindizes')
+    if raumindizes is not None:
+        if plan is not None and plan.enthaelt('raumindizes'):
+            try:
+                raumindizes.uebernehmen(plan.ergebnis('raumindizes'))
+            except BaseException as err:
+                logger.debug(u'Vorbereitung der räumlichen Indizes fehlgeschlagen: {}'.format(err))
+        raumindizes.entfernen()
+    return erfolg
+
+
+def statistik_ausgeben(statistik, erfolg, database_HE, check_export):
+    '''Schreibt den Bericht der Laufzeitstatistik als JSON-Datei neben die HE-Datenbank (oder in
+    die mit der Option "statistikdatei" angegebene Datei) und gibt ihn an den Empfaenger weiter.'''
+    bericht = statistik.bericht(erfolg)
+    logger.info(u'Laufzeitstatistik Export: {}'.format(json.dumps(bericht)))
+    dateiname = check_export.get('statistikdatei') or u'{}_statistik.json'.format(os.path.splitext(database_HE)[0])
     try:
-        shutil.copyfile(dbtemplate_HE, database_HE)
+        statistik.speichern(dateiname, erfolg)
     except BaseException as err:
-        fehlermeldung(u'Fehler (34) in QKan_Export: Kopieren der Vorlage HE-Datenbank fehlgeschlagen: ',
-            str(err))
+        logger.warning(u'Laufzeitstatistik konnte nicht geschrieben werden: {}'.format(err))
+    if _empfaenger is not None and hasattr(_empfaenger, 'statistik'):
+        _empfaenger.statistik(bericht)
+
+
+def _exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_teilgebiete,
+                      fangradius, datenbanktyp, check_export, statistik, ressourcen):
+    '''Export der Kanaldaten, siehe exportKanaldaten. Die Zaehler und Zeiten der Abschnitte werden
+    in statistik erfasst. In ressourcen werden die Objekte abgelegt, die exportKanaldaten nach jedem
+    Export aufraeumt, auch nach einem Fehler (Schluessel 'writer', 'raumindizes', 'plan').'''
+
+    # Mit der Option "hebackend" = "sqlite" wird statt der Firebird-Datenbank eine SQLite-Ersatzdatenbank
+    # mit dem Tabellenaufbau der Vorlage beschrieben (Tests und Laufzeitmessungen ohne Firebird). Mit
+    # "skript" wird database_HE als Firebird-SQL-Skript für eine Kopie der Vorlage geschrieben, mit der
+    # Option "skript_je_tabelle" als ein Skript je Tabelle.
+    try:
+        backend = he_backend.backend(check_export.get('hebackend', 'firebird'),
+                                     je_tabelle=check_export.get('skript_je_tabelle', False))
+    except ValueError as err:
+        fehlermeldung(u'Fehler (36) in QKan_Export: ', str(err))
         return False
-    fortschritt(u"Firebird-Datenbank aus Vorlage kopiert...",0.01)
+    if backend.offline and check_export.get('inkrementell'):
+        logger.warning(u'Ein SQL-Skript wird immer vollständig erstellt, die Option "inkrementell" wird ignoriert')
+
+    # Inkrementeller Export: Ist zur vorhandenen HE-Datenbank ein Exportstand gespeichert, werden nur
+    # die seitdem geänderten Objekte geschrieben. Sonst wird die Datenbank neu erstellt und der
+    # Exportstand für den nächsten Export angelegt.
+    exportstand = None
+    if check_export.get('inkrementell') and not backend.offline:
+        exportstand = Exportstand(standdatei(database_HE), os.path.abspath(dbtemplate_HE))
+        if not os.path.exists(database_HE) or not exportstand.laden():
+            exportstand.tabellen = {}
+            inkrementell = False
+        else:
+            inkrementell = True
+    else:
+        inkrementell = False
+        try:
+            Exportstand(standdatei(database_HE)).datei_entfernen()
+        except BaseException as err:
+            logger.warning(u'Exportstand konnte nicht entfernt werden: {}'.format(err))
+
+    geleert = set()                         # Abschnitte, deren Tabellen schon in der Vorlage geleert sind
+
+    if inkrementell:
+        fortschritt(u"Inkrementeller Export in vorhandene Firebird-Datenbank...", 0.01)
+    else:
+        # ITWH-Datenbank aus gewählter Vorlage kopieren
+        if os.path.exists(database_HE):
+            try:
+                os.remove(database_HE)
+            except BaseException as err:
+                fehlermeldung(u'Fehler (33) in QKan_Export: Die HE-Datenbank ist schon vorhanden und kann nicht ersetzt werden: ',
+                    str(err))
+                return False
+
+        # Mit der Option "vorlagencache" wird eine lokal vorgehaltene, für die init_*-Optionen bereits
+        # geleerte Kopie der Vorlage geklont. Die Tabellen dieser Abschnitte müssen dann nicht mehr
+        # geleert werden.
+        if check_export.get('vorlagencache') and backend.firebird:
+            abschnitte = init_abschnitte(check_export)
+            verzeichnis = check_export['vorlagencache']
+            vorlagen = Vorlagencache(None if verzeichnis is True else verzeichnis, backend.verbinden)
+            try:
+                verfahren = vorlagen.bereitstellen(dbtemplate_HE, database_HE, abschnitte)
+                geleert = set(abschnitte)
+                fortschritt(u"Firebird-Datenbank aus vorbereiteter Vorlage erstellt ({})...".format(verfahren), 0.01)
+            except BaseException as err:
+                logger.warning(u'Vorlagencache nicht verwendbar, die Vorlage wird kopiert: {}'.format(err))
+                if os.path.exists(database_HE):
+                    os.remove(database_HE)
+        if not os.path.exists(database_HE):
+            try:
+                backend.erstellen(dbtemplate_HE, database_HE)
+            except BaseException as err:
+                fehlermeldung(u'Fehler (34) in QKan_Export: Kopieren der Vorlage HE-Datenbank fehlgeschlagen: ',
+                    str(err))
+                return False
+            fortschritt(u"Firebird-Datenbank aus Vorlage kopiert...",0.01)
 
     # Verbindung zur Hystem-Extran-Datenbank
 
-    dbHE = FBConnection(database_HE)        # Datenbankobjekt der HE-Datenbank zum Schreiben
+    dbHE = backend.verbinden(database_HE)   # Datenbankobjekt der HE-Datenbank zum Schreiben
 
     if dbHE is None:
         fehlermeldung(u"(1) Fehler",
            'ITWH-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_HE))
         return None
 
+    # Vorbereitete Anweisungen zum Schreiben in die HE-Datenbank. Ohne Commitintervall wird der gesamte
+    # Export in einer Transaktion geschrieben, die erst am Ende abgeschlossen wird.
+    # Ein Abbruch durch den Benutzer wird vor jedem Block geprueft. Mit der Option "indexpause" werden
+    # die Indizes der Zieltabellen waehrend des Ladens deaktiviert. Mit der Option "pipeline" werden
+    # die Bloecke in einem eigenen Thread geschrieben, waehrend die naechsten Datensaetze gelesen werden.
+    # Mit der Option "executeblock" werden jeweils mehrere Datensaetze in einer EXECUTE BLOCK-Anweisung
+    # an Firebird uebertragen.
+    writer = HEWriter(dbHE, commitintervall=check_export.get('commitintervall', 0),
+                      abbruch=None if _empfaenger is None else _empfaenger.abgebrochen,
+                      statistik=statistik, exportstand=exportstand,
+                      indexpause=check_export.get('indexpause', False),
+                      pipeline=check_export.get('pipeline', 0),
+                      executeblock=check_export.get('executeblock', False))
+    ressourcen['writer'] = writer
+
+    # Mit Commitintervall kann ein abgebrochener Export Teile der Änderungen enthalten. Der alte
+    # Exportstand passt dann nicht mehr zur HE-Datenbank, der nächste Export erstellt sie neu.
+    if inkrementell and writer.commitintervall:
+        exportstand.datei_entfernen()
+
+    # Mit der Option "schnellinit" werden die Tabellen der init_*-Optionen vor Beginn der Export-
+    # transaktion geleert, mit deaktivierten Indizes und der Dauer je Abschnitt in der Statistik.
+    if check_export.get('schnellinit'):
+        abschnitte = tuple(a for a in init_abschnitte(check_export) if a not in geleert)
+        try:
+            dauer = schnell_leeren(writer, abschnitte, statistik)
+            writer.commit()
+        except BaseException as err:
+            fehlermeldung(u"(35) SQL-Fehler in Firebird beim Leeren der Tabellen: \n{}\n".format(err), '')
+            writer.rollback()
+            del dbHE
+            return False
+        geleert.update(abschnitte)
+        for abschnitt in abschnitte:
+            fortschritt(u'{} geleert in {:.1f} s'.format(abschnitt, dauer[abschnitt]))
+
     # Verbindung zur QKan-Datenbank
 
     dbQK = DBConnection(database_QKan)      # Datenbankobjekt der QKan-Datenbank zum Lesenen
@@ -108,6 +367,11 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
            'QKan-Datenbank {:s} wurde nicht gefunden!\nAbbruch!'.format(database_QKan))
         return None
 
+    # Die räumlichen Indizes, die für den Export der Flächen vorübergehend angelegt werden, werden
+    # am Ende jedes Exports wieder entfernt, auch nach einem Fehler (siehe _ressourcen_freigeben).
+    raumindizes = Raumindizes(dbQK)
+    ressourcen['raumindizes'] = raumindizes
+
     # --------------------------------------------------------------------------------------------------
     # Kontrolle der vorhandenen Profilquerschnitte. 
 
@@ -134,15 +398,87 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
     # vergeben werden!!! Ein Grund ist, dass (u.a.?) die Tabelle "tabelleninhalte" mit verschiedenen
     # Tabellen verknuepft ist und dieser ID eindeutig sein muss.
 
-    dbHE.sql("SELECT NEXTID FROM ITWH$PROGINFO")
-    nextid = int(dbHE.fetchone()[0])
+    # Jeder Abschnitt erhaelt vorab einen zusammenhaengenden Bereich von IDs, dessen Groesse aus der
+    # Anzahl der Datensaetze in QKan abgeschaetzt wird. NEXTID wird erst am Ende einmal geschrieben.
+
+    sql = u"""
+        SELECT
+            (SELECT count(*) FROM schaechte WHERE schachttyp = 'Schacht'),
+            (SELECT count(*) FROM schaechte WHERE schachttyp = 'Speicher'),
+            (SELECT count(*) FROM schaechte WHERE schachttyp = 'Auslass'),
+            (SELECT count(*) FROM haltungen),
+            (SELECT count(*) FROM bodenklassen),
+            (SELECT count(*) FROM abflussparameter),
+            (SELECT count(DISTINCT regenschreiber) FROM flaechen),
+            (SELECT count(*) FROM linkfl),
+            (SELECT count(*) FROM tezg)"""
+    try:
+        dbQK.sql(sql)
+        anzahl = dbQK.fetchone()
+    except BaseException as err:
+        fehlermeldung(u"(30) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+        del dbQK
+        del dbHE
+        return False
+
+    try:
+        idvergabe = HEIdVergabe(writer)
+    except BaseException as err:
+        fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), u'SELECT NEXTID FROM ITWH$PROGINFO')
+        del dbQK
+        del dbHE
+        return False
+
+    for abschnitt, schalter, n in zip(('SCHAECHTE', 'SPEICHER', 'AUSLAESSE', 'HALTUNGEN', 'BODENKLASSEN',
+                                       'ABFLUSSPARAMETER', 'REGENSCHREIBER', 'FLAECHEN', 'EINZELEINLEITER'),
+                                      ('export_schaechte', 'export_speicher', 'export_auslaesse',
+                                       'export_haltungen', 'export_bodenklassen', 'export_abflussparameter',
+                                       'export_regenschreiber', 'export_flaechenrw', 'export_flaechensw'),
+                                      anzahl):
+        if check_export[schalter]:
+            idvergabe.reservieren(abschnitt, max(n or 0, 1))
+
+    # --------------------------------------------------------------------------------------------
+    # Geometrie für den Export der Flächen
+
+    # Mit der Option "geometrieprozesse" werden die fehlenden Paare des Verschneidungscaches
+    # ausserhalb von SpatiaLite in einem Pool von Prozessen verschnitten.
+    pool = None
+    if check_export.get('geometrieprozesse'):
+        if geometriepool.verfuegbar():
+            pool = geometriepool.Geometriepool(None if check_export['geometrieprozesse'] is True
+                                               else check_export['geometrieprozesse'])
+        else:
+            logger.warning(u'Option geometrieprozesse: shapely ist nicht vorhanden, '
+                           u'die Verschneidung erfolgt in SpatiaLite')
+
+    # Mit der Option "parallele_vorbereitung" werden die räumlichen Indizes und der Verschneidungscache
+    # für die Flächen in eigenen Threads vorbereitet, während die übrigen Abschnitte exportiert werden.
+    # Geschrieben wird weiterhin nur in der festen Reihenfolge der Abschnitte.
+    plan = None
+    if check_export.get('parallele_vorbereitung') and (check_export['export_flaechenrw']
+                                                       or check_export['modify_flaechenrw']):
+        if len(liste_teilgebiete) != 0:
+            auswahl = " AND flaechen.teilgebiet in ('{}')".format("', '".join(liste_teilgebiete))
+        else:
+            auswahl = ""
+        dbQK.sql(u'PRAGMA busy_timeout = 600000')
+        plan = Abschnittsplan()
+        ressourcen['plan'] = plan
+        plan.hinzufuegen('raumindizes', lambda: _raumindizes_vorbereiten(database_QKan))
+        if check_export.get('verschneidungscache', False):
+            plan.hinzufuegen('verschneidung', lambda: _verschneidung_vorbereiten(database_QKan, auswahl, pool),
+                             abhaengig=('raumindizes',))
+        plan.starten()
 
     # --------------------------------------------------------------------------------------------
     # Export der Schaechte
 
     if check_export['export_schaechte'] or check_export['modify_schaechte']:
-        if check_export['init_schaechte']:
-            dbHE.sql("DELETE FROM SCHACHT")
+        statistik.abschnitt(u'Schaechte')
+        writer.abschnitt('SCHAECHTE')
+        if check_export['init_schaechte'] and 'schaechte' not in geleert:
+            leeren(dbHE, 'schaechte')
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -166,85 +502,79 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(21) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
 
-        nr0 = nextid
+        ids = idvergabe.block('SCHAECHTE')
 
         fortschritt('Export Schaechte Teil 1...', 0.1)
         createdat = time.strftime('%d.%m.%Y %H:%M:%S',time.localtime())
 
-        for attr in dbQK.fetchall():
+        spalten = ('DECKELHOEHE', 'KANALART', 'DRUCKDICHTERDECKEL', 'SOHLHOEHE', 'XKOORDINATE', 'YKOORDINATE',
+                   'KONSTANTERZUFLUSS', 'GELAENDEHOEHE', 'ART', 'ANZAHLKANTEN', 'SCHEITELHOEHE',
+                   'PLANUNGSSTATUS', 'NAME', 'LASTMODIFIED', 'ID', 'DURCHMESSER')
+        if check_export['modify_schaechte']:
+            anweisung = writer.merge('SCHACHT', spalten)
+        else:
+            anweisung = writer.insert('SCHACHT', spalten)
+
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
-            (schnam, deckelhoehe_t, sohlhoehe_t, durchmesser_t, strasse, xsch_t, ysch_t) = \
-                ('NULL' if el is None else el for el in attr)
+            (schnam, deckelhoehe_t, sohlhoehe_t, durchmesser_t, strasse, xsch_t, ysch_t) = attr
 
             # Formatierung der Zahlen
             (deckelhoehe, sohlhoehe, durchmesser, xsch, ysch) = \
-                ('NULL' if tt == 'NULL' else '{:.3f}'.format(float(tt)) \
+                (None if tt is None else round(float(tt), 3) \
                     for tt in (deckelhoehe_t, sohlhoehe_t, durchmesser_t, xsch_t, ysch_t))
 
+            werte = (deckelhoehe, 0, 0, sohlhoehe, xsch, ysch,
+                     0, deckelhoehe, 1, 0, 0,
+                     '0', schnam, createdat, ids.aktuell, durchmesser)
 
             # Ändern vorhandener Datensätze
             if check_export['modify_schaechte']:
-                sql = u"""
-                    UPDATE SCHACHT SET
-                    DECKELHOEHE={deckelhoehe}, KANALART={kanalart}, DRUCKDICHTERDECKEL={druckdichterdeckel},
-                    SOHLHOEHE={sohlhoehe}, XKOORDINATE={xkoordinate}, YKOORDINATE={ykoordinate},
-                    KONSTANTERZUFLUSS={konstanterzufluss}, GELAENDEHOEHE={gelaendehoehe},
-                    ART={art}, ANZAHLKANTEN={anzahlkanten}, SCHEITELHOEHE={scheitelhoehe},
-                    PLANUNGSSTATUS='{planungsstatus}', NAME='{name}', LASTMODIFIED='{lastmodified}',
-                    ID={id}, DURCHMESSER={durchmesser}
-                    WHERE NAME = '{name}';
-                """.format(deckelhoehe=deckelhoehe, kanalart='0', druckdichterdeckel='0',
-                           sohlhoehe=sohlhoehe, xkoordinate=xsch, ykoordinate=ysch,
-                           konstanterzufluss='0', gelaendehoehe=deckelhoehe, art='1', anzahlkanten='0',
-                           scheitelhoehe='0', planungsstatus='0', name=schnam, lastmodified=createdat,
-                           id=nextid, durchmesser=durchmesser)
                 try:
-                    dbHE.sql(sql)
+                    anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(3a) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(3a) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
-                
+
             # Einfuegen in die Datenbank
             elif check_export['export_schaechte']:
-                # Trick: In Firebird ist kein SELECT ohne Tabelle möglich. Tabelle "RDB$DATABASE" hat genau 1 Datensatz
-                sql = u"""
-                    INSERT INTO SCHACHT
-                    ( DECKELHOEHE, KANALART, DRUCKDICHTERDECKEL, SOHLHOEHE, XKOORDINATE, YKOORDINATE,
-                      KONSTANTERZUFLUSS, GELAENDEHOEHE, ART, ANZAHLKANTEN, SCHEITELHOEHE,
-                      PLANUNGSSTATUS, NAME, LASTMODIFIED, ID, DURCHMESSER)
-                    SELECT
-                      {deckelhoehe}, {kanalart}, {druckdichterdeckel}, {sohlhoehe}, {xkoordinate},
-                      {ykoordinate}, {konstanterzufluss}, {gelaendehoehe}, {art}, {anzahlkanten},
-                      {scheitelhoehe}, '{planungsstatus}', '{name}', '{lastmodified}', {id}, {durchmesser}
-                    FROM RDB$DATABASE
-                    WHERE '{name}' NOT IN (SELECT NAME FROM SCHACHT);
-                """.format(deckelhoehe=deckelhoehe, kanalart='0', druckdichterdeckel='0',
-                           sohlhoehe=sohlhoehe, xkoordinate=xsch, ykoordinate=ysch,
-                           konstanterzufluss='0', gelaendehoehe=deckelhoehe, art='1', anzahlkanten='0',
-                           scheitelhoehe='0', planungsstatus='0', name=schnam, lastmodified=createdat,
-                           id=nextid, durchmesser=durchmesser)
                 try:
-                    dbHE.sql(sql)
+                    eingefuegt = anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(3b) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(3b) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-                nextid += 1
+                if eingefuegt:
+                    ids.weiter()
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        try:
+            writer.flush()
+            if check_export['modify_schaechte']:
+                treffer, fehlend = anweisung.anwenden()
+                fortschritt(u'{} Schaechte geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+        except BaseException as err:
+            fehlermeldung(u"(3c) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
 
-        fortschritt('{} Schaechte eingefuegt'.format(nextid-nr0), 0.30)
+        writer.abschnitt_ende()
+        statistik.ende()
+
+        fortschritt('{} Schaechte eingefuegt'.format(ids.anzahl), 0.30)
 
     # --------------------------------------------------------------------------------------------
     # Export der Speicherbauwerke
@@ -253,10 +583,11 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
     # wiederverwertet zu werden.
 
     if check_export['export_speicher'] or check_export['modify_speicher']:
-        if check_export['init_speicher']:
+        statistik.abschnitt(u'Speicher')
+        writer.abschnitt('SPEICHER')
+        if check_export['init_speicher'] and 'speicher' not in geleert:
             # Zuerst Daten aus Detailtabelle mit Speicherkennlinie löschen
-            dbHE.sql("DELETE FROM TABELLENINHALTE WHERE ID IN (SELECT ID FROM SPEICHERSCHACHT)")
-            dbHE.sql("DELETE FROM SPEICHERSCHACHT")
+            leeren(dbHE, 'speicher')
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -281,103 +612,98 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(22) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
 
-        nr0 = nextid
+        ids = idvergabe.block('SPEICHER')
         refid_speicher = {}
 
+        spalten = ('ID', 'TYP', 'SOHLHOEHE',
+                   'XKOORDINATE', 'YKOORDINATE',
+                   'GELAENDEHOEHE', 'ART', 'ANZAHLKANTEN',
+                   'SCHEITELHOEHE', 'HOEHEVOLLFUELLUNG',
+                   'KONSTANTERZUFLUSS', 'ABSETZWIRKUNG', 'PLANUNGSSTATUS',
+                   'NAME', 'LASTMODIFIED', 'KOMMENTAR')
+        if check_export['modify_speicher']:
+            anweisung = writer.merge('SPEICHERSCHACHT', spalten)
+        else:
+            anweisung = writer.insert('SPEICHERSCHACHT', spalten)
+
         createdat = time.strftime('%d.%m.%Y %H:%M:%S',time.localtime())
-        for attr in dbQK.fetchall():
-            fortschritt('Export Speicherschaechte...', 0.15)
+        fortschritt('Export Speicherschaechte...', 0.15)
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
-            (schnam, deckelhoehe_t, sohlhoehe_t, durchmesser_t, strasse, xsch_t, ysch_t, kommentar) = \
-                ('NULL' if el is None else el for el in attr)
+            (schnam, deckelhoehe_t, sohlhoehe_t, durchmesser_t, strasse, xsch_t, ysch_t, kommentar) = attr
 
             # Formatierung der Zahlen
             (deckelhoehe, sohlhoehe, durchmesser, xsch, ysch) = \
-                ('NULL' if tt == 'NULL' else '{:.3f}'.format(float(tt)) \
+                (None if tt is None else round(float(tt), 3) \
                     for tt in (deckelhoehe_t, sohlhoehe_t, durchmesser_t, xsch_t, ysch_t))
 
-            # Speichern der aktuellen ID zum Speicherbauwerk
-            refid_speicher[schnam] = nextid
+            werte = (ids.aktuell, 1, sohlhoehe,
+                     xsch, ysch,
+                     deckelhoehe, 1, 0,
+                     deckelhoehe, deckelhoehe,
+                     0, 0, '0',
+                     schnam, createdat, kommentar)
 
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
             if check_export['modify_speicher']:
-                sql = u"""
-                    UPDATE SPEICHERSCHACHT SET
-                    ID={id}, TYP={typ}, SOHLHOEHE={sohlhoehe},
-                      XKOORDINATE={xkoordinate}, YKOORDINATE={ykoordinate},
-                      GELAENDEHOEHE={gelaendehoehe}, ART={art}, ANZAHLKANTEN={anzahlkanten},
-                      SCHEITELHOEHE={scheitelhoehe}, HOEHEVOLLFUELLUNG={hoehevollfuellung},
-                      KONSTANTERZUFLUSS={konstanterzufluss}, ABSETZWIRKUNG={absetzwirkung}, 
-                      PLANUNGSSTATUS='{planungsstatus}',
-                      NAME='{name}', LASTMODIFIED='{lastmodified}', KOMMENTAR='{kommentar}'
-                      WHERE NAME='{name}';
-                """.format(id=nextid, typ='1', sohlhoehe=sohlhoehe,
-                           xkoordinate=xsch, ykoordinate=ysch,
-                           gelaendehoehe=deckelhoehe, art='1', anzahlkanten='0',
-                           scheitelhoehe=deckelhoehe, hoehevollfuellung=deckelhoehe,
-                           konstanterzufluss = '0', absetzwirkung='0', planungsstatus='0',
-                           name=schnam, lastmodified=createdat, kommentar = kommentar,
-                           durchmesser=durchmesser)
+                # Die ID des vorhandenen Speicherbauwerks wird nach dem Ändern ermittelt
+                refid_speicher[schnam] = None
                 try:
-                    dbHE.sql(sql)
+                    anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(4a) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(4a) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
             # Einfuegen in die Datenbank
             elif check_export['export_speicher']:
-                # Trick: In Firebird ist kein SELECT ohne Tabelle möglich. Tabelle "RDB$DATABASE" hat genau 1 Datensatz
-                sql = u"""
-                    INSERT INTO SPEICHERSCHACHT
-                    ( ID, TYP, SOHLHOEHE,
-                      XKOORDINATE, YKOORDINATE,
-                      GELAENDEHOEHE, ART, ANZAHLKANTEN,
-                      SCHEITELHOEHE, HOEHEVOLLFUELLUNG,
-                      KONSTANTERZUFLUSS, ABSETZWIRKUNG, PLANUNGSSTATUS,
-                      NAME, LASTMODIFIED, KOMMENTAR)
-                    SELECT
-                      {id}, {typ}, {sohlhoehe},
-                      {xkoordinate}, {ykoordinate},
-                      {gelaendehoehe}, {art}, {anzahlkanten},
-                      {scheitelhoehe}, {hoehevollfuellung},
-                      {konstanterzufluss}, {absetzwirkung}, '{planungsstatus}',
-                      '{name}', '{lastmodified}', '{kommentar}'
-                    FROM RDB$DATABASE
-                    WHERE '{name}' NOT IN (SELECT NAME FROM SPEICHERSCHACHT);
-                """.format(id=nextid, typ='1', sohlhoehe=sohlhoehe,
-                           xkoordinate=xsch, ykoordinate=ysch,
-                           gelaendehoehe=deckelhoehe, art='1', anzahlkanten='0',
-                           scheitelhoehe=deckelhoehe, hoehevollfuellung=deckelhoehe,
-                           konstanterzufluss = '0', absetzwirkung='0', planungsstatus='0',
-                           name=schnam, lastmodified=createdat, kommentar = kommentar,
-                           durchmesser=durchmesser)
                 try:
-                    dbHE.sql(sql)
+                    eingefuegt = anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(4b) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(4b) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-                nextid += 1
+                if eingefuegt:
+                    # Speichern der aktuellen ID zum Speicherbauwerk
+                    refid_speicher[schnam] = ids.aktuell
+                    ids.weiter()
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        try:
+            writer.flush()
+            if check_export['modify_speicher']:
+                treffer, fehlend = anweisung.anwenden()
+                fortschritt(u'{} Speicher geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+                vorhanden = writer.ids('SPEICHERSCHACHT')
+                refid_speicher = dict((name, vorhanden[name]) for name in refid_speicher if name in vorhanden)
+        except BaseException as err:
+            fehlermeldung(u"(4c) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
 
-        fortschritt('{} Speicher eingefuegt'.format(nextid-nr0), 0.40)
+        writer.abschnitt_ende()
+        statistik.ende()
+
+        fortschritt('{} Speicher eingefuegt'.format(ids.anzahl), 0.40)
 
         # --------------------------------------------------------------------------------------------
         # Export der Kennlinien der Speicherbauwerke - nur wenn auch Speicher exportiert werden
 
         if check_export['export_speicherkennlinien'] or check_export['modify_speicherkennlinien']:
+            statistik.abschnitt(u'Speicherkennlinien')
+            writer.abschnitt('SPEICHERKENNLINIEN')
 
             sql = u"""SELECT sl.schnam, sl.wspiegel - sc.sohlhoehe AS wtiefe, sl.oberfl
                       FROM speicherkennlinien AS sl
@@ -388,21 +714,24 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                 dbQK.sql(sql)
             except BaseException as err:
                 fehlermeldung(u"(32) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+                writer.rollback()
                 del dbQK
                 del dbHE
                 return False
 
             spnam = None               # Zähler für Speicherkennlinien
 
-            for attr in dbQK.fetchall():
+            anweisung = writer.insert('TABELLENINHALTE', ('KEYWERT', 'WERT', 'REIHENFOLGE', 'ID'),
+                                      schluessel=None)
+
+            for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-                # In allen Feldern None durch NULL ersetzen
-                (schnam, wtiefe, oberfl) = ('NULL' if el is None else el for el in attr)
+                (schnam, wtiefe, oberfl) = attr
 
                 # Einfuegen in die Datenbank
 
                 if schnam in refid_speicher:
-                    if spnam == 'NULL' or schnam != spnam:
+                    if spnam is None or schnam != spnam:
                         spnam = schnam
                         reihenfolge = 1
                     else:
@@ -413,33 +742,37 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
 
                     # Einfuegen in die Datenbank
                     if check_export['export_speicherkennlinien']:
-                        # Trick: In Firebird ist kein SELECT ohne Tabelle möglich. Tabelle "RDB$DATABASE" hat genau 1 Datensatz
-                        sql = u"""
-                            INSERT INTO TABELLENINHALTE
-                            ( KEYWERT, WERT, REIHENFOLGE, ID)
-                            SELECT
-                              {wtiefe}, {oberfl}, {reihenfolge}, {id}
-                            FROM RDB$DATABASE;
-                        """.format(wtiefe = wtiefe, oberfl = oberfl, reihenfolge = reihenfolge, id = refid_speicher[schnam])
-                        # print(sql)
                         try:
-                            dbHE.sql(sql)
+                            anweisung.execute((wtiefe, oberfl, reihenfolge, refid_speicher[schnam]))
                         except BaseException as err:
-                            fehlermeldung(u"(4d) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                            fehlermeldung(u"(4d) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                            writer.rollback()
                             del dbQK
                             del dbHE
                             return False
 
-            dbHE.commit()
+            try:
+                writer.flush()
+            except BaseException as err:
+                fehlermeldung(u"(4e) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                writer.rollback()
+                del dbQK
+                del dbHE
+                return False
+
+            writer.abschnitt_ende()
+            statistik.ende()
 
-            fortschritt('{} Speicher eingefuegt'.format(nextid-nr0), 0.40)
+            fortschritt('{} Speicher eingefuegt'.format(ids.anzahl), 0.40)
 
     # --------------------------------------------------------------------------------------------
     # Export der Auslaesse
 
     if check_export['export_auslaesse'] or check_export['modify_auslaesse']:
-        if check_export['init_auslaesse']:
-            dbHE.sql("DELETE FROM AUSLASS")
+        statistik.abschnitt(u'Auslaesse')
+        writer.abschnitt('AUSLAESSE')
+        if check_export['init_auslaesse'] and 'auslaesse' not in geleert:
+            leeren(dbHE, 'auslaesse')
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -463,90 +796,84 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(22) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
 
-        nr0 = nextid
+        ids = idvergabe.block('AUSLAESSE')
 
         createdat = time.strftime('%d.%m.%Y %H:%M:%S',time.localtime())
 
         fortschritt(u'Export Auslässe...', 0.20)
 
-        for attr in dbQK.fetchall():
+        spalten = ('ID', 'TYP', 'RUECKSCHLAGKLAPPE', 'SOHLHOEHE',
+                   'XKOORDINATE', 'YKOORDINATE',
+                   'GELAENDEHOEHE', 'ART', 'ANZAHLKANTEN',
+                   'SCHEITELHOEHE', 'KONSTANTERZUFLUSS', 'PLANUNGSSTATUS',
+                   'NAME', 'LASTMODIFIED', 'KOMMENTAR')
+        if check_export['modify_auslaesse']:
+            anweisung = writer.merge('AUSLASS', spalten)
+        else:
+            anweisung = writer.insert('AUSLASS', spalten)
+
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
-            (schnam, deckelhoehe_t, sohlhoehe_t, durchmesser_t, xsch_t, ysch_t, kommentar) = \
-                ('NULL' if el is None else el for el in attr)
+            (schnam, deckelhoehe_t, sohlhoehe_t, durchmesser_t, xsch_t, ysch_t, kommentar) = attr
 
             # Formatierung der Zahlen
             (deckelhoehe, sohlhoehe, durchmesser, xsch, ysch) = \
-                ('NULL' if tt == 'NULL' else '{:.3f}'.format(float(tt)) \
+                (None if tt is None else round(float(tt), 3) \
                     for tt in (deckelhoehe_t, sohlhoehe_t, durchmesser_t, xsch_t, ysch_t))
 
+            werte = (ids.aktuell, 1, 0, sohlhoehe,
+                     xsch, ysch,
+                     deckelhoehe, 3, 0,
+                     deckelhoehe, 0, '0',
+                     schnam, createdat, kommentar)
+
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
             if check_export['modify_auslaesse']:
-                sql = u"""
-                    UPDATE AUSLASS SET
-                    ID={id}, TYP={typ}, RUECKSCHLAGKLAPPE={rueckschlagklappe},
-                    SOHLHOEHE={sohlhoehe}, XKOORDINATE={xkoordinate}, YKOORDINATE={ykoordinate},
-                    GELAENDEHOEHE={gelaendehoehe}, ART={art}, ANZAHLKANTEN={anzahlkanten},
-                    SCHEITELHOEHE={scheitelhoehe}, KONSTANTERZUFLUSS={konstanterzufluss},
-                    PLANUNGSSTATUS='{planungsstatus}', NAME='{name}',
-                    LASTMODIFIED='{lastmodified}', KOMMENTAR='{kommentar}'
-                    WHERE NAME = '{name}';
-                """.format(id=nextid, typ='1', rueckschlagklappe=0, sohlhoehe=sohlhoehe,
-                           xkoordinate=xsch, ykoordinate=ysch,
-                           gelaendehoehe=deckelhoehe, art='3', anzahlkanten='0',
-                           scheitelhoehe=deckelhoehe, konstanterzufluss=0, planungsstatus='0',
-                           name=schnam, lastmodified=createdat, kommentar = kommentar,
-                           durchmesser=durchmesser)
                 try:
-                    dbHE.sql(sql)
+                    anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
             # Einfuegen in die Datenbank
             elif check_export['export_auslaesse']:
-                sql = u"""
-                    INSERT INTO AUSLASS
-                    ( ID, TYP, RUECKSCHLAGKLAPPE, SOHLHOEHE,
-                      XKOORDINATE, YKOORDINATE,
-                      GELAENDEHOEHE, ART, ANZAHLKANTEN,
-                      SCHEITELHOEHE, KONSTANTERZUFLUSS, PLANUNGSSTATUS,
-                      NAME, LASTMODIFIED, KOMMENTAR)
-                    SELECT
-                      {id}, {typ}, {rueckschlagklappe}, {sohlhoehe},
-                      {xkoordinate}, {ykoordinate},
-                      {gelaendehoehe}, {art}, {anzahlkanten},
-                      {scheitelhoehe}, {konstanterzufluss}, '{planungsstatus}',
-                      '{name}', '{lastmodified}', '{kommentar}'
-                    FROM RDB$DATABASE
-                    WHERE '{name}' NOT IN (SELECT NAME FROM AUSLASS);
-                """.format(id=nextid, typ='1', rueckschlagklappe=0, sohlhoehe=sohlhoehe,
-                           xkoordinate=xsch, ykoordinate=ysch,
-                           gelaendehoehe=deckelhoehe, art='3', anzahlkanten='0',
-                           scheitelhoehe=deckelhoehe, konstanterzufluss=0, planungsstatus='0',
-                           name=schnam, lastmodified=createdat, kommentar = kommentar,
-                           durchmesser=durchmesser)
                 try:
-                    dbHE.sql(sql)
+                    eingefuegt = anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-                nextid += 1
+                if eingefuegt:
+                    ids.weiter()
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        try:
+            writer.flush()
+            if check_export['modify_auslaesse']:
+                treffer, fehlend = anweisung.anwenden()
+                fortschritt(u'{} Auslässe geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+        except BaseException as err:
+            fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
+
+        writer.abschnitt_ende()
+        statistik.ende()
 
-        fortschritt(u'{} Auslässe eingefuegt'.format(nextid-nr0), 0.40)
+        fortschritt(u'{} Auslässe eingefuegt'.format(ids.anzahl), 0.40)
 
     # --------------------------------------------------------------------------------------------
     # Export der Haltungen
@@ -557,8 +884,10 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
     # Siedlungstyp zugeordnet ist, wird diese Fläche nicht wirksam und dient nur der Information!
 
     if check_export['export_haltungen'] or check_export['modify_haltungen']:
-        if check_export['init_haltungen']:
-            dbHE.sql("DELETE FROM ROHR")
+        statistik.abschnitt(u'Haltungen')
+        writer.abschnitt('HALTUNGEN')
+        if check_export['init_haltungen'] and 'haltungen' not in geleert:
+            leeren(dbHE, 'haltungen')
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -588,31 +917,46 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(5) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
         fortschritt('Export Haltungen...', 0.35)
 
-        nr0 = nextid
+        ids = idvergabe.block('HALTUNGEN')
+
+        spalten = ('NAME', 'SCHACHTOBEN', 'SCHACHTUNTEN', 'LAENGE', 'SOHLHOEHEOBEN',
+                   'SOHLHOEHEUNTEN', 'PROFILTYP', 'SONDERPROFILBEZEICHNUNG', 'GEOMETRIE1',
+                   'GEOMETRIE2', 'KANALART', 'RAUIGKEITSBEIWERT', 'ANZAHL', 'TEILEINZUGSGEBIET',
+                   'RUECKSCHLAGKLAPPE', 'KONSTANTERZUFLUSS', 'EINZUGSGEBIET', 'KONSTANTERZUFLUSSTEZG',
+                   'RAUIGKEITSANSATZ', 'GEFAELLE', 'GESAMTFLAECHE', 'ABFLUSSART',
+                   'INDIVIDUALKONZEPT', 'HYDRAULISCHERRADIUS', 'RAUHIGKEITANZEIGE', 'PLANUNGSSTATUS',
+                   'LASTMODIFIED', 'MATERIALART', 'EREIGNISBILANZIERUNG', 'EREIGNISGRENZWERTENDE',
+                   'EREIGNISGRENZWERTANFANG', 'EREIGNISTRENNDAUER', 'EREIGNISINDIVIDUELL', 'ID')
+        if check_export['modify_haltungen']:
+            anweisung = writer.merge('ROHR', spalten)
+        else:
+            anweisung = writer.insert('ROHR', spalten)
 
-        for attr in dbQK.fetchall():
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
             (haltnam, schoben, schunten, laenge_t, sohleoben_t, sohleunten_t, profilnam,
-             he_nr, hoehe_t, breite_t, entw_nr, rohrtyp, rauheit_t, teilgebiet, createdat) = \
-             ('NULL' if el is None else el for el in attr)
+             he_nr, hoehe_t, breite_t, entw_nr, rohrtyp, rauheit_t, teilgebiet, createdat) = attr
 
-            createdat = createdat[:19]
+            if createdat is None:
+                createdat = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime())
+            else:
+                createdat = createdat[:19]
             # Datenkorrekturen
             (laenge, sohleoben, sohleunten, hoehe, breite) = \
-               ('NULL' if tt == 'NULL' else '{:.4f}'.format(float(tt)) \
+               (None if tt is None else round(float(tt), 4) \
                     for tt in (laenge_t, sohleoben_t, sohleunten_t, hoehe_t, breite_t))
 
-            if rauheit_t == 'NULL':
-                rauheit = '1.5'
+            if rauheit_t is None:
+                rauheit = 1.5
             else:
-                rauheit = '{:.3f}'.format(float(rauheit_t))
+                rauheit = round(float(rauheit_t), 3)
 
                 h_profil = he_nr
             if h_profil == '68':
@@ -620,51 +964,24 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             else:
                 h_sonderprofil = ''
 
+            werte = (haltnam, schoben, schunten, laenge, sohleoben,
+                     sohleunten, h_profil, h_sonderprofil, hoehe,
+                     breite, entw_nr, 1.5, 1, '',
+                     0, 0, 0, 0,
+                     1, 0, 0, 0,
+                     0, 0, 1.5, 0,
+                     createdat, 28, 0, 0,
+                     0, 0, 0, ids.aktuell)
+
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
             if check_export['modify_haltungen']:
                 # Profile < 0 werden nicht uebertragen
                 if int(h_profil) > 0:
-                    sql = u"""
-                      UPDATE ROHR SET
-                      NAME='{name}', SCHACHTOBEN='{schachtoben}', SCHACHTUNTEN='{schachtunten}',
-                      LAENGE={laenge}, SOHLHOEHEOBEN={sohlhoeheoben},
-                      SOHLHOEHEUNTEN={sohlhoeheunten}, PROFILTYP='{profiltyp}', 
-                      SONDERPROFILBEZEICHNUNG='{sonderprofilbezeichnung}',
-                      GEOMETRIE1={geometrie1}, GEOMETRIE2={geometrie2}, KANALART='{kanalart}',
-                      RAUIGKEITSBEIWERT={rauigkeitsbeiwert}, ANZAHL={anzahl},
-                      TEILEINZUGSGEBIET='{teileinzugsgebiet}', RUECKSCHLAGKLAPPE={rueckschlagklappe},
-                      KONSTANTERZUFLUSS={konstanterzufluss}, EINZUGSGEBIET={einzugsgebiet},
-                      KONSTANTERZUFLUSSTEZG={konstanterzuflusstezg}, RAUIGKEITSANSATZ={rauigkeitsansatz},
-                      GEFAELLE={gefaelle}, GESAMTFLAECHE={gesamtflaeche}, ABFLUSSART={abflussart},
-                      INDIVIDUALKONZEPT={individualkonzept}, HYDRAULISCHERRADIUS={hydraulischerradius},
-                      RAUHIGKEITANZEIGE={rauhigkeitanzeige}, PLANUNGSSTATUS={planungsstatus},
-                      LASTMODIFIED='{lastmodified}', MATERIALART={materialart},
-                      EREIGNISBILANZIERUNG={ereignisbilanzierung},
-                      EREIGNISGRENZWERTENDE={ereignisgrenzwertende},
-                      EREIGNISGRENZWERTANFANG={ereignisgrenzwertanfang},
-                      EREIGNISTRENNDAUER={ereignistrenndauer}, EREIGNISINDIVIDUELL={ereignisindividuell},
-                      ID={id}
-                      WHERE NAME = '{name}';
-                      """.format(name=haltnam, schachtoben=schoben, schachtunten=schunten,
-                                   laenge=laenge, sohlhoeheoben=sohleoben,
-                                 sohlhoeheunten=sohleunten, profiltyp=h_profil,
-                                   sonderprofilbezeichnung=h_sonderprofil, geometrie1=hoehe,
-                                 geometrie2=breite, kanalart=entw_nr,
-                                   rauigkeitsbeiwert=1.5, anzahl=1, teileinzugsgebiet='',
-                                 rueckschlagklappe=0, konstanterzufluss=0,
-                                   einzugsgebiet=0, konstanterzuflusstezg = 0,
-                                 rauigkeitsansatz=1, gefaelle=0,
-                                   gesamtflaeche=0, abflussart=0,
-                                 individualkonzept=0, hydraulischerradius=0,
-                                   rauhigkeitanzeige=1.5, planungsstatus=0,
-                                 lastmodified=createdat, materialart=28,
-                                   ereignisbilanzierung=0, ereignisgrenzwertende=0,
-                                 ereignisgrenzwertanfang=0, ereignistrenndauer=0,
-                                   ereignisindividuell=0, id=nextid)
                     try:
-                        dbHE.sql(sql)
+                        anweisung.execute(werte)
                     except BaseException as err:
-                        fehlermeldung(u"(6b) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                        fehlermeldung(u"(6b) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                        writer.rollback()
                         del dbQK
                         del dbHE
                         return False
@@ -673,63 +990,43 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             elif check_export['export_haltungen']:
                 # Profile < 0 werden nicht uebertragen
                 if int(h_profil) > 0:
-                    sql = u"""
-                      INSERT INTO ROHR
-                      ( NAME, SCHACHTOBEN, SCHACHTUNTEN, LAENGE, SOHLHOEHEOBEN,
-                        SOHLHOEHEUNTEN, PROFILTYP, SONDERPROFILBEZEICHNUNG, GEOMETRIE1,
-                        GEOMETRIE2, KANALART, RAUIGKEITSBEIWERT, ANZAHL, TEILEINZUGSGEBIET,
-                        RUECKSCHLAGKLAPPE, KONSTANTERZUFLUSS, EINZUGSGEBIET, KONSTANTERZUFLUSSTEZG,
-                        RAUIGKEITSANSATZ, GEFAELLE, GESAMTFLAECHE, ABFLUSSART,
-                        INDIVIDUALKONZEPT, HYDRAULISCHERRADIUS, RAUHIGKEITANZEIGE, PLANUNGSSTATUS,
-                        LASTMODIFIED, MATERIALART, EREIGNISBILANZIERUNG, EREIGNISGRENZWERTENDE,
-                        EREIGNISGRENZWERTANFANG, EREIGNISTRENNDAUER, EREIGNISINDIVIDUELL, ID)
-                      SELECT
-                        '{name}', '{schachtoben}', '{schachtunten}', {laenge}, {sohlhoeheoben},
-                        {sohlhoeheunten}, '{profiltyp}', '{sonderprofilbezeichnung}', {geometrie1},
-                        {geometrie2}, '{kanalart}', {rauigkeitsbeiwert}, {anzahl}, '{teileinzugsgebiet}',
-                        {rueckschlagklappe}, {konstanterzufluss}, {einzugsgebiet}, {konstanterzuflusstezg},
-                        {rauigkeitsansatz}, {gefaelle}, {gesamtflaeche}, {abflussart},
-                        {individualkonzept}, {hydraulischerradius}, {rauhigkeitanzeige}, {planungsstatus},
-                        '{lastmodified}', {materialart}, {ereignisbilanzierung}, {ereignisgrenzwertende},
-                        {ereignisgrenzwertanfang}, {ereignistrenndauer}, {ereignisindividuell}, {id}
-                      FROM RDB$DATABASE
-                      WHERE '{name}' NOT IN (SELECT NAME FROM ROHR);
-                      """.format(name=haltnam, schachtoben=schoben, schachtunten=schunten,
-                                   laenge=laenge, sohlhoeheoben=sohleoben,
-                                 sohlhoeheunten=sohleunten, profiltyp=h_profil,
-                                   sonderprofilbezeichnung=h_sonderprofil, geometrie1=hoehe,
-                                 geometrie2=breite, kanalart=entw_nr,
-                                   rauigkeitsbeiwert=1.5, anzahl=1, teileinzugsgebiet='',
-                                 rueckschlagklappe=0, konstanterzufluss=0,
-                                   einzugsgebiet=0, konstanterzuflusstezg = 0,
-                                 rauigkeitsansatz=1, gefaelle=0,
-                                   gesamtflaeche=0, abflussart=0,
-                                 individualkonzept=0, hydraulischerradius=0,
-                                   rauhigkeitanzeige=1.5, planungsstatus=0,
-                                 lastmodified=createdat, materialart=28,
-                                   ereignisbilanzierung=0, ereignisgrenzwertende=0,
-                                 ereignisgrenzwertanfang=0, ereignistrenndauer=0,
-                                   ereignisindividuell=0, id=nextid)
                     try:
-                        dbHE.sql(sql)
+                        eingefuegt = anweisung.execute(werte)
                     except BaseException as err:
-                        fehlermeldung(u"(6b) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                        fehlermeldung(u"(6b) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                        writer.rollback()
                         del dbQK
                         del dbHE
                         return False
 
-                    nextid += 1
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+                    if eingefuegt:
+                        ids.weiter()
+
+        try:
+            writer.flush()
+            if check_export['modify_haltungen']:
+                treffer, fehlend = anweisung.anwenden()
+                fortschritt(u'{} Haltungen geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+        except BaseException as err:
+            fehlermeldung(u"(6c) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
+
+        writer.abschnitt_ende()
+        statistik.ende()
 
-        fortschritt('{} Haltungen eingefuegt'.format(nextid-nr0), 0.60)
+        fortschritt('{} Haltungen eingefuegt'.format(ids.anzahl), 0.60)
 
     # --------------------------------------------------------------------------------------------
     # Export der Bodenklassen
 
     if check_export['export_bodenklassen'] or check_export['modify_bodenklassen']:
-        if check_export['init_bodenklassen']:
-            dbHE.sql("DELETE FROM BODENKLASSE")
+        statistik.abschnitt(u'Bodenklassen')
+        writer.abschnitt('BODENKLASSEN')
+        if check_export['init_bodenklassen'] and 'bodenklassen' not in geleert:
+            leeren(dbHE, 'bodenklassen')
 
         sql = u"""
             SELECT
@@ -748,98 +1045,88 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(22) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
-        nr0 = nextid
+        ids = idvergabe.block('BODENKLASSEN')
+
+        spalten = ('INFILTRATIONSRATEANFANG', 'INFILTRATIONSRATEENDE',
+                   'INFILTRATIONSRATESTART', 'RUECKGANGSKONSTANTE', 'REGENERATIONSKONSTANTE',
+                   'SAETTIGUNGSWASSERGEHALT', 'NAME', 'LASTMODIFIED', 'KOMMENTAR', 'ID')
+        if check_export['modify_bodenklassen']:
+            anweisung = writer.merge('BODENKLASSE', spalten)
+        else:
+            anweisung = writer.insert('BODENKLASSE', spalten)
 
-        for attr in dbQK.fetchall():
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
             (bknam, infiltrationsrateanfang, infiltrationsrateende, infiltrationsratestart, 
              rueckgangskonstante, regenerationskonstante, saettigungswassergehalt,
-             createdat, kommentar) = \
-                ('NULL' if el is None else el for el in attr)
+             createdat, kommentar) = attr
 
             # Der leere Satz Bodenklasse ist nur für interne QKan-Zwecke da. 
-            if bknam == 'NULL':
+            if bknam is None:
                 continue
 
-            if createdat == 'NULL':
+            if createdat is None:
                 createdat = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime())
 
+            werte = (infiltrationsrateanfang, infiltrationsrateende,
+                     infiltrationsratestart, rueckgangskonstante, regenerationskonstante,
+                     saettigungswassergehalt, bknam, createdat, kommentar, ids.aktuell)
+
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
             if check_export['modify_bodenklassen']:
-                sql = u"""
-                    UPDATE BODENKLASSE SET
-                    INFILTRATIONSRATEANFANG={infiltrationsrateanfang},
-                    INFILTRATIONSRATEENDE={infiltrationsrateende},
-                    INFILTRATIONSRATESTART={infiltrationsratestart},
-                    RUECKGANGSKONSTANTE={rueckgangskonstante},
-                    REGENERATIONSKONSTANTE={regenerationskonstante},
-                    SAETTIGUNGSWASSERGEHALT={saettigungswassergehalt},
-                    NAME='{name}', LASTMODIFIED='{lastmodified}',
-                    KOMMENTAR='{kommentar}', ID={id}
-                    WHERE NAME = '{name}';
-                    """.format(infiltrationsrateanfang=infiltrationsrateanfang,
-                               infiltrationsrateende=infiltrationsrateende,
-                               infiltrationsratestart=infiltrationsratestart,
-                               rueckgangskonstante=rueckgangskonstante,
-                               regenerationskonstante=regenerationskonstante,
-                               saettigungswassergehalt=saettigungswassergehalt,
-                               name=bknam, lastmodified=createdat,
-                               kommentar=kommentar,  id=nextid)
                 try:
-                    dbHE.sql(sql)
+                    anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(31) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
             # Einfuegen in die Datenbank
             elif check_export['export_bodenklassen']:
-                sql = u"""
-                  INSERT INTO BODENKLASSE
-                  ( INFILTRATIONSRATEANFANG, INFILTRATIONSRATEENDE,
-                    INFILTRATIONSRATESTART, RUECKGANGSKONSTANTE, REGENERATIONSKONSTANTE,
-                    SAETTIGUNGSWASSERGEHALT, NAME, LASTMODIFIED, KOMMENTAR,  ID)
-                  SELECT
-                    {infiltrationsrateanfang}, {infiltrationsrateende},
-                    {infiltrationsratestart}, {rueckgangskonstante}, {regenerationskonstante},
-                    {saettigungswassergehalt}, '{name}', '{lastmodified}', '{kommentar}', {id}
-                    FROM RDB$DATABASE
-                    WHERE '{name}' NOT IN (SELECT NAME FROM BODENKLASSE);
-                    """.format(infiltrationsrateanfang=infiltrationsrateanfang,
-                               infiltrationsrateende=infiltrationsrateende,
-                               infiltrationsratestart=infiltrationsratestart,
-                               rueckgangskonstante=rueckgangskonstante,
-                               regenerationskonstante=regenerationskonstante,
-                               saettigungswassergehalt=saettigungswassergehalt,
-                               name=bknam, lastmodified=createdat,
-                               kommentar=kommentar,  id=nextid)
                 try:
-                    dbHE.sql(sql)
+                    eingefuegt = anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(7) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(7) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-                nextid += 1
+                if eingefuegt:
+                    ids.weiter()
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        try:
+            writer.flush()
+            if check_export['modify_bodenklassen']:
+                treffer, fehlend = anweisung.anwenden()
+                fortschritt(u'{} Bodenklassen geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+        except BaseException as err:
+            fehlermeldung(u"(7a) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
 
-        fortschritt('{} Bodenklassen eingefuegt'.format(nextid-nr0), 0.62)
+        writer.abschnitt_ende()
+        statistik.ende()
+
+        fortschritt('{} Bodenklassen eingefuegt'.format(ids.anzahl), 0.62)
 
     # --------------------------------------------------------------------------------------------
     # Export der Abflussparameter
 
     if check_export['export_abflussparameter'] or check_export['modify_abflussparameter']:
-        if check_export['init_abflussparameter']:
-            dbHE.sql("DELETE FROM ABFLUSSPARAMETER")
+        statistik.abschnitt(u'Abflussparameter')
+        writer.abschnitt('ABFLUSSPARAMETER')
+        if check_export['init_abflussparameter'] and 'abflussparameter' not in geleert:
+            leeren(dbHE, 'abflussparameter')
 
         sql = u"""
             SELECT
@@ -857,114 +1144,97 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(22) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
-        nr0 = nextid
+        ids = idvergabe.block('ABFLUSSPARAMETER')
 
-        if createdat == 'NULL':
-            createdat = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime())
+        fortschritt(u'Export Abflussparameter...', 0.70)
 
-        fortschritt(u'Export Abflussparameter...', 70)
+        spalten = ('NAME', 'ABFLUSSBEIWERTANFANG', 'ABFLUSSBEIWERTENDE', 'BENETZUNGSVERLUST',
+                   'MULDENVERLUST', 'BENETZUNGSPEICHERSTART', 'MULDENAUFFUELLGRADSTART', 'SPEICHERKONSTANTEKONSTANT',
+                   'SPEICHERKONSTANTEMIN', 'SPEICHERKONSTANTEMAX', 'SPEICHERKONSTANTEKONSTANT2',
+                   'SPEICHERKONSTANTEMIN2', 'SPEICHERKONSTANTEMAX2',
+                   'BODENKLASSE', 'CHARAKTERISTISCHEREGENSPENDE', 'CHARAKTERISTISCHEREGENSPENDE2',
+                   'TYP', 'JAHRESGANGVERLUSTE', 'LASTMODIFIED', 'KOMMENTAR', 'ID')
+        if check_export['modify_abflussparameter']:
+            anweisung = writer.merge('ABFLUSSPARAMETER', spalten)
+        else:
+            anweisung = writer.insert('ABFLUSSPARAMETER', spalten)
 
-        for attr in dbQK.fetchall():
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
             ( apnam, anfangsabflussbeiwert_t, endabflussbeiwert_t,
               benetzungsverlust_t, muldenverlust_t, benetzung_startwert_t,
-              mulden_startwert_t, bodenklasse, kommentar, createdat) = \
-            ('NULL' if el is None else el for el in attr)
+              mulden_startwert_t, bodenklasse, kommentar, createdat) = attr
 
             # Formatierung der Zahlen
             ( anfangsabflussbeiwert, endabflussbeiwert, benetzungsverlust,
               muldenverlust, benetzung_startwert, mulden_startwert) = \
-                ('NULL' if tt == 'NULL' else '{:.2f}'.format(float(tt)) \
+                (None if tt is None else round(float(tt), 2) \
                     for tt in (anfangsabflussbeiwert_t, endabflussbeiwert_t,
                                benetzungsverlust_t, muldenverlust_t, benetzung_startwert_t,
                                mulden_startwert_t))
 
-            if bodenklasse == 'NULL':
+            if bodenklasse is None:
                 typ = 0                 # undurchlässig
                 bodenklasse = ''
             else:
                 typ = 1                 # durchlässig
 
+            if createdat is None:
+                createdat = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime())
+
+            werte = (apnam, anfangsabflussbeiwert, endabflussbeiwert, benetzungsverlust,
+                     muldenverlust, benetzung_startwert, mulden_startwert, 1,
+                     0, 0, 1,
+                     0, 0,
+                     bodenklasse, 0, 0,
+                     typ, 0, createdat, kommentar, ids.aktuell)
+
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
-            if check_export['modify_auslaesse']:
-                sql = u"""
-                  UPDATE ABFLUSSPARAMETER SET
-                  NAME='{apnam}', ABFLUSSBEIWERTANFANG={anfangsabflussbeiwert},
-                  ABFLUSSBEIWERTENDE={endabflussbeiwert}, BENETZUNGSVERLUST={benetzungsverlust},
-                  MULDENVERLUST={muldenverlust}, BENETZUNGSPEICHERSTART={benetzung_startwert},
-                  MULDENAUFFUELLGRADSTART={mulden_startwert},
-                  SPEICHERKONSTANTEKONSTANT={speicherkonstantekonstant},
-                  SPEICHERKONSTANTEMIN={speicherkonstantemin},
-                  SPEICHERKONSTANTEMAX={speicherkonstantemax},
-                  SPEICHERKONSTANTEKONSTANT2={speicherkonstantekonstant2},
-                  SPEICHERKONSTANTEMIN2={speicherkonstantemin2}, SPEICHERKONSTANTEMAX2={speicherkonstantemax2},
-                  BODENKLASSE='{bodenklasse}', CHARAKTERISTISCHEREGENSPENDE={charakteristischeregenspende},
-                  CHARAKTERISTISCHEREGENSPENDE2={charakteristischeregenspende2},
-                  TYP={typ}, JAHRESGANGVERLUSTE={jahresgangverluste}, LASTMODIFIED='{createdat}',
-                  KOMMENTAR='{kommentar}', ID={id}
-                  WHERE NAME = '{apnam}';
-                """.format(apnam=apnam, anfangsabflussbeiwert=anfangsabflussbeiwert,
-                             endabflussbeiwert=endabflussbeiwert, benetzungsverlust=benetzungsverlust,
-                           muldenverlust=muldenverlust, benetzung_startwert=benetzung_startwert,
-                             mulden_startwert=mulden_startwert, speicherkonstantekonstant=1,
-                           speicherkonstantemin=0, speicherkonstantemax=0, speicherkonstantekonstant2=1,
-                           speicherkonstantemin2=0, speicherkonstantemax2=0,
-                           bodenklasse=bodenklasse, charakteristischeregenspende=0, charakteristischeregenspende2=0,
-                           typ=typ, jahresgangverluste=0, createdat=createdat, kommentar=kommentar, id=nextid)
+            if check_export['modify_abflussparameter']:
                 try:
-                    dbHE.sql(sql)
+                    anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(8a) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(8a) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
             # Einfuegen in die Datenbank
-            elif check_export['export_auslaesse']:
-                sql = u"""
-                  INSERT INTO ABFLUSSPARAMETER
-                  ( NAME, ABFLUSSBEIWERTANFANG, ABFLUSSBEIWERTENDE, BENETZUNGSVERLUST,
-                    MULDENVERLUST, BENETZUNGSPEICHERSTART, MULDENAUFFUELLGRADSTART, SPEICHERKONSTANTEKONSTANT,
-                    SPEICHERKONSTANTEMIN, SPEICHERKONSTANTEMAX, SPEICHERKONSTANTEKONSTANT2,
-                    SPEICHERKONSTANTEMIN2, SPEICHERKONSTANTEMAX2,
-                    BODENKLASSE, CHARAKTERISTISCHEREGENSPENDE, CHARAKTERISTISCHEREGENSPENDE2,
-                    TYP, JAHRESGANGVERLUSTE, LASTMODIFIED, KOMMENTAR, ID)
-                  SELECT
-                    '{apnam}', {anfangsabflussbeiwert}, {endabflussbeiwert}, {benetzungsverlust},
-                    {muldenverlust}, {benetzung_startwert}, {mulden_startwert}, {speicherkonstantekonstant},
-                    {speicherkonstantemin}, {speicherkonstantemax}, {speicherkonstantekonstant2},
-                    {speicherkonstantemin2}, {speicherkonstantemax2},
-                    '{bodenklasse}', {charakteristischeregenspende}, {charakteristischeregenspende2},
-                    {typ}, {jahresgangverluste}, '{createdat}', '{kommentar}', {id}
-                  FROM RDB$DATABASE
-                  WHERE '{apnam}' NOT IN (SELECT NAME FROM ABFLUSSPARAMETER);
-                """.format(apnam=apnam, anfangsabflussbeiwert=anfangsabflussbeiwert,
-                             endabflussbeiwert=endabflussbeiwert, benetzungsverlust=benetzungsverlust,
-                           muldenverlust=muldenverlust, benetzung_startwert=benetzung_startwert,
-                             mulden_startwert=mulden_startwert, speicherkonstantekonstant=1,
-                           speicherkonstantemin=0, speicherkonstantemax=0, speicherkonstantekonstant2=1,
-                           speicherkonstantemin2=0, speicherkonstantemax2=0,
-                           bodenklasse=bodenklasse, charakteristischeregenspende=0, charakteristischeregenspende2=0,
-                           typ=typ, jahresgangverluste=0, createdat=createdat, kommentar=kommentar, id=nextid)
+            elif check_export['export_abflussparameter']:
                 try:
-                    dbHE.sql(sql)
+                    eingefuegt = anweisung.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(8b) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(8b) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-                nextid += 1
+                if eingefuegt:
+                    ids.weiter()
+
+        try:
+            writer.flush()
+            if check_export['modify_abflussparameter']:
+                treffer, fehlend = anweisung.anwenden()
+                fortschritt(u'{} Abflussparameter geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+        except BaseException as err:
+            fehlermeldung(u"(8c) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        writer.abschnitt_ende()
+        statistik.ende()
 
-        fortschritt('{} Abflussparameter eingefuegt'.format(nextid-nr0), 0.65)
+        fortschritt('{} Abflussparameter eingefuegt'.format(ids.anzahl), 0.65)
 
     # ------------------------------------------------------------------------------------------------
     # Export der Regenschreiber
@@ -972,8 +1242,10 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
     # Wenn in QKan keine Regenschreiber eingetragen sind, wird als Name "Regenschreiber1" angenommen.
 
     if check_export['export_regenschreiber'] or check_export['modify_regenschreiber']:
-        if check_export['init_regenschreiber']:
-            dbHE.sql("DELETE FROM REGENSCHREIBER")
+        statistik.abschnitt(u'Regenschreiber')
+        writer.abschnitt('REGENSCHREIBER')
+        if check_export['init_regenschreiber'] and 'regenschreiber' not in geleert:
+            leeren(dbHE, 'regenschreiber')
 
         # # Pruefung, ob Regenschreiber fuer Export vorhanden
         # if len(liste_teilgebiete) != 0:
@@ -989,6 +1261,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(5) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
@@ -1003,59 +1276,53 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
 
         logger.debug('Regenschreiber - reglis: {}'.format(str(reglis)))
 
-        # Liste der fehlenden Regenschreiber in der Ziel- (*.idbf-) Datenbank
-        # Hier muss eine Besonderheit von tuple berücksichtigt werden. Ein Tuple mit einem Element
-        # endet mit ",)", z.B. (1,), während ohne oder bei mehr als einem Element alles wie üblich
-        # ist: () oder (1,2,3,4)
-        if len(reglis) == 1:
-            sql = u"""SELECT NAME FROM REGENSCHREIBER WHERE NAME NOT IN {})""".format(str(reglis)[:-2])
-        else:
-            sql = u"""SELECT NAME FROM REGENSCHREIBER WHERE NAME NOT IN {}""".format(str(reglis))
-        dbHE.sql(sql)
+        ids = idvergabe.block('REGENSCHREIBER')
 
-        attr = dbHE.fetchall()
-        logger.debug('Regenschreiber - attr: {}'.format(str(attr)))
+        createdat = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime())
 
-        nr0 = nextid
+        anweisung = writer.insert('REGENSCHREIBER',
+                                  ('NUMMER', 'STATION',
+                                   'XKOORDINATE', 'YKOORDINATE', 'ZKOORDINATE', 'NAME',
+                                   'FLAECHEGESAMT', 'FLAECHEDURCHLAESSIG', 'FLAECHEUNDURCHLAESSIG',
+                                   'ANZAHLHALTUNGEN', 'INTERNENUMMER',
+                                   'LASTMODIFIED', 'KOMMENTAR', 'ID'))
 
         regschnr = 1
         for regenschreiber in reglis:
-            if regenschreiber not in attr:
-                sql = u"""
-                  INSERT INTO REGENSCHREIBER
-                  ( NUMMER, STATION,
-                    XKOORDINATE, YKOORDINATE, ZKOORDINATE, NAME,
-                    FLAECHEGESAMT, FLAECHEDURCHLAESSIG, FLAECHEUNDURCHLAESSIG,
-                    ANZAHLHALTUNGEN, INTERNENUMMER,
-                    LASTMODIFIED, KOMMENTAR, ID) SELECT
-                      {nummer}, '{station}',
-                      {xkoordinate}, {ykoordinate}, {zkoordinate}, '{name}',
-                      {flaechegesamt}, {flaechedurchlaessig}, {flaecheundurchlaessig},
-                      {anzahlhaltungen}, {internenummer},
-                      '{lastmodified}', '{kommentar}', {id}
-                    FROM RDB$DATABASE
-                    WHERE '{name}' NOT IN (SELECT NAME FROM REGENSCHREIBER);
-                  """.format(nummer=regschnr, station=10000 + regschnr,
-                             xkoordinate=0, ykoordinate=0, zkoordinate=0, name=regenschreiber,
-                             flaechegesamt=0, flaechedurchlaessig=0, flaecheundurchlaessig=0,
-                             anzahlhaltungen=0, internenummer=0,
-                             lastmodified=createdat, kommentar=u'Ergänzt durch QKan', id=nextid)
+            # In der Ziel- (*.idbf-) Datenbank vorhandene Regenschreiber werden von der
+            # Anweisung uebersprungen.
+            werte = (regschnr, str(10000 + regschnr),
+                     0, 0, 0, regenschreiber,
+                     0, 0, 0,
+                     0, 0,
+                     createdat, u'Ergänzt durch QKan', ids.aktuell)
 
-                try:
-                    dbHE.sql(sql)
-                except BaseException as err:
-                    fehlermeldung(u"(17) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
-                    del dbQK
-                    del dbHE
-                    return False
+            try:
+                eingefuegt = anweisung.execute(werte)
+            except BaseException as err:
+                fehlermeldung(u"(17) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                writer.rollback()
+                del dbQK
+                del dbHE
+                return False
 
-                logger.debug(u'In HE folgenden Regenschreiber ergänzt: {}'.format(sql))
+            if eingefuegt:
+                logger.debug(u'In HE folgenden Regenschreiber ergänzt: {}'.format(regenschreiber))
+                ids.weiter()
 
-                nextid += 1
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        try:
+            writer.flush()
+        except BaseException as err:
+            fehlermeldung(u"(17a) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
+
+        writer.abschnitt_ende()
+        statistik.ende()
 
-        fortschritt('{} Regenschreiber eingefuegt'.format(nextid-nr0), 0.68)
+        fortschritt('{} Regenschreiber eingefuegt'.format(ids.anzahl), 0.68)
 
 
     # ------------------------------------------------------------------------------------------------------
@@ -1083,8 +1350,21 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
 
     # Befestigte Flächen
     if check_export['export_flaechenrw'] or check_export['modify_flaechenrw']:
-        if check_export['init_flaechenrw']:
-            dbHE.sql("DELETE FROM FLAECHE")
+        statistik.abschnitt(u'Flaechen Teil 1')
+        writer.abschnitt('FLAECHEN')
+        if check_export['init_flaechenrw'] and 'flaechenrw' not in geleert:
+            leeren(dbHE, 'flaechenrw')
+
+        spalten = ('GROESSE', 'REGENSCHREIBER', 'HALTUNG',
+                   'BERECHNUNGSPEICHERKONSTANTE', 'TYP', 'ANZAHLSPEICHER',
+                   'SPEICHERKONSTANTE', 'SCHWERPUNKTLAUFZEIT',
+                   'FLIESSZEITOBERFLAECHE', 'LAENGSTEFLIESSZEITKANAL',
+                   'PARAMETERSATZ', 'NEIGUNGSKLASSE',
+                   'NAME', 'LASTMODIFIED',
+                   'KOMMENTAR', 'ID', 'ZUORDNUNABHEZG')
+        if check_export['modify_flaechenrw']:
+            aendern = writer.merge('FLAECHE', spalten)
+        einfuegen = writer.insert('FLAECHE', spalten)
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -1092,9 +1372,50 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
         else:
             auswahl = ""
 
+        # Die raeumlichen Verknuepfungen werden ueber die R*Tree-Indizes vorgefiltert. Fehlende Indizes
+        # werden fuer die Dauer des Exports angelegt.
+        if plan is not None:
+            try:
+                raumindizes.uebernehmen(plan.ergebnis('raumindizes'))
+            except BaseException as err:
+                logger.warning(u'Vorbereitung der räumlichen Indizes fehlgeschlagen: {}'.format(err))
+        rahmen_haltungen = u'buffer(EndPoint(linkfl.glink),{})'.format(fangradius)
+
+        # Zuordnung der Anbindungen (linkfl) zu Flächen und Haltungen. Sie wird einmal berechnet und
+        # von beiden Teilen über den Flächennamen verwendet. Die Geometrie des Startpunkts wird für
+        # die Zuordnung zu den verschnittenen Flächen in Teil 2 benötigt.
+        sql = u"""
+          CREATE TEMP TABLE linkfl_zuordnung AS
+          SELECT linkfl.pk AS pk, flaechen.flnam AS flnam, haltungen.haltnam AS haltnam,
+            StartPoint(linkfl.glink) AS startpunkt
+          FROM linkfl
+          INNER JOIN flaechen
+          ON {index_flaechen} AND within(StartPoint(linkfl.glink),flaechen.geom)
+          INNER JOIN haltungen
+          ON {index_haltungen} AND intersects(buffer(EndPoint(linkfl.glink),{fangradius}),haltungen.geom)
+        """.format(fangradius=fangradius,
+                   index_flaechen=raumindizes.filter('flaechen', 'geom', 'StartPoint(linkfl.glink)'),
+                   index_haltungen=raumindizes.filter('haltungen', 'geom', rahmen_haltungen))
+        try:
+            dbQK.sql(u'DROP TABLE IF EXISTS temp.linkfl_zuordnung')
+            dbQK.sql(sql)
+            dbQK.sql(u'CREATE INDEX temp.linkfl_zuordnung_flnam ON linkfl_zuordnung (flnam)')
+        except BaseException as err:
+            fehlermeldung(u"QKan_Export (23a) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
+
+        # Kontrolle: Anbindungen ohne Fläche oder Haltung
+        dbQK.sql(u'SELECT count(*) FROM linkfl WHERE pk NOT IN (SELECT pk FROM linkfl_zuordnung)')
+        anz = int(dbQK.fetchone()[0])
+        if anz > 0:
+            logger.warning(u'{} Anbindungen (linkfl) sind keiner Fläche oder keiner Haltung zugeordnet'.format(anz))
+
         # Teil 1: Nicht zu verschneidende Flächen exportieren
         sql = u"""
-          SELECT flaechen.flnam AS flnam, haltungen.haltnam AS haltnam, flaechen.neigkl AS neigkl,
+          SELECT flaechen.flnam AS flnam, linkfl_zuordnung.haltnam AS haltnam, flaechen.neigkl AS neigkl,
             flaechen.he_typ AS he_typ, flaechen.speicherzahl AS speicherzahl, flaechen.speicherkonst AS speicherkonst,
             flaechen.fliesszeit AS fliesszeit, flaechen.fliesszeitkanal AS fliesszeitkanal,
             area(flaechen.geom)/10000 AS flaeche, flaechen.regenschreiber AS regenschreiber,
@@ -1103,17 +1424,16 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
           FROM flaechen
           LEFT JOIN abflussparameter
           ON flaechen.abflussparameter = abflussparameter.apnam
-          INNER JOIN linkfl
-          ON within(StartPoint(linkfl.glink),flaechen.geom)
-          INNER JOIN haltungen
-          ON intersects(buffer(EndPoint(linkfl.glink),{fangradius}),haltungen.geom)
+          INNER JOIN linkfl_zuordnung
+          ON linkfl_zuordnung.flnam = flaechen.flnam
           WHERE area(flaechen.geom)/10000 > 0.01 AND
                 (flaechen.aufteilen <> 'ja' or flaechen.aufteilen IS NULL){auswahl}
-        """.format(auswahl=auswahl, fangradius=fangradius)
+        """.format(auswahl=auswahl)
         try:
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"QKan_Export (23) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
@@ -1121,122 +1441,134 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
 
         fortschritt('Export befestigte Flaechen...', 0.70)
 
-        nr0 = nextid
+        ids = idvergabe.block('FLAECHEN')
 
-        for attr in dbQK.fetchall():
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
             (flnam, haltnam, neigkl,
              he_typ, speicherzahl, speicherkonst,
              fliesszeit, fliesszeitkanal,
              flaeche, regenschreiber,
              abflussparameter, createdat,
-             kommentar) = \
-                ('NULL' if el is None else el for el in attr)
+             kommentar) = attr
 
             # Datenkorrekturen
-            if regenschreiber == 'NULL':
+            if regenschreiber is None:
                 regenschreiber = 'Regenschreiber1'
 
-            if he_typ == 'NULL':
+            if he_typ is None:
                 he_typ = 0                  # Flächentyp 'Direkt'
 
-            if neigkl == 'NULL':
+            if neigkl is None:
                 neigkl = 1
 
-            if speicherzahl == 'NULL':
+            if speicherzahl is None:
                 speicherzahl = 3
 
-            if speicherkonst == 'NULL':
+            if speicherkonst is None:
                 speicherkonst = math.sqrt(flaeche)*2.
 
-            if fliesszeit  == 'NULL':
+            if fliesszeit is None:
                 fliesszeit = math.sqrt(flaeche)*6.
 
-            if fliesszeitkanal == 'NULL':
+            if fliesszeitkanal is None:
                 fliesszeitkanal = 0
 
-            if createdat == 'NULL':
+            if createdat is None:
                 createdat = time.strftime('%d.%m.%Y %H:%M:%S',time.localtime())
 
-            if kommentar == 'NULL' or kommentar == '':
+            if kommentar is None or kommentar == '':
                 kommentar = 'eingefuegt von k_qkhe'
 
+            werte = (round(flaeche, 4), regenschreiber, haltnam,
+                     he_typ, 0, speicherzahl,
+                     round(speicherkonst, 3), round(fliesszeit, 2),
+                     round(fliesszeit, 2), round(fliesszeitkanal, 2),
+                     abflussparameter, neigkl,
+                     u'fbef_{}-{}'.format(flnam, haltnam), createdat,
+                     kommentar, ids.aktuell, 0)
+
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
             if check_export['modify_flaechenrw']:
-                sql = u"""
-                  UPDATE FLAECHE SET
-                  GROESSE={flaeche:.4f}, REGENSCHREIBER='{regenschreiber}', HALTUNG='{haltnam}',
-                  BERECHNUNGSPEICHERKONSTANTE={he_typ}, TYP={fltyp}, ANZAHLSPEICHER={speicherzahl},
-                  SPEICHERKONSTANTE={speicherkonst:.3f}, SCHWERPUNKTLAUFZEIT={fliesszeit1:.2f},
-                  FLIESSZEITOBERFLAECHE={fliesszeit2:.2f}, LAENGSTEFLIESSZEITKANAL={fliesszeitkanal:.2f},
-                  PARAMETERSATZ='{abflussparameter}', NEIGUNGSKLASSE={neigkl},
-                  NAME='fbef_{flnam}-{haltnam}', LASTMODIFIED='{createdat}',
-                  KOMMENTAR='{kommentar}', ID={nextid}, ZUORDNUNABHEZG={zuordnunabhezg}
-                  WHERE NAME = 'fbef_{flnam}-{haltnam}';
-                  """.format(flaeche = flaeche, regenschreiber = regenschreiber, haltnam = haltnam,
-                             he_typ=he_typ, fltyp=0, speicherzahl = speicherzahl,
-                             speicherkonst = speicherkonst, fliesszeit1 = fliesszeit,
-                             fliesszeit2=fliesszeit, fliesszeitkanal = fliesszeitkanal,
-                             abflussparameter = abflussparameter, neigkl = neigkl,
-                             flnam = flnam, createdat = createdat,
-                             kommentar = kommentar, nextid = nextid, zuordnunabhezg = 0)
                 try:
-                    dbHE.sql(sql)
+                    aendern.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(9a) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(9a) SQL-Fehler in Firebird: \n{}\n".format(err), aendern.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-
             # Einfuegen in die Datenbank
             if check_export['export_flaechenrw']:
-                sql = u"""
-                  INSERT INTO FLAECHE
-                  ( GROESSE, REGENSCHREIBER, HALTUNG,
-                    BERECHNUNGSPEICHERKONSTANTE, TYP, ANZAHLSPEICHER,
-                    SPEICHERKONSTANTE, SCHWERPUNKTLAUFZEIT,
-                    FLIESSZEITOBERFLAECHE, LAENGSTEFLIESSZEITKANAL,
-                    PARAMETERSATZ, NEIGUNGSKLASSE,
-                    NAME, LASTMODIFIED,
-                    KOMMENTAR, ID, ZUORDNUNABHEZG)
-                  SELECT
-                    {flaeche:.4f}, '{regenschreiber}', '{haltnam}',
-                    {he_typ}, {fltyp}, {speicherzahl},
-                    {speicherkonst:.3f}, {fliesszeit1:.2f},
-                    {fliesszeit2:.2f}, {fliesszeitkanal:.2f},
-                    '{abflussparameter}', {neigkl},
-                    'fbef_{flnam}-{haltnam}', '{createdat}',
-                    '{kommentar}', {nextid}, {zuordnunabhezg}
-                  FROM RDB$DATABASE
-                  WHERE 'fbef_{flnam}-{haltnam}' NOT IN (SELECT NAME FROM FLAECHE);
-                  """.format(flaeche = flaeche, regenschreiber = regenschreiber, haltnam = haltnam,
-                             he_typ=he_typ, fltyp=0, speicherzahl = speicherzahl,
-                             speicherkonst = speicherkonst, fliesszeit1 = fliesszeit,
-                             fliesszeit2=fliesszeit, fliesszeitkanal = fliesszeitkanal,
-                             abflussparameter = abflussparameter, neigkl = neigkl,
-                             flnam = flnam, createdat = createdat,
-                             kommentar = kommentar, nextid = nextid, zuordnunabhezg = 0)
                 try:
-                    dbHE.sql(sql)
+                    eingefuegt = einfuegen.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(9b) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(9b) SQL-Fehler in Firebird: \n{}\n".format(err), einfuegen.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-                nextid += 1
-
+                if eingefuegt:
+                    ids.weiter()
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        try:
+            writer.flush()
+            if check_export['modify_flaechenrw']:
+                treffer, fehlend = aendern.anwenden()
+                fortschritt(u'{} Flaechen (nicht verschnitten) geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+        except BaseException as err:
+            fehlermeldung(u"(9e) SQL-Fehler in Firebird: \n{}\n".format(err), einfuegen.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
 
-        fortschritt('{} Flaechen (nicht verschnitten) eingefuegt'.format(nextid-nr0), 0.80)
+        fortschritt('{} Flaechen (nicht verschnitten) eingefuegt'.format(ids.anzahl), 0.80)
 
         # Teil 2: Zu verschneidende Flächen exportieren
-        sql = u"""
-          WITH flintersect AS (
+        statistik.abschnitt(u'Flaechen Teil 2')
+
+        # Mit der Option "verschneidungscache" werden die Verschneidungen mit den tezg-Flächen in
+        # der Tabelle flaechen_tezg_verschnitt der QKan-Datenbank zwischengespeichert und nur für
+        # geänderte Geometrien neu berechnet, gegebenenfalls schon parallel zu den vorherigen
+        # Abschnitten. Ohne die Option wird die QKan-Datenbank nicht verändert.
+        cache = Verschneidungscache(dbQK, raumindizes, pool)
+        aktualisiert = None
+        try:
+            if plan is not None and plan.enthaelt('verschneidung'):
+                aktualisiert = plan.ergebnis('verschneidung')
+            elif check_export.get('verschneidungscache', False) and cache.verfuegbar():
+                aktualisiert = cache.aktualisieren(auswahl)
+        except BaseException as err:
+            fehlermeldung(u"QKan_Export (23b) SQL-Fehler in QKan-DB: \n{}\n".format(err), cache.tabelle)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
+        if aktualisiert is not None:
+            vorhanden, berechnet = aktualisiert
+            fortschritt(u'Verschneidung: {} Paare aus Zwischenspeicher, {} neu berechnet'.format(
+                vorhanden, berechnet))
+            verschnitt = u"""
+            SELECT flaechen.flnam AS flnam, flaechen.neigkl AS neigkl, flaechen.he_typ AS he_typ,
+            flaechen.speicherzahl AS speicherzahl, flaechen.speicherkonst AS speicherkonst,
+            flaechen.fliesszeit AS fliesszeit, flaechen.fliesszeitkanal AS fliesszeitkanal,
+            flaechen.regenschreiber AS regenschreiber,
+            flaechen.abflussparameter AS abflussparameter, flaechen.createdat AS createdat,
+            flaechen.kommentar AS kommentar, {cache}.geom AS geom, {cache}.flaeche AS flaeche
+            FROM flaechen
+            INNER JOIN {cache}
+            ON {cache}.flnam = flaechen.flnam
+            WHERE flaechen.aufteilen = 'ja' AND {cache}.geom IS NOT NULL{auswahl}""".format(
+                cache=cache.tabelle, auswahl=auswahl)
+            flaeche = u'flintersect.flaeche'
+        else:
+            if pool is not None:
+                logger.warning(u'Option geometrieprozesse: Ohne Verschneidungscache erfolgt die '
+                               u'Verschneidung in SpatiaLite')
+            verschnitt = u"""
             SELECT flaechen.flnam AS flnam, flaechen.neigkl AS neigkl, flaechen.he_typ AS he_typ, 
             flaechen.speicherzahl AS speicherzahl, flaechen.speicherkonst AS speicherkonst,
             flaechen.fliesszeit AS fliesszeit, flaechen.fliesszeitkanal AS fliesszeitkanal,
@@ -1245,27 +1577,31 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             flaechen.kommentar AS kommentar, CastToMultiPolygon(intersection(flaechen.geom,tezg.geom)) AS geom
             FROM flaechen
             INNER JOIN tezg
-            ON intersects(flaechen.geom,tezg.geom)
-            WHERE flaechen.aufteilen = 'ja'{auswahl})
-          SELECT flintersect.flnam AS flnam, haltungen.haltnam AS haltnam, flintersect.neigkl AS neigkl,
+            ON {index_tezg} AND intersects(flaechen.geom,tezg.geom)
+            WHERE flaechen.aufteilen = 'ja'{auswahl}""".format(
+                auswahl=auswahl, index_tezg=raumindizes.filter('tezg', 'geom', 'flaechen.geom'))
+            flaeche = u'area(flintersect.geom)'
+
+        sql = u"""
+          WITH flintersect AS ({verschnitt})
+          SELECT flintersect.flnam AS flnam, linkfl_zuordnung.haltnam AS haltnam, flintersect.neigkl AS neigkl,
             flintersect.he_typ AS he_typ, flintersect.speicherzahl AS speicherzahl, flintersect.speicherkonst AS speicherkonst,
             flintersect.fliesszeit AS fliesszeit, flintersect.fliesszeitkanal AS fliesszeitkanal,
-            area(flintersect.geom)/10000 AS flaeche, flintersect.regenschreiber AS regenschreiber,
+            {flaeche}/10000 AS flaeche, flintersect.regenschreiber AS regenschreiber,
             flintersect.abflussparameter AS abflussparameter, flintersect.createdat AS createdat,
             flintersect.kommentar AS kommentar
           FROM flintersect
           LEFT JOIN abflussparameter
           ON flintersect.abflussparameter = abflussparameter.apnam
-          INNER JOIN linkfl
-          ON within(StartPoint(linkfl.glink),flintersect.geom)
-          INNER JOIN haltungen
-          ON intersects(buffer(EndPoint(linkfl.glink),{fangradius}),haltungen.geom)
-          WHERE area(flintersect.geom)/10000 > 0.01
-        """.format(auswahl=auswahl, fangradius=fangradius)
+          INNER JOIN linkfl_zuordnung
+          ON linkfl_zuordnung.flnam = flintersect.flnam AND within(linkfl_zuordnung.startpunkt,flintersect.geom)
+          WHERE {flaeche}/10000 > 0.01
+        """.format(verschnitt=verschnitt, flaeche=flaeche)
         try:
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"QKan_Export (23) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
@@ -1273,116 +1609,96 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
 
         fortschritt('Export befestigte Flaechen...', 0.70)
 
-        nr0 = nextid
+        nr0 = ids.anzahl
 
-        for attr in dbQK.fetchall():
+        for attr in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
 
-            # In allen Feldern None durch NULL ersetzen
             (flnam, haltnam, neigkl,
              he_typ, speicherzahl, speicherkonst,
              fliesszeit, fliesszeitkanal,
              flaeche, regenschreiber,
              abflussparameter, createdat,
-             kommentar) = \
-                ('NULL' if el is None else el for el in attr)
+             kommentar) = attr
 
             # Datenkorrekturen
-            if regenschreiber == 'NULL':
+            if regenschreiber is None:
                 regenschreiber = 'Regenschreiber1'
 
-            if he_typ == 'NULL':
+            if he_typ is None:
                 he_typ = 0                  # Flächentyp 'Direkt'
 
-            if neigkl == 'NULL':
+            if neigkl is None:
                 neigkl = 1
 
-            if speicherzahl == 'NULL':
+            if speicherzahl is None:
                 speicherzahl = 3
 
-            if speicherkonst == 'NULL':
+            if speicherkonst is None:
                 speicherkonst = math.sqrt(flaeche)*2.
 
-            if fliesszeit  == 'NULL':
+            if fliesszeit is None:
                 fliesszeit = math.sqrt(flaeche)*6.
 
-            if fliesszeitkanal == 'NULL':
+            if fliesszeitkanal is None:
                 fliesszeitkanal = 0
 
-            if createdat == 'NULL':
+            if createdat is None:
                 createdat = time.strftime('%d.%m.%Y %H:%M:%S',time.localtime())
 
-            if kommentar == 'NULL' or kommentar == '':
+            if kommentar is None or kommentar == '':
                 kommentar = 'eingefuegt von k_qkhe'
 
+            werte = (round(flaeche, 4), regenschreiber, haltnam,
+                     he_typ, 0, speicherzahl,
+                     round(speicherkonst, 3), round(fliesszeit, 2),
+                     round(fliesszeit, 2), round(fliesszeitkanal, 2),
+                     abflussparameter, neigkl,
+                     u'fbef_{}-{}'.format(flnam, haltnam), createdat,
+                     kommentar, ids.aktuell, 0)
+
             # Ändern vorhandener Datensätze (geschickterweise vor dem Einfügen!)
             if check_export['modify_flaechenrw']:
-                sql = u"""
-                  UPDATE FLAECHE SET
-                  GROESSE={flaeche:.4f}, REGENSCHREIBER='{regenschreiber}', HALTUNG='{haltnam}',
-                  BERECHNUNGSPEICHERKONSTANTE={he_typ}, TYP={fltyp}, ANZAHLSPEICHER={speicherzahl},
-                  SPEICHERKONSTANTE={speicherkonst:.3f}, SCHWERPUNKTLAUFZEIT={fliesszeit1:.2f},
-                  FLIESSZEITOBERFLAECHE={fliesszeit2:.2f}, LAENGSTEFLIESSZEITKANAL={fliesszeitkanal:.2f},
-                  PARAMETERSATZ='{abflussparameter}', NEIGUNGSKLASSE={neigkl},
-                  NAME='fbef_{flnam}-{haltnam}', LASTMODIFIED='{createdat}',
-                  KOMMENTAR='{kommentar}', ID={nextid}, ZUORDNUNABHEZG={zuordnunabhezg}
-                  WHERE NAME = 'fbef_{flnam}-{haltnam}';
-                  """.format(flaeche = flaeche, regenschreiber = regenschreiber, haltnam = haltnam,
-                             he_typ=he_typ, fltyp=0, speicherzahl = speicherzahl,
-                             speicherkonst = speicherkonst, fliesszeit1 = fliesszeit,
-                             fliesszeit2=fliesszeit, fliesszeitkanal = fliesszeitkanal,
-                             abflussparameter = abflussparameter, neigkl = neigkl,
-                             flnam = flnam, createdat = createdat,
-                             kommentar = kommentar, nextid = nextid, zuordnunabhezg = 0)
                 try:
-                    dbHE.sql(sql)
+                    aendern.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(9c) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(9c) SQL-Fehler in Firebird: \n{}\n".format(err), aendern.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
             # Einfuegen in die Datenbank
             if check_export['export_flaechenrw']:
-                sql = u"""
-                  INSERT INTO FLAECHE
-                  ( GROESSE, REGENSCHREIBER, HALTUNG,
-                    BERECHNUNGSPEICHERKONSTANTE, TYP, ANZAHLSPEICHER,
-                    SPEICHERKONSTANTE, SCHWERPUNKTLAUFZEIT,
-                    FLIESSZEITOBERFLAECHE, LAENGSTEFLIESSZEITKANAL,
-                    PARAMETERSATZ, NEIGUNGSKLASSE,
-                    NAME, LASTMODIFIED,
-                    KOMMENTAR, ID, ZUORDNUNABHEZG)
-                  SELECT
-                    {flaeche:.4f}, '{regenschreiber}', '{haltnam}',
-                    {he_typ}, {fltyp}, {speicherzahl},
-                    {speicherkonst:.3f}, {fliesszeit1:.2f},
-                    {fliesszeit2:.2f}, {fliesszeitkanal:.2f},
-                    '{abflussparameter}', {neigkl},
-                    'fbef_{flnam}-{haltnam}', '{createdat}',
-                    '{kommentar}', {nextid}, {zuordnunabhezg}
-                  FROM RDB$DATABASE
-                  WHERE 'fbef_{flnam}-{haltnam}' NOT IN (SELECT NAME FROM FLAECHE);
-                  """.format(flaeche = flaeche, regenschreiber = regenschreiber, haltnam = haltnam,
-                             he_typ=he_typ, fltyp=0, speicherzahl = speicherzahl,
-                             speicherkonst = speicherkonst, fliesszeit1 = fliesszeit,
-                             fliesszeit2=fliesszeit, fliesszeitkanal = fliesszeitkanal,
-                             abflussparameter = abflussparameter, neigkl = neigkl,
-                             flnam = flnam, createdat = createdat,
-                             kommentar = kommentar, nextid = nextid, zuordnunabhezg = 0)
                 try:
-                    dbHE.sql(sql)
+                    eingefuegt = einfuegen.execute(werte)
                 except BaseException as err:
-                    fehlermeldung(u"(9d) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                    fehlermeldung(u"(9d) SQL-Fehler in Firebird: \n{}\n".format(err), einfuegen.sql)
+                    writer.rollback()
                     del dbQK
                     del dbHE
                     return False
 
-                nextid += 1
+                if eingefuegt:
+                    ids.weiter()
+
+        dbQK.sql(u'DROP TABLE IF EXISTS temp.linkfl_zuordnung')
+
+        try:
+            writer.flush()
+            if check_export['modify_flaechenrw']:
+                treffer, fehlend = aendern.anwenden()
+                fortschritt(u'{} Flaechen (verschnitten) geaendert, {} nicht in HE vorhanden'.format(treffer, fehlend))
+        except BaseException as err:
+            fehlermeldung(u"(9f) SQL-Fehler in Firebird: \n{}\n".format(err), einfuegen.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+        writer.abschnitt_ende()
+        statistik.ende()
 
-        fortschritt('{} Flaechen (nicht verschnitten) eingefuegt'.format(nextid-nr0), 0.80)
+        fortschritt('{} Flaechen (nicht verschnitten) eingefuegt'.format(ids.anzahl - nr0), 0.80)
 
 
     # -----------------------------------------------------------------------------------------
@@ -1419,6 +1735,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
     """
 
     if check_export['export_flaechensw'] or check_export['modify_flaechensw']:
+        statistik.abschnitt(u'Teilgebiete')
 
         sql = 'SELECT count(*) AS anz FROM teilgebiete'
         dbQK.sql(sql)
@@ -1448,6 +1765,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                     dbQK.sql(sql)
                 except BaseException as err:
                     fehlermeldung(u"(27) Fehler in SQL:\n{sql}\n", err)
+                    writer.rollback()
                     return False
                 dbQK.commit()
             else:
@@ -1468,11 +1786,12 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                         dbQK.sql(sql)
                     except BaseException as err:
                         fehlermeldung(u"(28) Fehler in SQL:\n{sql}\n", err)
+                        writer.rollback()
                         return False
                     dbQK.commit()
-                    iface.messageBar().pushMessage(u"Tabelle 'teilgebiete':\n",
-                                               u"Es wurden {} Teilgebiete hinzugefügt".format(len(tgb)),
-                                               level=QgsMessageBar.INFO, duration=3)
+                    meldung(u"Tabelle 'teilgebiete':\n",
+                            u"Es wurden {} Teilgebiete hinzugefügt".format(len(tgb)),
+                            level=QgsMessageBar.INFO, dauer=3)
 
                 # Kontrolle mit Warnung
                 sql = u"""
@@ -1484,9 +1803,9 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                 dbQK.sql(sql)
                 anz = int(dbQK.fetchone()[0])
                 if anz > 0:
-                    iface.messageBar().pushMessage(u"Fehlerhafte Daten in Tabelle 'tezg':",
+                    meldung(u"Fehlerhafte Daten in Tabelle 'tezg':",
                         u"{} Flächen sind keinem Teilgebiet zugeordnet".format(anz),
-                        level=QgsMessageBar.WARNING,duration=0)
+                        level=QgsMessageBar.WARNING,dauer=0)
         else:
             # 2 Teilgebiete in QKan ----------------------------------------------------
             sql = u"""
@@ -1505,11 +1824,12 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                         dbQK.sql(sql)
                     except BaseException as err:
                         fehlermeldung(u"(29) Fehler in SQL:\n{sql}\n", err)
+                        writer.rollback()
                         return False
                     dbQK.commit()
-                    iface.messageBar().pushMessage(u"Tabelle 'tezg':\n",
+                    meldung(u"Tabelle 'tezg':\n",
                         u"Alle Flächen in der Tabelle 'tezg' wurden einem Teilgebiet zugeordnet",
-                        level=QgsMessageBar.INFO, duration=3)
+                        level=QgsMessageBar.INFO, dauer=3)
                 else:
                     # 2.1.2 Es existieren mehrere Teilgebiete ------------------------------------------
                     sql = u"""UPDATE tezg SET teilgebiet = (SELECT tgnam FROM teilgebiete
@@ -1518,11 +1838,12 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                         dbQK.sql(sql)
                     except BaseException as err:
                         fehlermeldung(u"(30) Fehler in SQL:\n{sql}\n", err)
+                        writer.rollback()
                         return False
                     dbQK.commit()
-                    iface.messageBar().pushMessage(u"Tabelle 'tezg':\n",
+                    meldung(u"Tabelle 'tezg':\n",
                         u"Alle Flächen in der Tabelle 'tezg' wurden dem Teilgebiet zugeordnet, in dem sie liegen.",
-                        level=QgsMessageBar.INFO, duration=3)
+                        level=QgsMessageBar.INFO, dauer=3)
 
                     # Kontrolle mit Warnung
                     sql = u"""
@@ -1534,9 +1855,9 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                     dbQK.sql(sql)
                     anz = int(dbQK.fetchone()[0])
                     if anz > 0:
-                        iface.messageBar().pushMessage(u"Fehlerhafte Daten in Tabelle 'tezg':",
+                        meldung(u"Fehlerhafte Daten in Tabelle 'tezg':",
                             u"{} Flächen sind keinem Teilgebiet zugeordnet".format(anz),
-                            level=QgsMessageBar.WARNING,duration=0)
+                            level=QgsMessageBar.WARNING,dauer=0)
             else:
                 # 2.2 Es gibt tezg mit zugeordnetem Teilgebiet
                 # Kontrolle mit Warnung
@@ -1549,9 +1870,9 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
                 dbQK.sql(sql)
                 anz = int(dbQK.fetchone()[0])
                 if anz > 0:
-                    iface.messageBar().pushMessage(u"Fehlerhafte Daten in Tabelle 'tezg':",
-                                                   u"{} Flächen sind keinem Teilgebiet zugeordnet".format(anz),
-                                                   level=QgsMessageBar.WARNING, duration=0)
+                    meldung(u"Fehlerhafte Daten in Tabelle 'tezg':",
+                            u"{} Flächen sind keinem Teilgebiet zugeordnet".format(anz),
+                            level=QgsMessageBar.WARNING, dauer=0)
 
         # --------------------------------------------------------------------------------------------
         # Export der Einzeleinleiter aus Schmutzwasser
@@ -1572,8 +1893,11 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
         #
         # Mit Stand 8.5.2017 ist nur die Variante HERKUNFT = 3 realisiert
 
-        if check_export['init_flaechensw']:
-            dbHE.sql("DELETE FROM EINZELEINLEITER")
+        statistik.abschnitt(u'Einzeleinleiter')
+        writer.abschnitt('EINZELEINLEITER')
+
+        if check_export['init_flaechensw'] and 'flaechensw' not in geleert:
+            leeren(dbHE, 'flaechensw')
 
         # Nur Daten fuer ausgewaehlte Teilgebiete
         if len(liste_teilgebiete) != 0:
@@ -1599,58 +1923,68 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbQK.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(26) SQL-Fehler in QKan-DB: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
-        nr0 = nextid
+        ids = idvergabe.block('EINZELEINLEITER')
 
         fortschritt('Export Einzeleinleiter...', 0.95)
-        for b in dbQK.fetchall():
 
-            # In allen Feldern None durch NULL ersetzen
-            flnam, xfl, yfl, haltnam, ew, stdmittel, fremdwas, tgnam = \
-                ('NULL' if el is None else el for el in b)
+        createdat = time.strftime('%d.%m.%Y %H:%M:%S', time.localtime())
+
+        anweisung = writer.insert('EINZELEINLEITER',
+                                  ('XKOORDINATE', 'YKOORDINATE', 'ZUORDNUNGGESPERRT', 'ZUORDNUNABHEZG', 'ROHR',
+                                   'ABWASSERART', 'EINWOHNER', 'WASSERVERBRAUCH', 'HERKUNFT',
+                                   'STUNDENMITTEL', 'FREMDWASSERZUSCHLAG', 'FAKTOR', 'GESAMTFLAECHE',
+                                   'TEILEINZUGSGEBIET', 'ZUFLUSSMODELL', 'ZUFLUSSDIREKT', 'ZUFLUSS',
+                                   'PLANUNGSSTATUS', 'NAME', 'ABRECHNUNGSZEITRAUM', 'ABZUG',
+                                   'LASTMODIFIED', 'ID'),
+                                  schluessel=None)
+
+        for b in datensaetze(dbQK, statistik=statistik, abbruch=writer.abbruch):
+
+            flnam, xfl, yfl, haltnam, ew, stdmittel, fremdwas, tgnam = b
 
             # Einfuegen in die Datenbank
-            sql = u"""
-              INSERT INTO EINZELEINLEITER
-              ( XKOORDINATE, YKOORDINATE, ZUORDNUNGGESPERRT, ZUORDNUNABHEZG, ROHR,
-                ABWASSERART, EINWOHNER, WASSERVERBRAUCH, HERKUNFT,
-                STUNDENMITTEL, FREMDWASSERZUSCHLAG, FAKTOR, GESAMTFLAECHE, TEILEINZUGSGEBIET,
-                ZUFLUSSMODELL, ZUFLUSSDIREKT, ZUFLUSS, PLANUNGSSTATUS, NAME,
-                ABRECHNUNGSZEITRAUM, ABZUG,
-                LASTMODIFIED, ID) VALUES
-              ( {xfl}, {yfl}, {zuordnunggesperrt}, {zuordnunabhezg}, '{haltnam}',
-                {abwasserart}, {ew}, {wverbrauch}, {herkunft},
-                {stdmittel}, {fremdwas}, {faktor}, {flaeche}, '{teilgebiet}',
-                {zuflussmodell}, {zuflussdirekt}, {zufluss}, {planungsstatus}, '{flnam}_SW_TEZG',
-                {abrechnungszeitraum}, {abzug},
-                '{createdat}', {nextid});
-              """.format(xfl = xfl, yfl = yfl, zuordnunggesperrt = 0, zuordnunabhezg = 1,  haltnam = haltnam,
-                         abwasserart = 0, ew = ew, wverbrauch = 0, herkunft = 3,
-                         stdmittel = stdmittel, fremdwas = fremdwas, faktor = 1, flaeche = 0, teilgebiet = tgnam,
-                         zuflussmodell = 0, zuflussdirekt = 0, zufluss = 0, planungsstatus = 0, flnam = flnam,
-                         abrechnungszeitraum = 365, abzug = 0,
-                         createdat = createdat, nextid = nextid)
+            werte = (xfl, yfl, 0, 1, haltnam,
+                     0, ew, 0, 3,
+                     stdmittel, fremdwas, 1, 0,
+                     tgnam, 0, 0, 0,
+                     0, u'{}_SW_TEZG'.format(flnam), 365, 0,
+                     createdat, ids.aktuell)
             try:
-                dbHE.sql(sql)
+                anweisung.execute(werte)
             except BaseException as err:
-                fehlermeldung(u"(12) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+                fehlermeldung(u"(12) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+                writer.rollback()
                 del dbQK
                 del dbHE
                 return False
 
-            nextid += 1
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+            ids.weiter()
+
+        try:
+            writer.flush()
+        except BaseException as err:
+            fehlermeldung(u"(12a) SQL-Fehler in Firebird: \n{}\n".format(err), anweisung.sql)
+            writer.rollback()
+            del dbQK
+            del dbHE
+            return False
 
+        writer.abschnitt_ende()
+        statistik.ende()
 
-        fortschritt(u'{} Einzeleinleiter eingefuegt'.format(nextid - nr0), 0.95)
+
+        fortschritt(u'{} Einzeleinleiter eingefuegt'.format(ids.anzahl), 0.95)
 
 # --------------------------------------------------------------------------------------------------
 # Setzen der internen Referenzen
 
+    statistik.abschnitt(u'Referenzen', schreiben=True)
+
 # --------------------------------------------------------------------------------------------------
 # 1. Schaechte: Anzahl Kanten
 
@@ -1674,6 +2008,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbHE.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(13) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
@@ -1688,6 +2023,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbHE.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(14) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
@@ -1705,6 +2041,7 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbHE.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(15) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
@@ -1722,36 +2059,52 @@ def exportKanaldaten(iface, database_HE, dbtemplate_HE, database_QKan, liste_tei
             dbHE.sql(sql)
         except BaseException as err:
             fehlermeldung(u"(16) SQL-Fehler in Firebird: \n{}\n".format(err), sql)
+            writer.rollback()
             del dbQK
             del dbHE
             return False
 
-        dbHE.sql("UPDATE ITWH$PROGINFO SET NEXTID = {:d}".format(nextid))
-        dbHE.commit()
+    statistik.abschnitt(u'Abschluss', schreiben=True)
+    try:
+        idvergabe.abschliessen()
+        writer.commit()
+    except BaseException as err:
+        fehlermeldung(u"(19) SQL-Fehler in Firebird beim Abschluss der Transaktion: \n{}\n".format(err), '')
+        writer.rollback()
+        del dbQK
+        del dbHE
+        return False
+
+    # Backend "skript": Das SQL-Skript wird erst nach dem vollständigen Export geschrieben
+    try:
+        backend.abschliessen(dbHE)
+    except BaseException as err:
+        fehlermeldung(u"(37) Fehler beim Schreiben des SQL-Skripts: \n{}\n".format(err), '')
+        del dbQK
+        del dbHE
+        return False
+
+    if exportstand is not None:
+        try:
+            exportstand.speichern()
+        except BaseException as err:
+            logger.warning(u'Exportstand konnte nicht gespeichert werden: {}'.format(err))
 
     del dbQK
     del dbHE
+    statistik.ende()
 
     fortschritt('Ende...',1)
 
-    iface.messageBar().pushMessage(u"Status: ", u"Datenexport abgeschlossen.",
-        level=QgsMessageBar.INFO, duration=0)
+    meldung(u"Status: ", u"Datenexport abgeschlossen.")
 
-# ----------------------------------------------------------------------------------------------------------------------
+    return True
 
-# Verzeichnis der Testdaten
-pfad = 'C:/FHAC/jupiter/hoettges/team_data/Kanalprogramme/k_qkan/k_heqk/beispiele/modelldb_itwh'
+# ----------------------------------------------------------------------------------------------------------------------
 
-database_HE =   os.path.join(pfad,'muster-modelldatenbank.idbf')
-database_QKan = os.path.join(pfad,'muster.sqlite')
+# Aufruf ohne QGIS: siehe k_qkhe_cli.py
 
 if __name__ == '__main__':
-    exportKanaldaten(database_HE, database_QKan)
-elif __name__ == '__console__':
-    # QMessageBox.information(None, "Info", "Das Programm wurde aus der QGIS-Konsole aufgerufen")
-    exportKanaldaten(database_HE, database_QKan)
-elif __name__ == '__builtin__':
-    # QMessageBox.information(None, "Info", "Das Programm wurde aus der QGIS-Toolbox aufgerufen")
-    exportKanaldaten(database_HE, database_QKan)
-# else:
-    # QMessageBox.information(None, "Info", "Die Variable __name__ enthält: {0:s}".format(__name__))
+    import sys
+    from k_qkhe_cli import main
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Export mehrerer QKan-Projekte nach HYSTEM-EXTRAN
+  ================================================
+
+  Fuehrt die in einer Auftragsliste (Manifest) beschriebenen Exporte parallel in einem Pool von
+  Prozessen aus. Jeder Auftrag schreibt in eine eigene HE-Datenbank, die Auftraege sind damit
+  voneinander unabhaengig. Laufzeiten und Fehler werden in einem Bericht zusammengefasst.
+
+  Aufbau des Manifests (JSON):
+
+    {
+      "prozesse": 4,
+      "auftraege": [
+        {"name": "Nord", "qkan": "nord.sqlite", "ziel": "nord.idbf",
+         "vorlage": "itwh.idbf", "teilgebiete": ["Nord"], "optionen": {"init_haltungen": true}},
+        {"name": "Sued", "config": "sued.json"}
+      ]
+    }
+
+  Relative Pfade beziehen sich auf das Verzeichnis des Manifests. Nicht angegebene Werte werden
+  wie in k_qkhe_cli.py aus der Konfigurationsdatei ("config") bzw. den Standardoptionen
+  (exportoptionen.py) uebernommen.
+
+  | Dateiname            : k_qkhe_batch.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import argparse
+import codecs
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+logger = logging.getLogger('QKan')
+
+
+def _pfad(basis, pfad):
+    if pfad and not os.path.isabs(pfad):
+        return os.path.normpath(os.path.join(basis, pfad))
+    return pfad
+
+
+def auftraege_lesen(manifest):
+    """Liest das Manifest und liefert die Anzahl der Prozesse und die Liste der Auftraege.
+
+    :manifest:      Pfad zur Manifestdatei
+    :type manifest: String
+
+    :returns: Tuple (prozesse, auftraege). prozesse ist None, wenn im Manifest nicht angegeben.
+    """
+    with codecs.open(manifest, 'r', 'utf-8') as datei:
+        daten = json.loads(datei.read())
+
+    basis = os.path.dirname(os.path.abspath(manifest))
+    auftraege = []
+    for nr, auftrag in enumerate(daten.get('auftraege', [])):
+        auftrag = dict(auftrag)
+        auftrag.setdefault('name', u'Auftrag {}'.format(nr + 1))
+        for el in ('config', 'qkan', 'vorlage', 'ziel', 'protokoll'):
+            auftrag[el] = _pfad(basis, auftrag.get(el))
+        auftraege.append(auftrag)
+
+    # Zwei Auftraege duerfen nicht in dieselbe HE-Datenbank schreiben
+    ziele = {}
+    for auftrag in auftraege:
+        ziel = auftrag['ziel'] and os.path.normcase(auftrag['ziel'])
+        if ziel and ziel in ziele:
+            raise ValueError(u'Auftraege "{}" und "{}" schreiben beide in {}'.format(
+                ziele[ziel], auftrag['name'], auftrag['ziel']))
+        ziele[ziel] = auftrag['name']
+
+    return daten.get('prozesse'), auftraege
+
+
+def auftrag_ausfuehren(auftrag):
+    """Fuehrt einen Export aus. Wird in einem Prozess des Pools aufgerufen.
+
+    :returns: Dictionary mit Name, Ziel, Ergebnis, Laufzeit und Fehlermeldungen des Auftrags
+    """
+    # Erst im Prozess importieren, damit die Datenbanktreiber je Prozess initialisiert werden
+    import k_qkhe
+    from k_qkhe_cli import Konsolenausgabe, parameter
+
+    bericht = {'name': auftrag['name'], 'ziel': auftrag.get('ziel'), 'erfolg': False,
+               'dauer': 0., 'fehler': []}
+    start = time.time()
+    protokoll = None
+    try:
+        param = parameter(auftrag.get('config'), auftrag.get('qkan'), auftrag.get('vorlage'),
+                          auftrag.get('ziel'), auftrag.get('teilgebiete'), auftrag.get('optionen'),
+                          auftrag.get('fangradius', 0.1))
+        bericht['ziel'] = param['database_HE']
+        protokoll = codecs.open(auftrag.get('protokoll') or os.devnull, 'w', 'utf-8')
+        ausgabe = Konsolenausgabe(True, protokoll)
+        k_qkhe.empfaenger_setzen(ausgabe)
+        try:
+            ergebnis = k_qkhe.exportKanaldaten(None, param['database_HE'], param['dbtemplate_HE'],
+                                               param['database_QKan'], param['liste_teilgebiete'],
+                                               param['fangradius'], 'spatialite', param['check_export'])
+        finally:
+            k_qkhe.empfaenger_setzen(None)
+        bericht['erfolg'] = ergebnis is True
+        bericht['fehler'] = ausgabe.fehler
+        bericht['statistik'] = ausgabe.bericht
+    except BaseException as err:
+        bericht['fehler'].append(u'{}'.format(err))
+    finally:
+        if protokoll is not None:
+            protokoll.close()
+    bericht['dauer'] = round(time.time() - start, 2)
+    return bericht
+
+
+def auftraege_ausfuehren(auftraege, prozesse=None):
+    """Fuehrt die Auftraege in einem Pool von Prozessen aus.
+
+    :auftraege:     Liste der Auftraege (siehe auftraege_lesen)
+    :type auftraege: List
+
+    :prozesse:      Anzahl der Prozesse. Standard: Anzahl der Prozessoren
+    :type prozesse: Integer
+
+    :returns: Zusammenfassung als Dictionary mit den Berichten der einzelnen Auftraege in der
+              Reihenfolge des Manifests
+    """
+    prozesse = max(1, min(prozesse or multiprocessing.cpu_count(), len(auftraege) or 1))
+    start = time.time()
+
+    # Jeder Auftrag in einem neuen Prozess (maxtasksperchild=1), damit die Firebird-Bibliothek
+    # nicht ueber Auftraege hinweg wiederverwendet wird.
+    pool = multiprocessing.Pool(prozesse, maxtasksperchild=1)
+    try:
+        berichte = pool.map(auftrag_ausfuehren, auftraege, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    dauer = time.time() - start
+    return {
+        'prozesse': prozesse,
+        'dauer': round(dauer, 2),
+        'summe_auftragsdauer': round(sum(b['dauer'] for b in berichte), 2),
+        'erfolgreich': sum(1 for b in berichte if b['erfolg']),
+        'fehlgeschlagen': sum(1 for b in berichte if not b['erfolg']),
+        'auftraege': berichte,
+    }
+
+
+def bericht_text(zusammenfassung):
+    """Zusammenfassung als Tabelle fuer die Konsole."""
+    zeilen = [u'{:<30s} {:>10s}  {}'.format(u'Auftrag', u'Dauer [s]', u'Ergebnis')]
+    for bericht in zusammenfassung['auftraege']:
+        zeilen.append(u'{:<30s} {:>10.1f}  {}'.format(
+            bericht['name'][:30], bericht['dauer'],
+            u'ok' if bericht['erfolg'] else u'Fehler: ' + u'; '.join(bericht['fehler'])[:200]))
+    zeilen.append(u'{} von {} Auftraegen erfolgreich, Gesamtdauer {:.1f} s mit {} Prozessen '
+                  u'(Summe der Auftraege {:.1f} s)'.format(
+                      zusammenfassung['erfolgreich'], len(zusammenfassung['auftraege']),
+                      zusammenfassung['dauer'], zusammenfassung['prozesse'],
+                      zusammenfassung['summe_auftragsdauer']))
+    return u'\n'.join(zeilen)
+
+
+def main(argv=None):
+    """Kommandozeilenaufruf. Liefert 0, wenn alle Auftraege erfolgreich waren, sonst 1."""
+    from k_qkhe_cli import textausgabe
+
+    parser = argparse.ArgumentParser(description=u'Export mehrerer QKan-Datenbanken nach HYSTEM-EXTRAN')
+    parser.add_argument('manifest', help=u'Auftragsliste (JSON)')
+    parser.add_argument('--prozesse', type=int, help=u'Anzahl paralleler Prozesse (Standard: Manifest '
+                                                     u'bzw. Anzahl der Prozessoren)')
+    parser.add_argument('--bericht', help=u'Zusammenfassung als JSON in diese Datei schreiben')
+    argumente = parser.parse_args(argv)
+
+    prozesse, auftraege = auftraege_lesen(argumente.manifest)
+    zusammenfassung = auftraege_ausfuehren(auftraege, argumente.prozesse or prozesse)
+
+    if argumente.bericht:
+        with codecs.open(argumente.bericht, 'w', 'utf-8') as datei:
+            datei.write(json.dumps(zusammenfassung, indent=2))
+    textausgabe().write(bericht_text(zusammenfassung) + u'\n')
+
+    return 0 if zusammenfassung['fehlgeschlagen'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Lasttest des Exports nach HYSTEM-EXTRAN
+  =======================================
+
+  Fuehrt exportKanaldaten fuer synthetische QKan-Netze (qkan_testnetz.py) zunehmender Groesse aus
+  und erfasst je Lauf die Gesamtlaufzeit, die Laufzeit und die Datensaetze je Sekunde jedes
+  Exportabschnitts (aus der Exportstatistik) sowie den hoechsten Speicherbedarf (peak RSS) des
+  Prozesses. Aus den Laufzeiten wird je Abschnitt der Exponent b der Skalierung t = a * n^b
+  bestimmt: b ~ 1 bedeutet lineares, b ~ 2 quadratisches Verhalten.
+
+  Jeder Export laeuft in einem neuen Prozess, damit der Speicherbedarf der Laeufe getrennt
+  gemessen wird. Die erzeugten QKan-Datenbanken werden im Arbeitsverzeichnis abgelegt und bei
+  weiteren Laeufen mit gleicher Groesse und gleichem Startwert wiederverwendet.
+
+  Beispiel:
+
+    python k_qkhe_benchmark.py --arbeitsverzeichnis /tmp/lasttest --objekte 10000,30000,100000 \
+        --vorlage templates/itwh.idbf --bericht lasttest.json --option verschneidungscache=true
+
+  | Dateiname            : k_qkhe_benchmark.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import argparse
+import codecs
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None                         # Windows
+
+logger = logging.getLogger('QKan')
+
+# Abschnitte mit kuerzerer Laufzeit [s] gehen nicht in die Bestimmung des Exponenten ein
+MINDESTDAUER = 0.05
+
+# Tabellen, deren Datensaetze als Objekte des Netzes gezaehlt werden
+OBJEKTTABELLEN = ('schaechte', 'haltungen', 'tezg', 'flaechen', 'linkfl')
+
+
+def speicherbedarf():
+    """Hoechster Speicherbedarf (peak RSS) des laufenden Prozesses in MB oder None."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux liefert kB, macOS Bytes
+    if sys.platform == 'darwin':
+        return round(maxrss / 1048576., 1)
+    return round(maxrss / 1024., 1)
+
+
+def skalierung(punkte, mindestdauer=MINDESTDAUER):
+    """Exponent b der Potenzfunktion t = a * n^b, ausgeglichen nach der Methode der kleinsten
+    Quadrate in doppelt logarithmischer Darstellung.
+
+    :punkte:        Liste von Tuples (n, t) mit Anzahl der Objekte und Laufzeit
+    :type punkte:   list
+
+    :returns: Exponent oder None, wenn weniger als zwei verwertbare Punkte vorhanden sind
+    """
+    werte = [(math.log(n), math.log(t)) for n, t in punkte if n > 0 and t is not None and t >= mindestdauer]
+    if len(werte) < 2:
+        return None
+    mx = sum(x for x, _ in werte) / len(werte)
+    my = sum(y for _, y in werte) / len(werte)
+    sxx = sum((x - mx) ** 2 for x, _ in werte)
+    if sxx == 0.:
+        return None
+    return round(sum((x - mx) * (y - my) for x, y in werte) / sxx, 2)
+
+
+def modell_bereitstellen(verzeichnis, objekte, seed=1):
+    """Erzeugt die QKan-Datenbank eines Testnetzes mit etwa objekte Objekten, falls sie noch nicht
+    vorhanden ist.
+
+    :returns: Tuple (Dateiname, Anzahl der Objekte)
+    """
+    from qkan_testnetz import Testnetz, erzeugen
+
+    dateiname = os.path.join(verzeichnis, u'testnetz_{}_{}.sqlite'.format(objekte, seed))
+    anzahldatei = os.path.splitext(dateiname)[0] + u'.json'
+    if os.path.exists(dateiname) and os.path.exists(anzahldatei):
+        with codecs.open(anzahldatei, 'r', 'utf-8') as datei:
+            anzahl = json.loads(datei.read())
+    else:
+        anzahl = erzeugen(Testnetz.fuer_objekte(objekte, seed=seed), dateiname, ueberschreiben=True)
+        with codecs.open(anzahldatei, 'w', 'utf-8') as datei:
+            datei.write(json.dumps(anzahl))
+    return dateiname, sum(anzahl[tabelle] for tabelle in OBJEKTTABELLEN)
+
+
+def lauf_ausfuehren(auftrag):
+    """Fuehrt einen Export aus. Wird in einem eigenen Prozess aufgerufen.
+
+    :returns: Bericht von k_qkhe_batch.auftrag_ausfuehren, ergaenzt um den Speicherbedarf
+    """
+    from k_qkhe_batch import auftrag_ausfuehren
+
+    if os.path.exists(auftrag['ziel']):
+        os.remove(auftrag['ziel'])
+    bericht = auftrag_ausfuehren(auftrag)
+    bericht['speicher_mb'] = speicherbedarf()
+    return bericht
+
+
+def _lauf_im_prozess(auftrag):
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    try:
+        return pool.apply(lauf_ausfuehren, (auftrag,))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def messen(verzeichnis, groessen, vorlage, optionen=None, wiederholungen=1, seed=1):
+    """Fuehrt die Exporte fuer alle Groessen aus.
+
+    :verzeichnis:   Arbeitsverzeichnis fuer die QKan- und HE-Datenbanken
+    :type verzeichnis: String
+
+    :groessen:      Ungefaehre Anzahl der Objekte der Testnetze
+    :type groessen: list
+
+    :vorlage:       Vorlage fuer die HE-Datenbanken
+    :type vorlage:  String
+
+    :optionen:      Exportoptionen (wie k_qkhe_cli --option)
+    :type optionen: dict
+
+    :wiederholungen: Anzahl der Exporte je Groesse. Ausgewertet wird der schnellste Lauf.
+    :type wiederholungen: Integer
+
+    :returns: Liste der Laeufe mit Groesse, Objekten, Laufzeit, Speicherbedarf und Abschnitten
+    """
+    if not os.path.isdir(verzeichnis):
+        os.makedirs(verzeichnis)
+
+    laeufe = []
+    for groesse in groessen:
+        qkan, objekte = modell_bereitstellen(verzeichnis, groesse, seed)
+        auftrag = {'name': u'Testnetz {}'.format(groesse), 'qkan': qkan, 'vorlage': vorlage,
+                   'ziel': os.path.join(verzeichnis, u'testnetz_{}_{}.idbf'.format(groesse, seed)),
+                   'optionen': optionen or {}}
+        bester = None
+        for wiederholung in range(wiederholungen):
+            bericht = _lauf_im_prozess(auftrag)
+            logger.info(u'k_qkhe_benchmark: {} Objekte, Lauf {}: {:.1f} s, {}'.format(
+                objekte, wiederholung + 1, bericht['dauer'], u'ok' if bericht['erfolg'] else u'Fehler'))
+            if not bericht['erfolg']:
+                bester = bericht
+                break
+            if bester is None or bericht['dauer'] < bester['dauer']:
+                bester = bericht
+
+        abschnitte = []
+        for abschnitt in (bester.get('statistik') or {}).get('abschnitte', []):
+            datensaetze = abschnitt['gelesen'] + abschnitt['geschrieben']
+            abschnitte.append({
+                'abschnitt': abschnitt['abschnitt'],
+                'dauer': abschnitt['dauer'],
+                'datensaetze': datensaetze,
+                'datensaetze_je_s': round(datensaetze / abschnitt['dauer'], 1) if abschnitt['dauer'] > 0 else None,
+            })
+        laeufe.append({
+            'groesse': groesse,
+            'objekte': objekte,
+            'erfolg': bester['erfolg'],
+            'fehler': bester['fehler'],
+            'dauer': bester['dauer'],
+            'objekte_je_s': round(objekte / bester['dauer'], 1) if bester['dauer'] > 0 else None,
+            'speicher_mb': bester.get('speicher_mb'),
+            'abschnitte': abschnitte,
+        })
+    return laeufe
+
+
+def auswerten(laeufe):
+    """Bestimmt die Exponenten der Skalierung fuer den gesamten Export und je Abschnitt. Nur
+    erfolgreiche Laeufe werden beruecksichtigt.
+
+    :returns: Dictionary mit den Laeufen und den Exponenten
+    """
+    erfolgreich = [lauf for lauf in laeufe if lauf['erfolg']]
+    namen = []
+    for lauf in erfolgreich:
+        for abschnitt in lauf['abschnitte']:
+            if abschnitt['abschnitt'] not in namen:
+                namen.append(abschnitt['abschnitt'])
+
+    exponenten = {}
+    for name in namen:
+        punkte = [(lauf['objekte'], abschnitt['dauer']) for lauf in erfolgreich
+                  for abschnitt in lauf['abschnitte'] if abschnitt['abschnitt'] == name]
+        exponenten[name] = skalierung(punkte)
+
+    return {
+        'zeit': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime()),
+        'laeufe': laeufe,
+        'abschnitte': namen,
+        'exponent_gesamt': skalierung([(lauf['objekte'], lauf['dauer']) for lauf in erfolgreich]),
+        'exponent_speicher': skalierung([(lauf['objekte'], lauf['speicher_mb']) for lauf in erfolgreich], 0.),
+        'exponenten': exponenten,
+    }
+
+
+def bericht_text(auswertung):
+    """Auswertung als Tabelle fuer die Konsole: Laufzeiten je Abschnitt und Groesse [s] und
+    Exponent der Skalierung."""
+    laeufe = auswertung['laeufe']
+
+    def _zahl(wert, format=u'{:>10.2f}'):
+        return u'{:>10s}'.format(u'-') if wert is None else format.format(wert)
+
+    def _exponent(wert):
+        return u'{:>8s}'.format(u'-') if wert is None else u'{:>8.2f}'.format(wert)
+
+    zeilen = [u'{:<24s}'.format(u'Abschnitt') +
+              u''.join(u'{:>10d}'.format(lauf['objekte']) for lauf in laeufe) + u'{:>8s}'.format(u'b')]
+    for name in auswertung['abschnitte']:
+        dauer = []
+        for lauf in laeufe:
+            werte = [a['dauer'] for a in lauf['abschnitte'] if a['abschnitt'] == name]
+            dauer.append(werte[0] if werte else None)
+        zeilen.append(u'{:<24s}'.format(name[:24]) + u''.join(_zahl(d) for d in dauer) +
+                      _exponent(auswertung['exponenten'].get(name)))
+    zeilen.append(u'{:<24s}'.format(u'Gesamt [s]') + u''.join(_zahl(lauf['dauer']) for lauf in laeufe) +
+                  _exponent(auswertung['exponent_gesamt']))
+    zeilen.append(u'{:<24s}'.format(u'Objekte je s') +
+                  u''.join(_zahl(lauf['objekte_je_s'], u'{:>10.0f}') for lauf in laeufe))
+    zeilen.append(u'{:<24s}'.format(u'Speicher [MB]') +
+                  u''.join(_zahl(lauf['speicher_mb'], u'{:>10.1f}') for lauf in laeufe) +
+                  _exponent(auswertung['exponent_speicher']))
+    for lauf in laeufe:
+        if not lauf['erfolg']:
+            zeilen.append(u'Fehler bei {} Objekten: {}'.format(lauf['objekte'], u'; '.join(lauf['fehler'])[:200]))
+    return u'\n'.join(zeilen)
+
+
+def main(argv=None):
+    """Kommandozeilenaufruf. Liefert 0, wenn alle Laeufe erfolgreich waren, sonst 1."""
+    from k_qkhe_cli import _wert, textausgabe
+
+    parser = argparse.ArgumentParser(description=u'Lasttest des Exports nach HYSTEM-EXTRAN')
+    parser.add_argument('--arbeitsverzeichnis', required=True,
+                        help=u'Verzeichnis fuer die erzeugten QKan- und HE-Datenbanken')
+    parser.add_argument('--objekte', default='10000,30000,100000',
+                        help=u'Kommagetrennte Groessen der Testnetze (Standard: 10000,30000,100000)')
+    parser.add_argument('--vorlage', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                          'templates', 'itwh.idbf'),
+                        help=u'Vorlage fuer die HE-Datenbanken')
+    parser.add_argument('--option', action='append', default=[], metavar='NAME=WERT',
+                        help=u'Exportoption, z.B. verschneidungscache=true (mehrfach moeglich)')
+    parser.add_argument('--wiederholungen', type=int, default=1,
+                        help=u'Exporte je Groesse, ausgewertet wird der schnellste (Standard: 1)')
+    parser.add_argument('--seed', type=int, default=1, help=u'Startwert der Testnetze (Standard: 1)')
+    parser.add_argument('--bericht', help=u'Auswertung als JSON in diese Datei schreiben')
+    argumente = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    optionen = {}
+    for option in argumente.option:
+        name, _, wert = option.partition('=')
+        optionen[name.strip()] = _wert(wert.strip())
+    groessen = [int(g) for g in argumente.objekte.split(',') if g.strip()]
+
+    laeufe = messen(argumente.arbeitsverzeichnis, groessen, argumente.vorlage, optionen,
+                    max(1, argumente.wiederholungen), argumente.seed)
+    auswertung = auswerten(laeufe)
+
+    if argumente.bericht:
+        with codecs.open(argumente.bericht, 'w', 'utf-8') as datei:
+            datei.write(json.dumps(auswertung, indent=2))
+    textausgabe().write(bericht_text(auswertung) + u'\n')
+
+    return 0 if all(lauf['erfolg'] for lauf in laeufe) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
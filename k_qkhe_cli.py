@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Export nach HYSTEM-EXTRAN ueber die Kommandozeile
+  =================================================
+
+  Fuehrt exportKanaldaten ohne QGIS-Oberflaeche aus, z.B. fuer naechtliche Exporte auf einem
+  Build-Server. Die Einstellungen koennen aus einer qkan.json-Datei uebernommen und durch
+  Argumente ueberschrieben werden. Fortschritt und Meldungen werden auf stdout ausgegeben,
+  wahlweise als eine JSON-Zeile je Meldung.
+
+  Beispiel:
+
+    python k_qkhe_cli.py --qkan netz.sqlite --vorlage itwh.idbf --ziel netz.idbf \
+        --teilgebiete Nord,Sued --option init_haltungen=true --json
+
+  | Dateiname            : k_qkhe_cli.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import argparse
+import codecs
+import io
+import json
+import logging
+import os
+import signal
+import sys
+import time
+
+import exportoptionen
+from exportoptionen import STANDARD_OPTIONEN
+
+logger = logging.getLogger('QKan')
+
+
+def textausgabe(strom=None):
+    """Liefert einen Ausgabestrom, in den Texte (unicode) geschrieben werden koennen.
+
+    Unter Python 2 ist sys.stdout ein Bytestrom ohne Kodierung, sobald die Ausgabe umgeleitet wird
+    (z.B. auf dem Build-Server). Texte mit Umlauten loesen dann einen UnicodeEncodeError aus. Der
+    Strom wird daher mit der Kodierung des Terminals bzw. UTF-8 kodiert, nicht darstellbare Zeichen
+    werden ersetzt.
+
+    :strom:         Ausgabestrom, Standard: sys.stdout
+    """
+    strom = sys.stdout if strom is None else strom
+    if isinstance(strom, io.TextIOBase) and not hasattr(strom, 'buffer'):
+        return strom                    # Textstrom im Speicher (io.StringIO)
+    kodierung = getattr(strom, 'encoding', None) or 'utf-8'
+    return codecs.getwriter(kodierung)(getattr(strom, 'buffer', strom), 'replace')
+
+
+class Konsolenausgabe(object):
+    """Empfaenger der Meldungen von exportKanaldaten (siehe k_qkhe.empfaenger_setzen).
+
+    :json_ausgabe:      Ausgabe als eine JSON-Zeile je Meldung
+    :type json_ausgabe: Boolean
+    """
+
+    def __init__(self, json_ausgabe=False, ausgabe=None):
+        self.json_ausgabe = json_ausgabe
+        self.ausgabe = textausgabe(ausgabe)
+        self._abgebrochen = False
+        self.fehler = []
+        self.bericht = None
+
+    def _schreiben(self, art, **daten):
+        if self.json_ausgabe:
+            daten['art'] = art
+            daten['zeit'] = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime())
+            self.ausgabe.write(json.dumps(daten) + '\n')
+        elif art == 'fortschritt':
+            self.ausgabe.write(u'[{:3.0f}%] {}\n'.format(daten['prozent'] * 100., daten['text']))
+        elif art == 'statistik':
+            self.ausgabe.write(u'{:<20s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s} {:>9s}\n'.format(
+                u'Abschnitt', u'Dauer', u'Lesen', u'Schreiben', u'gelesen', u'geschr.', u'uebersp.'))
+            for abschnitt in daten['abschnitte']:
+                self.ausgabe.write(u'{abschnitt:<20s} {dauer:9.2f} {lesezeit:9.2f} {schreibzeit:9.2f} '
+                                   u'{gelesen:9d} {geschrieben:9d} {uebersprungen:9d}\n'.format(**abschnitt))
+        else:
+            self.ausgabe.write(u'{}: {} {}\n'.format(art, daten['titel'], daten['text']))
+        self.ausgabe.flush()
+
+    def abbrechen(self, *args):
+        """Fordert den Abbruch an (z.B. bei Strg+C). Der Export wird vor dem naechsten Block
+        zurueckgerollt."""
+        self._abgebrochen = True
+
+    def abgebrochen(self):
+        return self._abgebrochen
+
+    def fortschritt(self, text, prozent):
+        self._schreiben('fortschritt', text=text, prozent=prozent)
+
+    def fehlermeldung(self, title, text, dauer):
+        self.fehler.append(u'{} {}'.format(title, text))
+        self._schreiben('fehler', titel=title, text=u'{}'.format(text))
+
+    def statistik(self, bericht):
+        self.bericht = bericht
+        self._schreiben('statistik', **bericht)
+
+    def meldung(self, title, text, level, dauer):
+        import k_qkhe
+        art = {k_qkhe.QgsMessageBar.WARNING: 'warnung',
+               k_qkhe.QgsMessageBar.CRITICAL: 'fehler'}.get(level, 'info')
+        self._schreiben(art, titel=title, text=u'{}'.format(text))
+
+
+def _wert(text):
+    """Wandelt den Wert einer Option (--option name=wert) in Boolean bzw. Zahl um."""
+    if text.lower() in ('true', 'ja', '1'):
+        return True
+    if text.lower() in ('false', 'nein', '0'):
+        return False
+    try:
+        return int(text)
+    except ValueError:
+        return text
+
+
+def konfiguration(argumente):
+    """Stellt die Parameter fuer exportKanaldaten aus qkan.json und den Argumenten zusammen.
+
+    :returns: Dictionary mit database_QKan, dbtemplate_HE, database_HE, liste_teilgebiete,
+              fangradius und check_export
+    """
+    optionen = {}
+    for option in argumente.option:
+        name, _, wert = option.partition('=')
+        optionen[name.strip()] = _wert(wert.strip())
+
+    if argumente.teilgebiete is not None:
+        liste_teilgebiete = [tg.strip() for tg in argumente.teilgebiete.split(',') if tg.strip()]
+    else:
+        liste_teilgebiete = None
+
+    return parameter(argumente.config, argumente.qkan, argumente.vorlage, argumente.ziel,
+                     liste_teilgebiete, optionen, argumente.fangradius)
+
+
+def parameter(configfil=None, database_QKan=None, dbtemplate_HE=None, database_HE=None,
+              liste_teilgebiete=None, optionen=None, fangradius=0.1):
+    """Stellt die Parameter fuer exportKanaldaten zusammen. Nicht angegebene Werte werden aus
+    der Konfigurationsdatei (qkan.json) bzw. den Standardoptionen uebernommen.
+
+    :returns: Dictionary mit database_QKan, dbtemplate_HE, database_HE, liste_teilgebiete,
+              fangradius und check_export
+    """
+    config = {}
+    if configfil:
+        with codecs.open(configfil, 'r', 'utf-8') as fileconfig:
+            config = json.loads(fileconfig.read().replace('\\', '/'))
+
+    check_export = dict(STANDARD_OPTIONEN)
+    for el in config:
+        if el in STANDARD_OPTIONEN:
+            check_export[el] = config[el]
+    for el in optionen or {}:
+        if el not in STANDARD_OPTIONEN:
+            logger.warning(u'Unbekannte Exportoption {} (siehe exportoptionen.py)'.format(el))
+    check_export.update(optionen or {})
+
+    if liste_teilgebiete is None:
+        liste_teilgebiete = config.get('liste_teilgebiete', [])
+
+    return {
+        'database_QKan': database_QKan or config.get('database_Qkan') or config.get('database_QKan'),
+        'dbtemplate_HE': dbtemplate_HE or config.get('dbtemplate_HE') or
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'itwh.idbf'),
+        'database_HE': database_HE or config.get('database_HE'),
+        'liste_teilgebiete': liste_teilgebiete,
+        'fangradius': fangradius,
+        'check_export': check_export,
+    }
+
+
+def main(argv=None):
+    """Kommandozeilenaufruf. Liefert 0 bei Erfolg, 1 bei Fehler, 2 bei fehlenden Angaben und 130
+    nach einem Abbruch mit Strg+C."""
+    parser = argparse.ArgumentParser(description=u'Export einer QKan-Datenbank nach HYSTEM-EXTRAN',
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=u'Weitere Exportoptionen (--option NAME=WERT):\n{}'.format(
+                                         exportoptionen.beschreibung()))
+    parser.add_argument('--config', help=u'qkan.json mit Datenbanken, Teilgebieten und Exportoptionen')
+    parser.add_argument('--qkan', help=u'QKan-Datenbank (SpatiaLite)')
+    parser.add_argument('--vorlage', help=u'Vorlage fuer die HE-Datenbank (*.idbf)')
+    parser.add_argument('--ziel', help=u'Zu erstellende HE-Datenbank (*.idbf)')
+    parser.add_argument('--teilgebiete', help=u'Kommagetrennte Liste der zu exportierenden Teilgebiete')
+    parser.add_argument('--fangradius', type=float, default=0.1, help=u'Fangradius (Standard: 0.1)')
+    parser.add_argument('--option', action='append', default=[], metavar='NAME=WERT',
+                        help=u'Exportoption, z.B. init_haltungen=true (mehrfach moeglich)')
+    parser.add_argument('--json', action='store_true', help=u'Meldungen als JSON-Zeilen ausgeben')
+    parser.add_argument('--log', help=u'Protokolldatei fuer das Logging')
+    argumente = parser.parse_args(argv)
+
+    if argumente.log:
+        handler = logging.FileHandler(argumente.log)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+
+    param = konfiguration(argumente)
+    fehlend = [name for name in ('database_QKan', 'dbtemplate_HE', 'database_HE') if not param[name]]
+    if fehlend:
+        parser.print_usage(sys.stderr)
+        textausgabe(sys.stderr).write(u'Fehlende Angaben: {}\n'.format(', '.join(fehlend)))
+        return 2
+
+    import k_qkhe
+    ausgabe = Konsolenausgabe(argumente.json)
+    signal.signal(signal.SIGINT, ausgabe.abbrechen)
+    k_qkhe.empfaenger_setzen(ausgabe)
+    try:
+        ergebnis = k_qkhe.exportKanaldaten(None, param['database_HE'], param['dbtemplate_HE'],
+                                           param['database_QKan'], param['liste_teilgebiete'],
+                                           param['fangradius'], 'spatialite', param['check_export'])
+    finally:
+        k_qkhe.empfaenger_setzen(None)
+
+    if ergebnis is True:
+        return 0
+    return 130 if ausgabe.abgebrochen() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
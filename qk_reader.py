@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Leseschicht fuer QKan-Datenbanken
+  =================================
+
+  Liest die Ergebnisse von Abfragen auf die QKan-(SpatiaLite-)Datenbank blockweise (fetchmany),
+  so dass auch bei grossen Netzen nie das vollstaendige Abfrageergebnis im Speicher liegt.
+
+  | Dateiname            : qk_reader.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import logging
+
+from he_writer import ExportAbbruch
+
+logger = logging.getLogger('QKan')
+
+
+def datensaetze(dbQK, blockgroesse=1000, statistik=None, abbruch=None):
+    """Liefert die Datensaetze der zuletzt mit dbQK.sql() ausgefuehrten Abfrage als Generator.
+
+    :dbQK:          Datenbankobjekt, das die Verknuepfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:     DBConnection (geerbt von dbapi...)
+
+    :blockgroesse:  Anzahl der Datensaetze, die jeweils mit fetchmany gelesen werden
+    :type blockgroesse: Integer
+
+    :statistik:     Laufzeitstatistik, an die die Anzahl der gelesenen Datensaetze gemeldet wird
+    :type statistik: Exportstatistik
+
+    :abbruch:       Funktion ohne Argumente, die True liefert, wenn der Export abgebrochen werden soll.
+                    Sie wird vor jedem Block abgefragt, bei True wird ExportAbbruch ausgeloest.
+    :type abbruch:  Function
+
+    Waehrend der Generator durchlaufen wird, darf auf dbQK keine weitere Abfrage ausgefuehrt werden.
+    """
+
+    cursor = getattr(dbQK, 'cursl', None)
+    if cursor is None or not hasattr(cursor, 'fetchmany'):
+        # Ohne Zugriff auf den Cursor bleibt nur das vollstaendige Einlesen
+        if abbruch is not None and abbruch():
+            raise ExportAbbruch(u'Export durch Benutzer abgebrochen')
+        for attr in dbQK.fetchall():
+            if statistik is not None:
+                statistik.gelesen()
+            yield attr
+        return
+
+    while True:
+        if abbruch is not None and abbruch():
+            raise ExportAbbruch(u'Export durch Benutzer abgebrochen')
+        block = cursor.fetchmany(blockgroesse)
+        if not block:
+            break
+        if statistik is not None:
+            statistik.gelesen(len(block))
+        for attr in block:
+            yield attr
+
+
+class Raumindizes(object):
+    """Nutzung der raeumlichen Indizes (R*Tree) der QKan-Datenbank in Abfragen.
+
+    Raeumliche Verknuepfungen werden ueber die virtuelle Tabelle SpatialIndex vorgefiltert
+    (Vergleich der umgebenden Rechtecke), die genaue Pruefung erfolgt anschliessend. Fehlt ein Index,
+    wird er fuer die Dauer des Exports angelegt und mit entfernen() wieder geloescht.
+
+    :dbQK:          Datenbankobjekt, das die Verknuepfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:     DBConnection (geerbt von dbapi...)
+    """
+
+    def __init__(self, dbQK):
+        self.dbQK = dbQK
+        self.vorhanden = set()
+        self.angelegt = []
+
+    def sicherstellen(self, tabelle, spalte):
+        """Prueft, ob fuer die Geometriespalte ein raeumlicher Index vorhanden ist, und legt ihn
+        gegebenenfalls voruebergehend an.
+
+        :returns: True, wenn der Index in Abfragen verwendet werden kann.
+        """
+        if (tabelle, spalte) in self.vorhanden:
+            return True
+        try:
+            self.dbQK.sql(u"""SELECT spatial_index_enabled FROM geometry_columns
+                WHERE lower(f_table_name) = '{}' AND lower(f_geometry_column) = '{}'""".format(
+                tabelle.lower(), spalte.lower()))
+            daten = self.dbQK.fetchone()
+            if daten is None:
+                return False
+            if daten[0] != 1:
+                self.dbQK.sql(u"SELECT CreateSpatialIndex('{}', '{}')".format(tabelle, spalte))
+                self.dbQK.commit()
+                self.angelegt.append((tabelle, spalte))
+                logger.debug(u'qk_reader: Raeumlicher Index fuer {}.{} voruebergehend angelegt'.format(
+                    tabelle, spalte))
+            # Die virtuelle Tabelle SpatialIndex muss vorhanden sein
+            self.dbQK.sql(u"SELECT count(*) FROM sqlite_master WHERE lower(name) = 'spatialindex'")
+            if int(self.dbQK.fetchone()[0]) == 0:
+                return False
+        except BaseException as err:
+            logger.debug(u'qk_reader: Raeumlicher Index fuer {}.{} nicht verwendbar: {}'.format(
+                tabelle, spalte, err))
+            return False
+        self.vorhanden.add((tabelle, spalte))
+        return True
+
+    def filter(self, tabelle, spalte, rahmen):
+        """Bedingung fuer eine Verknuepfung, die die Datensaetze von tabelle ueber den Index auf
+        diejenigen einschraenkt, deren umgebendes Rechteck das von rahmen schneidet. Ist der Index
+        nicht verwendbar, wird eine immer erfuellte Bedingung geliefert."""
+        if not self.sicherstellen(tabelle, spalte):
+            return u'1 = 1'
+        return (u"{tabelle}.ROWID IN (SELECT ROWID FROM SpatialIndex WHERE f_table_name = '{tabelle}' "
+                u"AND f_geometry_column = '{spalte}' AND search_frame = {rahmen})").format(
+            tabelle=tabelle, spalte=spalte, rahmen=rahmen)
+
+    def uebernehmen(self, angelegt):
+        """Uebernimmt die in einer anderen Verbindung voruebergehend angelegten Indizes, damit sie
+        mit entfernen() wieder geloescht werden."""
+        for index in angelegt:
+            if index not in self.angelegt:
+                self.angelegt.append(index)
+
+    def entfernen(self):
+        """Entfernt die voruebergehend angelegten Indizes."""
+        for tabelle, spalte in self.angelegt:
+            try:
+                self.dbQK.sql(u"SELECT DisableSpatialIndex('{}', '{}')".format(tabelle, spalte))
+                self.dbQK.sql(u'DROP TABLE IF EXISTS "idx_{}_{}"'.format(tabelle, spalte))
+                self.dbQK.commit()
+            except BaseException as err:
+                logger.warning(u'qk_reader: Raeumlicher Index fuer {}.{} konnte nicht entfernt werden: {}'.format(
+                    tabelle, spalte, err))
+        self.angelegt = []
+        self.vorhanden = set()
+
+
+class Verschneidungscache(object):
+    """Zwischenspeicher fuer die Verschneidung der aufzuteilenden Flaechen mit den tezg-Flaechen.
+
+    Die Ergebnisse werden in der Tabelle "flaechen_tezg_verschnitt" der QKan-Datenbank gespeichert,
+    zusammen mit Pruefsummen (MD5Checksum) der beiden Geometrien. Bei einem erneuten Export werden
+    nur Paare neu verschnitten, bei denen sich eine der Geometrien geaendert hat oder die neu
+    hinzugekommen sind. Gespeichert werden alle Paare, deren umgebende Rechtecke sich schneiden;
+    Paare ohne gemeinsame Flaeche mit geom = NULL. Der Flaecheninhalt der Verschneidung wird in der
+    Spalte flaeche mitgespeichert.
+
+    Mit einem Geometriepool (siehe geometriepool.py) werden die fehlenden Paare ausserhalb von
+    SpatiaLite in mehreren Prozessen verschnitten.
+
+    :dbQK:          Datenbankobjekt, das die Verknuepfung zur QKan-SpatiaLite-Datenbank verwaltet.
+    :type dbQK:     DBConnection (geerbt von dbapi...)
+
+    :raumindizes:   Raeumliche Indizes fuer die Vorauswahl der Paare
+    :type raumindizes: Raumindizes
+
+    :pool:          Geometriepool fuer die Verschneidung. None: Verschneidung in SpatiaLite
+    :type pool:     Geometriepool
+    """
+
+    tabelle = u'flaechen_tezg_verschnitt'
+
+    def __init__(self, dbQK, raumindizes, pool=None):
+        self.dbQK = dbQK
+        self.raumindizes = raumindizes
+        self.pool = pool
+
+    def verfuegbar(self):
+        """Prueft, ob die SpatiaLite-Version Pruefsummen berechnen kann, und legt die Tabelle an.
+
+        :returns: False, wenn der Zwischenspeicher nicht verwendet werden kann.
+        """
+        try:
+            self.dbQK.sql(u'SELECT MD5Checksum(zeroblob(1))')
+            self.dbQK.fetchone()
+        except BaseException as err:
+            logger.debug(u'qk_reader: Verschneidungscache nicht verfuegbar (MD5Checksum): {}'.format(err))
+            return False
+        self.dbQK.sql(u"""CREATE TABLE IF NOT EXISTS {} (
+            flnam TEXT NOT NULL,
+            tezg_pk INTEGER NOT NULL,
+            hash_flaeche TEXT,
+            hash_tezg TEXT,
+            geom BLOB,
+            flaeche REAL,
+            PRIMARY KEY (flnam, tezg_pk))""".format(self.tabelle))
+
+        # Zwischenspeicher aus frueheren Versionen ohne Flaecheninhalt ergaenzen
+        self.dbQK.sql(u'PRAGMA table_info({})'.format(self.tabelle))
+        if u'flaeche' not in [spalte[1] for spalte in self.dbQK.fetchall()]:
+            self.dbQK.sql(u'ALTER TABLE {} ADD COLUMN flaeche REAL'.format(self.tabelle))
+            self.dbQK.sql(u'UPDATE {} SET flaeche = area(geom) WHERE geom IS NOT NULL'.format(self.tabelle))
+            self.dbQK.commit()
+        return True
+
+    def aktualisieren(self, auswahl=u''):
+        """Entfernt veraltete Eintraege und verschneidet die fehlenden Paare.
+
+        :auswahl:       Zusaetzliche Bedingung fuer die Tabelle flaechen (Teilgebiete), beginnend mit " AND"
+        :type auswahl:  String
+
+        :returns: Anzahl der wiederverwendeten und der neu berechneten Paare
+        :rtype: tuple
+        """
+        # Paare, deren Flaeche oder tezg-Flaeche geaendert oder geloescht wurde
+        self.dbQK.sql(u"""
+            DELETE FROM {cache}
+            WHERE NOT EXISTS (
+              SELECT 1 FROM flaechen INNER JOIN tezg ON tezg.pk = {cache}.tezg_pk
+              WHERE flaechen.flnam = {cache}.flnam AND flaechen.aufteilen = 'ja'
+                AND MD5Checksum(flaechen.geom) = {cache}.hash_flaeche
+                AND MD5Checksum(tezg.geom) = {cache}.hash_tezg)""".format(cache=self.tabelle))
+
+        self.dbQK.sql(u'SELECT count(*) FROM {}'.format(self.tabelle))
+        vorhanden = int(self.dbQK.fetchone()[0])
+
+        if self.pool is not None:
+            self._im_pool(auswahl)
+        else:
+            self.dbQK.sql(u"""
+                INSERT INTO {cache} (flnam, tezg_pk, hash_flaeche, hash_tezg, geom)
+                SELECT flaechen.flnam, tezg.pk, MD5Checksum(flaechen.geom), MD5Checksum(tezg.geom),
+                  CASE WHEN intersects(flaechen.geom,tezg.geom)
+                       THEN CastToMultiPolygon(intersection(flaechen.geom,tezg.geom)) END
+                FROM flaechen
+                INNER JOIN tezg
+                ON {index_tezg} AND MbrIntersects(flaechen.geom,tezg.geom)
+                WHERE flaechen.aufteilen = 'ja'{auswahl}
+                  AND NOT EXISTS (SELECT 1 FROM {cache}
+                                  WHERE {cache}.flnam = flaechen.flnam AND {cache}.tezg_pk = tezg.pk)""".format(
+                cache=self.tabelle, auswahl=auswahl,
+                index_tezg=self.raumindizes.filter('tezg', 'geom', 'flaechen.geom')))
+            self.dbQK.sql(u"""UPDATE {} SET flaeche = area(geom)
+                WHERE flaeche IS NULL AND geom IS NOT NULL""".format(self.tabelle))
+
+        self.dbQK.sql(u'SELECT count(*) FROM {}'.format(self.tabelle))
+        berechnet = int(self.dbQK.fetchone()[0]) - vorhanden
+        self.dbQK.commit()
+        logger.debug(u'qk_reader: Verschneidungscache: {} Paare wiederverwendet, {} neu berechnet'.format(
+            vorhanden, berechnet))
+        return vorhanden, berechnet
+
+    def _im_pool(self, auswahl):
+        """Verschneidet die fehlenden Paare im Geometriepool und speichert die Ergebnisse."""
+        self.dbQK.sql(u'DROP TABLE IF EXISTS temp.verschnitt_offen')
+        self.dbQK.sql(u"""
+            CREATE TEMP TABLE verschnitt_offen AS
+            SELECT flaechen.flnam AS flnam, tezg.pk AS tezg_pk,
+              (MbrMinX(flaechen.geom) + MbrMaxX(flaechen.geom))/2 AS x,
+              (MbrMinY(flaechen.geom) + MbrMaxY(flaechen.geom))/2 AS y
+            FROM flaechen
+            INNER JOIN tezg
+            ON {index_tezg} AND MbrIntersects(flaechen.geom,tezg.geom)
+            WHERE flaechen.aufteilen = 'ja'{auswahl}
+              AND NOT EXISTS (SELECT 1 FROM {cache}
+                              WHERE {cache}.flnam = flaechen.flnam AND {cache}.tezg_pk = tezg.pk)""".format(
+            cache=self.tabelle, auswahl=auswahl,
+            index_tezg=self.raumindizes.filter('tezg', 'geom', 'flaechen.geom')))
+
+        self.dbQK.sql(u'SELECT flnam, tezg_pk, x, y FROM temp.verschnitt_offen')
+        paare = list(datensaetze(self.dbQK))
+
+        flaechen, hash_flaeche = {}, {}
+        self.dbQK.sql(u"""SELECT flnam, AsBinary(geom), MD5Checksum(geom) FROM flaechen
+            WHERE aufteilen = 'ja' AND flnam IN (SELECT flnam FROM temp.verschnitt_offen)""")
+        for flnam, geom, pruefsumme in datensaetze(self.dbQK):
+            flaechen[flnam] = geom
+            hash_flaeche[flnam] = pruefsumme
+
+        tezg, hash_tezg = {}, {}
+        self.dbQK.sql(u"""SELECT pk, AsBinary(geom), MD5Checksum(geom) FROM tezg
+            WHERE pk IN (SELECT tezg_pk FROM temp.verschnitt_offen)""")
+        for pk, geom, pruefsumme in datensaetze(self.dbQK):
+            tezg[pk] = geom
+            hash_tezg[pk] = pruefsumme
+
+        self.dbQK.sql(u"""SELECT srid FROM geometry_columns
+            WHERE lower(f_table_name) = 'flaechen' AND lower(f_geometry_column) = 'geom'""")
+        srid = self.dbQK.fetchone()[0]
+
+        ergebnisse = self.pool.verschneiden(paare, flaechen, tezg)
+
+        self.dbQK.cursl.executemany(
+            u"""INSERT INTO {} (flnam, tezg_pk, hash_flaeche, hash_tezg, geom, flaeche)
+                VALUES (?, ?, ?, ?, CastToMultiPolygon(GeomFromWKB(?, {})), ?)""".format(self.tabelle, srid),
+            [(flnam, tezg_pk, hash_flaeche[flnam], hash_tezg[tezg_pk], geom, flaeche)
+             for flnam, tezg_pk, geom, flaeche in ergebnisse])
+        self.dbQK.sql(u'DROP TABLE IF EXISTS temp.verschnitt_offen')
@@ -0,0 +1,520 @@
+# -*- coding: utf-8 -*-
+
+"""
+  Synthetisches Kanalnetz fuer Lasttests
+  ======================================
+
+  Erzeugt QKan-Datenbanken (SpatiaLite) mit einem kuenstlichen, in Geometrie und Topologie aber
+  plausiblen Kanalnetz, um exportKanaldaten mit realistischen Datenmengen pruefen zu koennen. Die
+  Anzahl der Objekte ist einstellbar; bei gleichem Startwert (seed) entsteht dieselbe Datenbank.
+
+  Aufbau: Je Auslass wird ein Netz erzeugt. Die Schaechte eines Netzes liegen leicht versetzt auf
+  einem Raster von Strassen. Die Haltungen einer Strasse fuehren zum Sammler am Anfang der
+  Strassen, der Sammler zum Auslass. Jede Haltung erhaelt eine Haltungsflaeche (tezg) mit einer
+  Strassenflaeche und Grundstuecksflaechen, die ueber linkfl an die Haltung angeschlossen sind.
+  Ein Teil der Flaechen liegt ueber der Grenze zweier Haltungsflaechen und wird beim Export
+  verschnitten (aufteilen = 'ja'). Die Teilgebiete sind Streifen ueber das gesamte Gebiet.
+
+  Beispiel:
+
+    python qkan_testnetz.py --ziel netz_100k.sqlite --objekte 100000 --seed 1
+
+  | Dateiname            : qkan_testnetz.py
+  | Date                 : Oktober 2017
+  | Copyright            : (C) 2016 by Joerg Hoettges
+  | Email                : hoettges@fh-aachen.de
+  | git sha              : $Format:%H$
+
+  This program is free software; you can redistribute it and/or modify
+  it under the terms of the GNU General Public License as published by
+  the Free Software Foundation; either version 2 of the License, or
+  (at your option) any later version.
+
+"""
+
+import argparse
+import logging
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+
+logger = logging.getLogger('QKan')
+
+# Fester Zeitstempel, damit bei gleichem Startwert identische Datenbanken entstehen
+CREATEDAT = u'01.10.2017 00:00:00'
+
+# Tabellen der QKan-Datenbank, soweit sie vom Export gelesen werden
+TABELLEN = (
+    u"""CREATE TABLE schaechte (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, schnam TEXT, xsch REAL, ysch REAL, sohlhoehe REAL,
+        deckelhoehe REAL, durchm REAL, druckdicht INTEGER, entwart TEXT, strasse TEXT,
+        teilgebiet TEXT, knotentyp TEXT, auslasstyp TEXT, schachttyp TEXT, simstatus TEXT,
+        kommentar TEXT, createdat TEXT)""",
+    u"""CREATE TABLE speicherkennlinien (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, schnam TEXT, wspiegel REAL, oberfl REAL)""",
+    u"""CREATE TABLE haltungen (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, haltnam TEXT, schoben TEXT, schunten TEXT,
+        hoehe REAL, breite REAL, laenge REAL, sohleoben REAL, sohleunten REAL, deckeloben REAL,
+        deckelunten REAL, teilgebiet TEXT, profilnam TEXT, entwart TEXT, rohrtyp TEXT, ks REAL,
+        simstatus TEXT, kommentar TEXT, createdat TEXT)""",
+    u"""CREATE TABLE tezg (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, flnam TEXT, haltnam TEXT, neigkl INTEGER,
+        regenschreiber TEXT, teilgebiet TEXT, abflussparameter TEXT, kommentar TEXT,
+        createdat TEXT)""",
+    u"""CREATE TABLE flaechen (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, flnam TEXT, haltnam TEXT, neigkl INTEGER,
+        he_typ INTEGER, speicherzahl INTEGER, speicherkonst REAL, fliesszeit REAL,
+        fliesszeitkanal REAL, teilgebiet TEXT, regenschreiber TEXT, abflussparameter TEXT,
+        aufteilen TEXT, kommentar TEXT, createdat TEXT)""",
+    u"""CREATE TABLE linkfl (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, flnam TEXT, haltnam TEXT, tezgnam TEXT,
+        teilgebiet TEXT)""",
+    u"""CREATE TABLE teilgebiete (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, tgnam TEXT, ewdichte REAL, wverbrauch REAL,
+        stdmittel REAL, fremdwas REAL, flaeche REAL, kommentar TEXT, createdat TEXT)""",
+    u"""CREATE TABLE profile (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, profilnam TEXT, he_nr INTEGER, kp_key TEXT)""",
+    u"""CREATE TABLE entwaesserungsarten (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, bezeichnung TEXT, kuerzel TEXT, bemerkung TEXT,
+        he_nr INTEGER, kp_nr INTEGER)""",
+    u"""CREATE TABLE simulationsstatus (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, bezeichnung TEXT, he_nr TEXT, mu_nr INTEGER,
+        kp_nr INTEGER)""",
+    u"""CREATE TABLE bodenklassen (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, bknam TEXT, infiltrationsrateanfang REAL,
+        infiltrationsrateende REAL, infiltrationsratestart REAL, rueckgangskonstante REAL,
+        regenerationskonstante REAL, saettigungswassergehalt REAL, kommentar TEXT,
+        createdat TEXT)""",
+    u"""CREATE TABLE abflussparameter (
+        pk INTEGER PRIMARY KEY AUTOINCREMENT, apnam TEXT, anfangsabflussbeiwert REAL,
+        endabflussbeiwert REAL, benetzungsverlust REAL, muldenverlust REAL,
+        benetzung_startwert REAL, mulden_startwert REAL, bodenklasse TEXT, kommentar TEXT,
+        createdat TEXT)""",
+)
+
+# Geometriespalten (Tabelle, Spalte, Geometrietyp)
+GEOMETRIEN = (
+    ('schaechte', 'geop', 'POINT'),
+    ('schaechte', 'geom', 'MULTIPOLYGON'),
+    ('haltungen', 'geom', 'LINESTRING'),
+    ('tezg', 'geom', 'MULTIPOLYGON'),
+    ('flaechen', 'geom', 'MULTIPOLYGON'),
+    ('linkfl', 'glink', 'LINESTRING'),
+    ('teilgebiete', 'geom', 'MULTIPOLYGON'),
+)
+
+# Spalten der erzeugten Datensaetze je Tabelle. Die Geometrien werden als WKT uebergeben.
+EINFUEGEN = (
+    ('profile', ('profilnam', 'he_nr'), ()),
+    ('entwaesserungsarten', ('bezeichnung', 'kuerzel', 'he_nr'), ()),
+    ('simulationsstatus', ('bezeichnung', 'he_nr'), ()),
+    ('bodenklassen', ('bknam', 'infiltrationsrateanfang', 'infiltrationsrateende',
+                      'infiltrationsratestart', 'rueckgangskonstante', 'regenerationskonstante',
+                      'saettigungswassergehalt', 'kommentar', 'createdat'), ()),
+    ('abflussparameter', ('apnam', 'anfangsabflussbeiwert', 'endabflussbeiwert', 'benetzungsverlust',
+                          'muldenverlust', 'benetzung_startwert', 'mulden_startwert', 'bodenklasse',
+                          'kommentar', 'createdat'), ()),
+    ('teilgebiete', ('tgnam', 'ewdichte', 'wverbrauch', 'stdmittel', 'fremdwas', 'flaeche',
+                     'kommentar', 'createdat'), ('geom',)),
+    ('schaechte', ('schnam', 'xsch', 'ysch', 'sohlhoehe', 'deckelhoehe', 'durchm', 'strasse',
+                   'teilgebiet', 'schachttyp', 'simstatus', 'kommentar', 'createdat'), ('geop', 'geom')),
+    ('speicherkennlinien', ('schnam', 'wspiegel', 'oberfl'), ()),
+    ('haltungen', ('haltnam', 'schoben', 'schunten', 'hoehe', 'breite', 'laenge', 'sohleoben',
+                   'sohleunten', 'teilgebiet', 'profilnam', 'entwart', 'rohrtyp', 'ks', 'simstatus',
+                   'kommentar', 'createdat'), ('geom',)),
+    ('tezg', ('flnam', 'haltnam', 'neigkl', 'regenschreiber', 'teilgebiet', 'createdat'), ('geom',)),
+    ('flaechen', ('flnam', 'neigkl', 'he_typ', 'speicherzahl', 'speicherkonst', 'fliesszeit',
+                  'fliesszeitkanal', 'teilgebiet', 'regenschreiber', 'abflussparameter', 'aufteilen',
+                  'kommentar', 'createdat'), ('geom',)),
+    ('linkfl', ('flnam', 'haltnam', 'tezgnam', 'teilgebiet'), ('glink',)),
+)
+
+# Nennweiten der Haltungen [m], nach der Anzahl der oberhalb liegenden Schaechte gestaffelt
+NENNWEITEN = (0.3, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 1.2, 1.4, 1.6, 1.8, 2.0)
+
+
+def _rechteck(x1, y1, x2, y2):
+    return (u'MULTIPOLYGON((({0:.3f} {1:.3f}, {2:.3f} {1:.3f}, {2:.3f} {3:.3f}, {0:.3f} {3:.3f}, '
+            u'{0:.3f} {1:.3f})))').format(x1, y1, x2, y2)
+
+
+def _linie(x1, y1, x2, y2):
+    return u'LINESTRING({:.3f} {:.3f}, {:.3f} {:.3f})'.format(x1, y1, x2, y2)
+
+
+def _nennweite(oberhalb):
+    return NENNWEITEN[min(len(NENNWEITEN) - 1, int(math.log(max(1, oberhalb), 2)))]
+
+
+class Testnetz(object):
+    """Synthetisches Kanalnetz.
+
+    :schaechte:     Anzahl der Schaechte einschliesslich der Speicher (ohne Auslaesse). Jeder
+                    Schacht erhaelt eine abgehende Haltung.
+    :type schaechte: Integer
+
+    :speicher:      Anzahl der Schaechte, die als Speicher mit Kennlinie angelegt werden
+    :type speicher: Integer
+
+    :auslaesse:     Anzahl der Auslaesse und damit der voneinander unabhaengigen Netze
+    :type auslaesse: Integer
+
+    :teilgebiete:   Anzahl der Teilgebiete
+    :type teilgebiete: Integer
+
+    :flaechen_je_haltung: Anzahl der Flaechen (Strasse und Grundstuecke) je Haltung einer Strasse.
+                    Die Haltungen der Sammler erhalten nur eine Flaeche.
+    :type flaechen_je_haltung: Integer
+
+    :anteil_aufteilen: Anteil der Haltungen einer Strasse, an deren Grenze zur naechsten Haltung
+                    eine zu verschneidende Flaeche (aufteilen = 'ja') liegt
+    :type anteil_aufteilen: Float
+
+    :regenschreiber: Anzahl der Regenschreiber
+    :type regenschreiber: Integer
+
+    :abstand:       Abstand der Schaechte [m]
+    :type abstand:  Float
+
+    :seed:          Startwert des Zufallsgenerators
+    :type seed:     Integer
+
+    :epsg:          Koordinatensystem der Geometrien
+    :type epsg:     Integer
+    """
+
+    def __init__(self, schaechte=1000, speicher=10, auslaesse=1, teilgebiete=4, flaechen_je_haltung=3,
+                 anteil_aufteilen=0.2, regenschreiber=1, abstand=40., seed=1, epsg=31466):
+        if auslaesse < 1 or schaechte < auslaesse:
+            raise ValueError(u'Testnetz: Es werden mindestens so viele Schaechte wie Auslaesse benoetigt')
+        if flaechen_je_haltung < 1:
+            raise ValueError(u'Testnetz: Je Haltung wird mindestens eine Flaeche benoetigt')
+        self.schaechte = schaechte
+        self.speicher = min(speicher, schaechte)
+        self.auslaesse = auslaesse
+        self.teilgebiete = max(1, teilgebiete)
+        self.flaechen_je_haltung = flaechen_je_haltung
+        self.anteil_aufteilen = anteil_aufteilen
+        self.regenschreiber = max(1, regenschreiber)
+        self.abstand = float(abstand)
+        self.seed = seed
+        self.epsg = epsg
+
+        # Raster der Netze: (Nummer, x des Sammlers, Anzahl Schaechte je Strasse, Anzahl Schaechte)
+        self.netze = []
+        x = 0.
+        ymax = 0.
+        for nummer in range(auslaesse):
+            anzahl = schaechte // auslaesse + (1 if nummer < schaechte % auslaesse else 0)
+            strassen = max(1, int(round(math.sqrt(anzahl / 4.))))
+            je_strasse = int(math.ceil(anzahl / float(strassen)))
+            self.netze.append((nummer, x + self.abstand, je_strasse, anzahl))
+            x += (je_strasse + 2) * self.abstand
+            ymax = max(ymax, (strassen - 1) * self.abstand)
+        self.ausdehnung = (0., -self.abstand, x, ymax + self.abstand)
+
+        rng = random.Random(seed)
+        self._speicher = set(rng.sample(range(schaechte), self.speicher))
+
+    @classmethod
+    def fuer_objekte(cls, objekte, **optionen):
+        """Testnetz mit insgesamt etwa objekte Datensaetzen in den Tabellen schaechte, haltungen,
+        tezg, flaechen und linkfl."""
+        k = optionen.get('flaechen_je_haltung', 3)
+        je_schacht = 3. + 2. * k + 3. * optionen.get('anteil_aufteilen', 0.2)
+        schaechte = max(optionen.get('auslaesse', 1), int(round(objekte / je_schacht)))
+        return cls(schaechte=schaechte, **optionen)
+
+    def teilgebiet(self, x):
+        """Name des Teilgebiets (Streifen), in dem die x-Koordinate liegt."""
+        breite = (self.ausdehnung[2] - self.ausdehnung[0]) / self.teilgebiete
+        return u'Teilgebiet{}'.format(min(self.teilgebiete - 1, max(0, int((x - self.ausdehnung[0]) / breite))) + 1)
+
+    def _regenschreiber(self, x):
+        nummer = int(self.teilgebiet(x)[len(u'Teilgebiet'):])
+        return u'Regenschreiber{}'.format((nummer - 1) % self.regenschreiber + 1)
+
+    def stammdaten(self):
+        """Datensaetze der Schluesseltabellen und der Teilgebiete."""
+        daten = {
+            'profile': [(u'Kreisquerschnitt', 1), (u'Rechteckquerschnitt', 2), (u'Eiquerschnitt', 3),
+                        (u'Maulquerschnitt', 4)],
+            'entwaesserungsarten': [(u'Mischwasser', u'KM', 0), (u'Regenwasser', u'KR', 1),
+                                    (u'Schmutzwasser', u'KS', 2)],
+            'simulationsstatus': [(u'vorhanden', u'0'), (u'geplant', u'1'), (u'fiktiv', u'2'),
+                                  (u'außer Betrieb (keine Sim.)', u'3')],
+            'bodenklassen': [(u'Sand', 200., 60., 120., 2.7, 0.028, 0.3, None, CREATEDAT),
+                             (u'Lehm', 100., 20., 50., 2.5, 0.02, 0.35, None, CREATEDAT),
+                             (u'Ton', 40., 3., 10., 2.0, 0.01, 0.4, None, CREATEDAT)],
+            'abflussparameter': [(u'Dach', 1., 1., 0.7, 0.3, 0., 0., None, None, CREATEDAT),
+                                 (u'Strasse', 0.7, 0.9, 0.5, 1.0, 0., 0., None, None, CREATEDAT),
+                                 (u'Gruenflaeche', 0.1, 0.3, 1.5, 3.0, 0., 0., u'Lehm', None, CREATEDAT)],
+        }
+        x1, y1, x2, y2 = self.ausdehnung
+        breite = (x2 - x1) / self.teilgebiete
+        daten['teilgebiete'] = [
+            (u'Teilgebiet{}'.format(nummer + 1), 60., 120., 14., 100.,
+             round(breite * (y2 - y1 + 2 * self.abstand) / 10000., 2), None, CREATEDAT,
+             _rechteck(x1 + nummer * breite, y1 - self.abstand, x1 + (nummer + 1) * breite, y2 + self.abstand))
+            for nummer in range(self.teilgebiete)]
+        return daten
+
+    def datensaetze(self):
+        """Erzeugt die Datensaetze des Netzes strassenweise. Liefert je Strasse ein Dictionary
+        Tabelle -> Liste von Datensaetzen (Spalten wie in EINFUEGEN), so dass auch sehr grosse
+        Netze nicht vollstaendig im Speicher liegen."""
+        d = self.abstand
+        nummer_schacht = 0
+        nummer_flaeche = 0
+        for nummer, xs, je_strasse, anzahl in self.netze:
+            sammler = None                          # Schacht des Sammlers der vorherigen Strasse
+            auslass = (u'A{:04d}'.format(nummer + 1), xs - d, 0., 100.)
+            strassen = int(math.ceil(anzahl / float(je_strasse)))
+            for j in range(strassen):
+                rng = random.Random((self.seed * 1000003 + nummer) * 1000003 + j)
+                daten = dict((tabelle, []) for tabelle, _, _ in EINFUEGEN)
+                y = j * d
+                strasse = u'Strasse {}-{}'.format(nummer + 1, j + 1)
+                n = min(je_strasse, anzahl - j * je_strasse)
+
+                if j == 0:
+                    name, xa, ya, sohle = auslass
+                    daten['schaechte'].append(
+                        (name, xa, ya, sohle, sohle + 3., 1000., strasse, self.teilgebiet(xa), u'Auslass',
+                         u'vorhanden', None, CREATEDAT, u'POINT({:.3f} {:.3f})'.format(xa, ya),
+                         _rechteck(xa - 0.5, ya - 0.5, xa + 0.5, ya + 0.5)))
+
+                # Schaechte der Strasse. Die Sohle faellt zum Sammler und entlang des Sammlers ab.
+                knoten = []
+                for i in range(n):
+                    name = u'S{:07d}'.format(nummer_schacht + 1)
+                    x = xs + i * d + rng.uniform(-0.05, 0.05) * d
+                    yk = y + rng.uniform(-0.05, 0.05) * d
+                    sohle = round(100.5 + 0.002 * d * (j + 1) + 0.004 * d * i + rng.uniform(0., 0.05), 3)
+                    deckel = round(sohle + rng.uniform(2.0, 3.5), 3)
+                    speicher = nummer_schacht in self._speicher
+                    durchm = 5000. if speicher else 1000.
+                    knoten.append((name, x, yk, sohle))
+                    daten['schaechte'].append(
+                        (name, round(x, 3), round(yk, 3), sohle, deckel, durchm, strasse, self.teilgebiet(x),
+                         u'Speicher' if speicher else u'Schacht', u'vorhanden', None, CREATEDAT,
+                         u'POINT({:.3f} {:.3f})'.format(x, yk),
+                         _rechteck(x - durchm / 2000., yk - durchm / 2000., x + durchm / 2000., yk + durchm / 2000.)))
+                    if speicher:
+                        grundflaeche = rng.uniform(100., 800.)
+                        for stufe in range(rng.randint(4, 6)):
+                            daten['speicherkennlinien'].append(
+                                (name, round(sohle + 0.5 * stufe, 3), round(grundflaeche * (1. + 0.3 * stufe), 1)))
+                    nummer_schacht += 1
+
+                # Haltungen mit Haltungsflaeche: Strassenhaltungen (i > 0) fuehren zum vorherigen
+                # Schacht der Strasse, der erste Schacht zum Sammler bzw. zum Auslass.
+                mitten = []
+                for i, (name, x, yk, sohle) in enumerate(knoten):
+                    if i > 0:
+                        unten = knoten[i - 1]
+                        oberhalb = n - i
+                        tezg = (xs + (i - 1) * d, y - d / 2., xs + i * d, y + d / 2.)
+                    elif sammler is not None:
+                        unten = sammler
+                        oberhalb = anzahl - j * je_strasse
+                        tezg = (xs - d / 2., y - d, xs, y)
+                    else:
+                        unten = auslass
+                        oberhalb = anzahl
+                        tezg = (xs - d, y - d / 2., xs - d / 2., y + d / 2.)
+                    haltnam = u'H' + name[1:]
+                    tezgnam = u'T' + name[1:]
+                    teilgebiet = self.teilgebiet((tezg[0] + tezg[2]) / 2.)
+                    regenschreiber = self._regenschreiber((tezg[0] + tezg[2]) / 2.)
+                    laenge = math.hypot(x - unten[1], yk - unten[2])
+                    nennweite = _nennweite(oberhalb)
+                    mitte = ((x + unten[1]) / 2., (yk + unten[2]) / 2.)
+                    mitten.append(mitte)
+                    daten['haltungen'].append(
+                        (haltnam, name, unten[0], nennweite, nennweite, round(laenge, 3), sohle, unten[3],
+                         teilgebiet, u'Kreisquerschnitt', u'Mischwasser', u'Beton', 1.5, u'vorhanden',
+                         None, CREATEDAT, _linie(x, yk, unten[1], unten[2])))
+                    daten['tezg'].append((tezgnam, haltnam, rng.randint(1, 4), regenschreiber, teilgebiet,
+                                          CREATEDAT, _rechteck(*tezg)))
+
+                    # Flaechen: Strassenhaltungen erhalten eine Strassenflaeche und Grundstuecke
+                    # beiderseits der Strasse, Sammler einen Gruenstreifen neben der Haltung.
+                    if i > 0:
+                        x1, x2 = tezg[0], tezg[2]
+                        flaechen = [((x1, y - 0.08 * d, x2, y + 0.08 * d), u'Strasse')]
+                        grundstuecke = self.flaechen_je_haltung - 1
+                        oben = (grundstuecke + 1) // 2
+                        for seite, anz, (ymin, ymax) in ((0, oben, (y + 0.12 * d, y + 0.3 * d)),
+                                                        (1, grundstuecke - oben, (y - 0.45 * d, y - 0.12 * d))):
+                            for spalte in range(anz):
+                                breite = d / anz
+                                links = x1 + spalte * breite + rng.uniform(0.05, 0.2) * breite
+                                rechts = x1 + (spalte + 1) * breite - rng.uniform(0.05, 0.2) * breite
+                                flaechen.append(((links, ymin, rechts, ymax), u'Dach'))
+                    else:
+                        flaechen = [((tezg[0] + 0.05 * d, tezg[1], tezg[2] - 0.15 * d, tezg[3]), u'Gruenflaeche')]
+
+                    for (fx1, fy1, fx2, fy2), abflussparameter in flaechen:
+                        nummer_flaeche += 1
+                        flnam = u'F{:08d}'.format(nummer_flaeche)
+                        daten['flaechen'].append(self._flaeche(rng, flnam, (fx1, fy1, fx2, fy2),
+                                                               abflussparameter, None))
+                        daten['linkfl'].append((flnam, haltnam, tezgnam, self.teilgebiet((fx1 + fx2) / 2.),
+                                                _linie((fx1 + fx2) / 2., (fy1 + fy2) / 2., mitte[0], mitte[1])))
+
+                # Zu verschneidende Flaechen ueber der Grenze zweier Strassenhaltungen. Jeder Teil
+                # wird ueber eine eigene linkfl an die Haltung seiner Haltungsflaeche angeschlossen.
+                for i in range(1, n - 1):
+                    if rng.random() >= self.anteil_aufteilen:
+                        continue
+                    grenze = xs + i * d
+                    nummer_flaeche += 1
+                    flnam = u'F{:08d}'.format(nummer_flaeche)
+                    rechteck = (grenze - 0.3 * d, y + 0.32 * d, grenze + 0.3 * d, y + 0.48 * d)
+                    daten['flaechen'].append(self._flaeche(rng, flnam, rechteck, u'Gruenflaeche', u'ja'))
+                    for teil, xstart in ((i, grenze - 0.15 * d), (i + 1, grenze + 0.15 * d)):
+                        name = knoten[teil][0]
+                        daten['linkfl'].append((flnam, u'H' + name[1:], u'T' + name[1:], self.teilgebiet(xstart),
+                                                _linie(xstart, y + 0.4 * d, mitten[teil][0], mitten[teil][1])))
+
+                sammler = knoten[0]
+                yield daten
+
+    def _flaeche(self, rng, flnam, rechteck, abflussparameter, aufteilen):
+        x = (rechteck[0] + rechteck[2]) / 2.
+        return (flnam, rng.randint(1, 4), 0, 3, round(rng.uniform(0.5, 2.), 2), round(rng.uniform(2., 10.), 1),
+                round(rng.uniform(1., 5.), 1), self.teilgebiet(x), self._regenschreiber(x), abflussparameter,
+                aufteilen, None, CREATEDAT, _rechteck(*rechteck))
+
+
+def verbinden(dateiname):
+    """Oeffnet eine SpatiaLite-Datenbank mit sqlite3 und mod_spatialite."""
+    verbindung = sqlite3.connect(dateiname)
+    verbindung.enable_load_extension(True)
+    verbindung.load_extension('mod_spatialite')
+    return verbindung
+
+
+def erzeugen(netz, dateiname, raumindizes=True, ueberschreiben=False, blockgroesse=10000):
+    """Schreibt ein Testnetz in eine neue QKan-Datenbank.
+
+    :netz:          Zu erzeugendes Netz
+    :type netz:     Testnetz
+
+    :dateiname:     Pfad der QKan-Datenbank
+    :type dateiname: String
+
+    :raumindizes:   Raeumliche Indizes auf den Geometriespalten anlegen, wie in einer mit QKan
+                    erstellten Datenbank
+    :type raumindizes: Boolean
+
+    :ueberschreiben: Eine vorhandene Datei ersetzen
+    :type ueberschreiben: Boolean
+
+    :returns: Dictionary mit der Anzahl der Datensaetze je Tabelle
+    """
+    if os.path.exists(dateiname):
+        if not ueberschreiben:
+            raise IOError(u'Testnetz: {} ist bereits vorhanden'.format(dateiname))
+        os.remove(dateiname)
+
+    start = time.time()
+    verbindung = verbinden(dateiname)
+    try:
+        cursor = verbindung.cursor()
+        cursor.execute(u'PRAGMA journal_mode = OFF')
+        cursor.execute(u'PRAGMA synchronous = OFF')
+        cursor.execute(u'SELECT InitSpatialMetadata(1)')
+        for sql in TABELLEN:
+            cursor.execute(sql)
+        for tabelle, spalte, typ in GEOMETRIEN:
+            cursor.execute(u"SELECT AddGeometryColumn('{}', '{}', {}, '{}', 'XY')".format(
+                tabelle, spalte, netz.epsg, typ))
+
+        anweisungen = {}
+        for tabelle, spalten, geometrien in EINFUEGEN:
+            anweisungen[tabelle] = u'INSERT INTO {} ({}) VALUES ({})'.format(
+                tabelle, u', '.join(spalten + geometrien),
+                u', '.join([u'?'] * len(spalten) + [u'GeomFromText(?, {})'.format(netz.epsg)] * len(geometrien)))
+
+        anzahl = dict((tabelle, 0) for tabelle, _, _ in EINFUEGEN)
+        puffer = dict((tabelle, []) for tabelle, _, _ in EINFUEGEN)
+
+        def schreiben(tabelle):
+            cursor.executemany(anweisungen[tabelle], puffer[tabelle])
+            anzahl[tabelle] += len(puffer[tabelle])
+            puffer[tabelle] = []
+
+        for tabelle, zeilen in netz.stammdaten().items():
+            puffer[tabelle].extend(zeilen)
+            schreiben(tabelle)
+
+        gemeldet = 0
+        for daten in netz.datensaetze():
+            for tabelle, zeilen in daten.items():
+                puffer[tabelle].extend(zeilen)
+                if len(puffer[tabelle]) >= blockgroesse:
+                    schreiben(tabelle)
+            if anzahl['schaechte'] - gemeldet >= netz.schaechte // 10 + 1:
+                gemeldet = anzahl['schaechte']
+                logger.info(u'qkan_testnetz: {} von {} Schaechten erzeugt'.format(gemeldet, netz.schaechte))
+        for tabelle in puffer:
+            schreiben(tabelle)
+
+        if raumindizes:
+            for tabelle, spalte, _ in GEOMETRIEN:
+                cursor.execute(u"SELECT CreateSpatialIndex('{}', '{}')".format(tabelle, spalte))
+        verbindung.commit()
+    finally:
+        verbindung.close()
+
+    logger.info(u'qkan_testnetz: {} in {:.1f} s erzeugt: {}'.format(
+        dateiname, time.time() - start, u', '.join(u'{} {}'.format(t, anzahl[t]) for t, _, _ in EINFUEGEN)))
+    return anzahl
+
+
+def main(argv=None):
+    """Kommandozeilenaufruf. Liefert 0 bei Erfolg und 1 bei Fehler."""
+    parser = argparse.ArgumentParser(description=u'Erzeugt eine QKan-Datenbank mit einem synthetischen Kanalnetz')
+    parser.add_argument('--ziel', required=True, help=u'Zu erstellende QKan-Datenbank (SpatiaLite)')
+    groesse = parser.add_mutually_exclusive_group()
+    groesse.add_argument('--schaechte', type=int, help=u'Anzahl der Schaechte (Standard: 1000)')
+    groesse.add_argument('--objekte', type=int,
+                         help=u'Ungefaehre Gesamtzahl der Schaechte, Haltungen, tezg, Flaechen und linkfl')
+    parser.add_argument('--speicher', type=int, default=10, help=u'Anzahl der Speicher (Standard: 10)')
+    parser.add_argument('--auslaesse', type=int, default=1, help=u'Anzahl der Auslaesse (Standard: 1)')
+    parser.add_argument('--teilgebiete', type=int, default=4, help=u'Anzahl der Teilgebiete (Standard: 4)')
+    parser.add_argument('--flaechen', type=int, default=3, help=u'Flaechen je Haltung (Standard: 3)')
+    parser.add_argument('--aufteilen', type=float, default=0.2,
+                        help=u'Anteil der Haltungen mit zu verschneidender Flaeche (Standard: 0.2)')
+    parser.add_argument('--regenschreiber', type=int, default=1, help=u'Anzahl der Regenschreiber (Standard: 1)')
+    parser.add_argument('--seed', type=int, default=1, help=u'Startwert des Zufallsgenerators (Standard: 1)')
+    parser.add_argument('--epsg', type=int, default=31466, help=u'Koordinatensystem (Standard: 31466)')
+    parser.add_argument('--ohne-raumindizes', action='store_true', help=u'Keine raeumlichen Indizes anlegen')
+    parser.add_argument('--ueberschreiben', action='store_true', help=u'Vorhandene Datei ersetzen')
+    argumente = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+
+    optionen = dict(speicher=argumente.speicher, auslaesse=argumente.auslaesse,
+                    teilgebiete=argumente.teilgebiete, flaechen_je_haltung=argumente.flaechen,
+                    anteil_aufteilen=argumente.aufteilen, regenschreiber=argumente.regenschreiber,
+                    seed=argumente.seed, epsg=argumente.epsg)
+    try:
+        if argumente.objekte:
+            netz = Testnetz.fuer_objekte(argumente.objekte, **optionen)
+        else:
+            netz = Testnetz(schaechte=argumente.schaechte or 1000, **optionen)
+        erzeugen(netz, argumente.ziel, not argumente.ohne_raumindizes, argumente.ueberschreiben)
+    except BaseException as err:
+        sys.stderr.write(u'Fehler: {}\n'.format(err))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
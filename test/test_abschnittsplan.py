@@ -0,0 +1,88 @@
+# coding=utf-8
+"""Abschnittsplan test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import threading
+import unittest
+
+from abschnittsplan import Abschnittsplan
+
+
+class AbschnittsplanTest(unittest.TestCase):
+    """Test der Abhaengigkeiten, der Fehlerweitergabe und des Beendens."""
+
+    def test_reihenfolge(self):
+        """Abhaengige Aufgaben laufen erst nach ihren Voraussetzungen."""
+        ablauf = []
+        plan = Abschnittsplan(threads=2)
+        plan.hinzufuegen('raumindizes', lambda: ablauf.append('raumindizes') or 1)
+        plan.hinzufuegen('verschneidung', lambda: ablauf.append('verschneidung') or 2, ('raumindizes',))
+        plan.starten()
+        self.assertEqual(plan.ergebnis('verschneidung'), 2)
+        self.assertEqual(plan.ergebnis('raumindizes'), 1)
+        self.assertEqual(ablauf, ['raumindizes', 'verschneidung'])
+        plan.beenden()
+
+    def test_fehler(self):
+        """ergebnis() loest den Fehler der Aufgabe aus, abhaengige Aufgaben werden nicht ausgefuehrt."""
+        ausgefuehrt = []
+
+        def fehlerhaft():
+            raise ValueError(u'Geometrie ungueltig')
+
+        plan = Abschnittsplan()
+        plan.hinzufuegen('raumindizes', fehlerhaft)
+        plan.hinzufuegen('verschneidung', lambda: ausgefuehrt.append('verschneidung'), ('raumindizes',))
+        plan.starten()
+        with self.assertRaises(ValueError):
+            plan.ergebnis('raumindizes')
+        with self.assertRaises(RuntimeError):
+            plan.ergebnis('verschneidung')
+        self.assertEqual(ausgefuehrt, [])
+        plan.beenden()
+
+    def test_beenden(self):
+        """beenden() wartet die laufenden Aufgaben ab und startet keine weiteren."""
+        freigabe = threading.Event()
+        gestartet = threading.Event()
+        ausgefuehrt = []
+
+        def langsam():
+            gestartet.set()
+            freigabe.wait(10.)
+            ausgefuehrt.append('raumindizes')
+
+        plan = Abschnittsplan(threads=1)
+        plan.hinzufuegen('raumindizes', langsam)
+        plan.hinzufuegen('verschneidung', lambda: ausgefuehrt.append('verschneidung'), ('raumindizes',))
+        plan.starten()
+        self.assertTrue(gestartet.wait(10.))
+
+        beenden = threading.Thread(target=plan.beenden)
+        beenden.start()
+        beenden.join(0.2)
+        self.assertTrue(beenden.is_alive())
+        freigabe.set()
+        beenden.join(10.)
+        self.assertFalse(beenden.is_alive())
+
+        self.assertEqual(ausgefuehrt, ['raumindizes'])
+        self.assertIsNone(plan.ergebnis('raumindizes'))
+        with self.assertRaises(RuntimeError):
+            plan.ergebnis('verschneidung')
+        self.assertEqual(ausgefuehrt, ['raumindizes'])
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(AbschnittsplanTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,50 @@
+# coding=utf-8
+"""Lasttest Auswertung test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import unittest
+
+from k_qkhe_benchmark import skalierung, auswerten, bericht_text
+
+
+def _lauf(objekte, linear, quadratisch):
+    return {'groesse': objekte, 'objekte': objekte, 'erfolg': True, 'fehler': [],
+            'dauer': linear + quadratisch, 'objekte_je_s': None, 'speicher_mb': 100.,
+            'abschnitte': [{'abschnitt': u'Schaechte', 'dauer': linear, 'datensaetze': objekte,
+                            'datensaetze_je_s': None},
+                           {'abschnitt': u'Flaechen Teil 1', 'dauer': quadratisch, 'datensaetze': objekte,
+                            'datensaetze_je_s': None}]}
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Test der Auswertung der Laufzeiten."""
+
+    def test_skalierung(self):
+        """Der Exponent der Potenzfunktion wird aus den Laufzeiten bestimmt."""
+        self.assertEqual(skalierung([(1000, 1.), (10000, 10.), (100000, 100.)]), 1.)
+        self.assertEqual(skalierung([(1000, 0.5), (10000, 50.)]), 2.)
+        self.assertIsNone(skalierung([(1000, 1.)]))
+        self.assertIsNone(skalierung([(1000, 0.001), (10000, 0.01)]))
+
+    def test_auswerten(self):
+        """Lineare und quadratische Abschnitte werden unterschieden."""
+        auswertung = auswerten([_lauf(1000, 0.1, 0.1), _lauf(10000, 1., 10.), _lauf(100000, 10., 1000.)])
+        self.assertEqual(auswertung['exponenten'], {u'Schaechte': 1., u'Flaechen Teil 1': 2.})
+        self.assertEqual(auswertung['abschnitte'], [u'Schaechte', u'Flaechen Teil 1'])
+        self.assertEqual(auswertung['exponent_speicher'], 0.)
+        self.assertIn(u'Flaechen Teil 1', bericht_text(auswertung))
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(BenchmarkTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
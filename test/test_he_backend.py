@@ -0,0 +1,98 @@
+# coding=utf-8
+"""HE-Ersatzdatenbank test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from he_backend import backend
+from he_writer import HEWriter, HEIdVergabe
+from he_vorlage import schnell_leeren
+
+VORLAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'itwh.idbf')
+
+
+class SQLiteBackendTest(unittest.TestCase):
+    """Test der Schreibschicht mit der SQLite-Ersatzdatenbank aus dem Tabellenaufbau der Vorlage."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.verzeichnis = tempfile.mkdtemp()
+        self.backend = backend('sqlite')
+        ziel = os.path.join(self.verzeichnis, 'netz.idbf')
+        self.backend.erstellen(VORLAGE, ziel)
+        self.dbHE = self.backend.verbinden(ziel)
+        self.writer = HEWriter(self.dbHE, blockgroesse=2)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.dbHE.confb.close()
+        shutil.rmtree(self.verzeichnis)
+
+    def test_vorlage(self):
+        """Tabellen und Programmdaten entsprechen der Vorlage."""
+        self.assertFalse(self.writer.firebird)
+        typen = self.writer.spaltentypen('ROHR')
+        self.assertEqual(typen['ID'], 'INTEGER')
+        self.assertEqual(typen['LAENGE'], 'DOUBLE PRECISION')
+        self.dbHE.sql(u'SELECT NEXTID FROM ITWH$PROGINFO')
+        self.assertEqual(self.dbHE.fetchone()[0], 2)
+
+    def test_schreiben(self):
+        """Einfuegen, gesammeltes Aendern, ID-Vergabe und Leeren wie in Firebird."""
+        idvergabe = HEIdVergabe(self.writer)
+        ids = idvergabe.reservieren('SCHAECHTE', 3)
+        anweisung = self.writer.insert('SCHACHT', ('NAME', 'SOHLHOEHE', 'DECKELHOEHE', 'ID'))
+        for name in ('S1', 'S2', 'S3'):
+            self.assertTrue(anweisung.execute((name, 10., 12., ids.aktuell)))
+            ids.weiter()
+        self.assertEqual(idvergabe.abschliessen(), 5)
+
+        aenderung = self.writer.merge('SCHACHT', ('NAME', 'SOHLHOEHE'))
+        aenderung.execute(('S2', 9.5))
+        aenderung.anwenden()
+        self.writer.commit()
+        self.dbHE.sql(u'SELECT NAME, SOHLHOEHE, DECKELHOEHE, ID FROM SCHACHT ORDER BY ID')
+        self.assertEqual(self.dbHE.fetchall(), [('S1', 10., 12., 2), ('S2', 9.5, 12., 3), ('S3', 10., 12., 4)])
+
+        schnell_leeren(self.writer, ('schaechte',))
+        self.dbHE.sql(u'SELECT COUNT(*) FROM SCHACHT')
+        self.assertEqual(self.dbHE.fetchone()[0], 0)
+
+    def test_sicherungspunkte(self):
+        """Abschnitte mit Sicherungspunkten, Ruecksetzen eines Abschnitts und der Transaktion."""
+        spalten = ('NAME', 'SOHLHOEHE', 'ID')
+        self.writer.abschnitt('SCHAECHTE')
+        self.writer.insert('SCHACHT', spalten).execute(('S1', 10., 2))
+        self.writer.abschnitt_ende()
+        self.writer.abschnitt('AUSLAESSE')
+        self.writer.insert('SCHACHT', spalten).execute(('S2', 11., 3))
+        self.writer.flush()
+        self.writer.abschnitt_verwerfen()
+        self.writer.commit()
+        self.dbHE.sql(u'SELECT NAME FROM SCHACHT')
+        self.assertEqual(self.dbHE.fetchall(), [('S1',)])
+
+        self.writer.abschnitt('HALTUNGEN')
+        self.writer.insert('SCHACHT', spalten).execute(('S3', 12., 4))
+        self.writer.abschnitt_ende()
+        self.writer.rollback()
+        self.dbHE.sql(u'SELECT NAME FROM SCHACHT')
+        self.assertEqual(self.dbHE.fetchall(), [('S1',)])
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SQLiteBackendTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
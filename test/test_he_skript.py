@@ -0,0 +1,103 @@
+# coding=utf-8
+"""SQL-Skript test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import codecs
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from he_backend import backend
+from he_skript import literal, einfuegen
+from he_writer import HEWriter, HEIdVergabe
+
+VORLAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'itwh.idbf')
+
+
+class SkriptTest(unittest.TestCase):
+    """Test des Backends "skript"."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.verzeichnis = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.verzeichnis)
+
+    def test_literal(self):
+        """Werte werden als Firebird-Literale geschrieben, in der ersten Zeile mit dem Typ der Spalte."""
+        self.assertEqual(literal(None, u'DOUBLE PRECISION'), u'CAST(NULL AS DOUBLE PRECISION)')
+        self.assertEqual(literal(u"S'1", u'VARCHAR(30)'), u"'S''1'")
+        self.assertEqual(literal(u'S1', u'VARCHAR(30)', typisiert=True), u"CAST('S1' AS VARCHAR(30))")
+        self.assertEqual(literal(u'2017-04-07 17:42:21', u'TIMESTAMP'), u"CAST('2017-04-07 17:42:21' AS TIMESTAMP)")
+        self.assertEqual(literal(2.5), u'2.5')
+        self.assertEqual(literal(True), u'1')
+
+    def test_einfuegen(self):
+        """Die Anweisungen halten die Grenzen fuer Zeilen und Laenge ein."""
+        zeilen = [(i, u'x' * 100) for i in range(1000)]
+        anweisungen = list(einfuegen(u'T', (u'ID', u'NAME'), (u'INTEGER', u'VARCHAR(100)'), zeilen,
+                                     zeilen_je_anweisung=300, max_laenge=10000))
+        self.assertTrue(all(len(sql) <= 10000 for sql in anweisungen))
+        self.assertEqual(sum(sql.count(u'RDB$DATABASE') for sql in anweisungen), 1000)
+        self.assertTrue(all(sql.split(u'\n')[1].startswith(u'SELECT CAST(') for sql in anweisungen))
+        self.assertEqual(len(list(einfuegen(u'T', (u'ID',), (u'INTEGER',), [(i,) for i in range(1000)],
+                                            zeilen_je_anweisung=300))), 4)
+
+    def test_skript(self):
+        """Das Skript ueberfuehrt die Vorlage in den Stand des Exports."""
+        skript = os.path.join(self.verzeichnis, 'netz.sql')
+        he = backend('skript')
+        he.erstellen(VORLAGE, skript)
+        dbHE = he.verbinden(skript)
+        writer = HEWriter(dbHE, blockgroesse=2)
+        idvergabe = HEIdVergabe(writer)
+        ids = idvergabe.reservieren('SCHAECHTE', 3)
+        anweisung = writer.insert('SCHACHT', ('NAME', 'SOHLHOEHE', 'DECKELHOEHE', 'ID'))
+        for name, sohle in ((u"S'1", 10.), (u'S2', None), (u'S3', 11.25)):
+            self.assertTrue(anweisung.execute((name, sohle, 12., ids.aktuell)))
+            ids.weiter()
+        idvergabe.abschliessen()
+        writer.commit()
+        dbHE.curfb.execute(u'SELECT NAME, SOHLHOEHE, DECKELHOEHE, ID FROM SCHACHT ORDER BY ID')
+        erwartet = dbHE.curfb.fetchall()
+        zaehler = he.abschliessen(dbHE)
+        self.assertEqual(zaehler['SCHACHT']['eingefuegt'], 3)
+        self.assertEqual(zaehler['ITWH$PROGINFO']['geaendert'], 1)
+        self.assertFalse(os.path.exists(dbHE.dateiname))
+
+        # Anwenden auf eine neue Ersatzdatenbank der Vorlage (RDB$DATABASE wie in Firebird)
+        with codecs.open(skript, 'r', 'utf-8') as datei:
+            text = datei.read()
+        self.assertEqual(text.count(u'COMMIT;'), 1)
+        ziel = os.path.join(self.verzeichnis, 'netz.sqlite')
+        backend('sqlite').erstellen(VORLAGE, ziel)
+        con = sqlite3.connect(ziel)
+        con.execute(u'CREATE TABLE "RDB$DATABASE" (X INTEGER)')
+        con.execute(u'INSERT INTO "RDB$DATABASE" VALUES (1)')
+        for sql in text.split(u';\n'):
+            sql = u'\n'.join(z for z in sql.split(u'\n') if not z.startswith(u'--')).strip()
+            if sql and not sql.startswith((u'SET ', u'COMMIT')):
+                con.execute(sql)
+        self.assertEqual(con.execute(u'SELECT NAME, SOHLHOEHE, DECKELHOEHE, ID FROM SCHACHT ORDER BY ID').fetchall(),
+                         erwartet)
+        self.assertEqual(con.execute(u'SELECT NEXTID FROM ITWH$PROGINFO').fetchone()[0], 5)
+        con.close()
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(SkriptTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,110 @@
+# coding=utf-8
+"""Vorlagencache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import he_vorlage
+from he_vorlage import Vorlagencache
+
+
+class VorlagencacheTest(unittest.TestCase):
+    """Test des Vorlagencaches ohne init_*-Abschnitte (ohne Firebird)."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.verzeichnis = tempfile.mkdtemp()
+        self.vorlage = os.path.join(self.verzeichnis, 'itwh.idbf')
+        self._vorlage_schreiben(b'Vorlage 1')
+        self.cache = Vorlagencache(os.path.join(self.verzeichnis, 'cache'))
+
+    def tearDown(self):
+        """Runs after each test."""
+        shutil.rmtree(self.verzeichnis)
+
+    def _vorlage_schreiben(self, inhalt):
+        with open(self.vorlage, 'wb') as datei:
+            datei.write(inhalt)
+
+    def _kopien(self):
+        return sorted(name for name in os.listdir(self.cache.verzeichnis) if name.endswith('.idbf'))
+
+    def _index(self):
+        with open(self.cache.indexdatei) as datei:
+            return json.load(datei)
+
+    def _ziel(self, name):
+        return os.path.join(self.verzeichnis, name)
+
+    def test_wiederverwenden(self):
+        """Die Kopie der Vorlage wird beim zweiten Export wiederverwendet, der Index hat einen Eintrag."""
+        self.cache.bereitstellen(self.vorlage, self._ziel('netz1.idbf'))
+        kopien = self._kopien()
+        self.assertEqual(len(kopien), 1)
+        pfad = os.path.join(self.cache.verzeichnis, kopien[0])
+        vorher = os.stat(pfad).st_mtime
+
+        self.cache.bereitstellen(self.vorlage, self._ziel('netz2.idbf'))
+        self.assertEqual(self._kopien(), kopien)
+        self.assertEqual(os.stat(pfad).st_mtime, vorher)
+        self.assertEqual(list(self._index()), [os.path.abspath(self.vorlage)])
+        self.assertFalse(os.path.exists(self.cache.sperrdatei))
+        for name in ('netz1.idbf', 'netz2.idbf'):
+            with open(self._ziel(name), 'rb') as datei:
+                self.assertEqual(datei.read(), b'Vorlage 1')
+
+    def test_geaenderte_vorlage(self):
+        """Nach einer Aenderung der Vorlage werden die Kopien der alten Fassung entfernt."""
+        self.cache.bereitstellen(self.vorlage, self._ziel('netz1.idbf'))
+        alt = self._kopien()
+        pruefsumme = alt[0].split('_')[0]
+
+        self._vorlage_schreiben(b'Vorlage 2, geaendert')
+        self.cache.bereitstellen(self.vorlage, self._ziel('netz2.idbf'))
+        neu = self._kopien()
+        self.assertEqual(len(neu), 1)
+        self.assertFalse(neu[0].startswith(pruefsumme + '_'))
+        self.assertNotEqual(self._index()[os.path.abspath(self.vorlage)]['md5'], pruefsumme)
+        with open(self._ziel('netz2.idbf'), 'rb') as datei:
+            self.assertEqual(datei.read(), b'Vorlage 2, geaendert')
+
+    def test_sperre(self):
+        """Eine verwaiste Sperre wird entfernt, eine gueltige Sperre fuehrt nach der Wartezeit zum Fehler."""
+        os.makedirs(self.cache.verzeichnis)
+        open(self.cache.sperrdatei, 'w').close()
+        alt = time.time() - he_vorlage.SPERRE_VERWAIST - 10.
+        os.utime(self.cache.sperrdatei, (alt, alt))
+        self.cache.bereitstellen(self.vorlage, self._ziel('netz1.idbf'))
+        self.assertFalse(os.path.exists(self.cache.sperrdatei))
+
+        self._vorlage_schreiben(b'Vorlage 2, geaendert')
+        open(self.cache.sperrdatei, 'w').close()
+        warten = he_vorlage.SPERRE_WARTEN
+        he_vorlage.SPERRE_WARTEN = 0.2
+        try:
+            with self.assertRaises(OSError):
+                self.cache.bereitstellen(self.vorlage, self._ziel('netz2.idbf'))
+        finally:
+            he_vorlage.SPERRE_WARTEN = warten
+        self.assertTrue(os.path.exists(self.cache.sperrdatei))
+        self.assertFalse(os.path.exists(self._ziel('netz2.idbf')))
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(VorlagencacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
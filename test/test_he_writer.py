@@ -0,0 +1,240 @@
+# coding=utf-8
+"""Schreibschicht test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from he_writer import HEWriter, HEIdVergabe, HEExecuteBlock, IndexFehler
+from he_backend import SQLiteHE
+from exportstand import Exportstand
+
+
+class _Verbindung(SQLiteHE):
+    """Ersatz fuer FBConnection mit einer SQLite-Datenbank im Speicher."""
+
+    def __init__(self):
+        SQLiteHE.__init__(self, ':memory:')
+        self.curfb.execute('CREATE TABLE SCHACHT (NAME TEXT, SOHLHOEHE REAL, ID INTEGER)')
+        self.curfb.execute("INSERT INTO SCHACHT VALUES ('S1', 10.0, 1)")
+        self.curfb.execute('CREATE TABLE ITWH$PROGINFO (NEXTID INTEGER)')
+        self.curfb.execute('INSERT INTO ITWH$PROGINFO VALUES (10)')
+
+
+class HEWriterTest(unittest.TestCase):
+    """Test der vorbereiteten Anweisungen."""
+
+    def setUp(self):
+        """Runs before each test."""
+        self.dbHE = _Verbindung()
+        self.writer = HEWriter(self.dbHE, blockgroesse=2)
+
+    def tearDown(self):
+        """Runs after each test."""
+        self.dbHE.confb.close()
+
+    def test_insert_ueberspringt_vorhandene_namen(self):
+        """Vorhandene und doppelte Namen werden nicht eingefuegt."""
+        anweisung = self.writer.insert('SCHACHT', ('NAME', 'SOHLHOEHE', 'ID'))
+        self.assertFalse(anweisung.execute(('S1', 11.0, 2)))
+        self.assertTrue(anweisung.execute(("S'2", 12.0, 3)))
+        self.assertFalse(anweisung.execute(("S'2", 12.0, 4)))
+        self.assertTrue(anweisung.execute(('S3', None, 5)))
+        self.writer.flush()
+        self.dbHE.curfb.execute('SELECT NAME, ID FROM SCHACHT ORDER BY ID')
+        self.assertEqual(self.dbHE.curfb.fetchall(), [('S1', 1), ("S'2", 3), ('S3', 5)])
+
+    def test_update(self):
+        """Aenderungen werden ueber den Namen zugeordnet."""
+        anweisung = self.writer.update('SCHACHT', ('SOHLHOEHE',))
+        anweisung.execute((9.5, 'S1'))
+        self.writer.flush()
+        self.dbHE.curfb.execute('SELECT SOHLHOEHE FROM SCHACHT')
+        self.assertEqual(self.dbHE.curfb.fetchall(), [(9.5,)])
+    def test_idvergabe(self):
+        """Reservierte Bereiche werden bei Bedarf am Ende erweitert, NEXTID einmal geschrieben."""
+        idvergabe = HEIdVergabe(self.writer)
+        schaechte = idvergabe.reservieren('SCHAECHTE', 2)
+        haltungen = idvergabe.reservieren('HALTUNGEN', 2)
+        vergeben = []
+        for i in range(3):
+            vergeben.append(schaechte.aktuell)
+            schaechte.weiter()
+        vergeben.append(haltungen.aktuell)
+        haltungen.weiter()
+        self.assertEqual(vergeben, [10, 11, 14, 12])
+        self.assertEqual(idvergabe.abschliessen(), 15)
+        self.dbHE.curfb.execute('SELECT NEXTID FROM ITWH$PROGINFO')
+        self.assertEqual(self.dbHE.curfb.fetchone()[0], 15)
+
+    def test_inkrementell(self):
+        """Unveraenderte Objekte werden uebersprungen, nicht mehr vorhandene geloescht."""
+        verzeichnis = tempfile.mkdtemp()
+        try:
+            exportstand = Exportstand(os.path.join(verzeichnis, 'netz_exportstand.json'))
+            writer = HEWriter(self.dbHE, exportstand=exportstand)
+            writer.abschnitt('SCHAECHTE')
+            anweisung = writer.insert('SCHACHT', ('NAME', 'SOHLHOEHE', 'ID'))
+            self.assertTrue(anweisung.execute(('S2', 12.0, 2)))
+            self.assertTrue(anweisung.execute(('S3', 13.0, 3)))
+            writer.abschnitt_ende()
+            exportstand.speichern()
+
+            writer = HEWriter(self.dbHE, exportstand=exportstand)
+            writer.abschnitt('SCHAECHTE')
+            anweisung = writer.insert('SCHACHT', ('NAME', 'SOHLHOEHE', 'ID'))
+            self.assertFalse(anweisung.execute(('S2', 12.0, 4)))
+            self.assertTrue(anweisung.execute(('S4', 14.0, 4)))
+            writer.abschnitt_ende()
+            self.dbHE.curfb.execute('SELECT NAME, ID FROM SCHACHT ORDER BY ID')
+            self.assertEqual(self.dbHE.curfb.fetchall(), [('S1', 1), ('S2', 2), ('S4', 4)])
+        finally:
+            shutil.rmtree(verzeichnis)
+
+    def test_pipeline(self):
+        """Die Bloecke werden im Thread der Pipeline geschrieben und bei flush() abgewartet."""
+        writer = HEWriter(self.dbHE, blockgroesse=2, pipeline=2)
+        anweisung = writer.insert('SCHACHT', ('NAME', 'SOHLHOEHE', 'ID'))
+        for i in range(2, 7):
+            self.assertTrue(anweisung.execute(('S{}'.format(i), float(i), i)))
+        writer.flush()
+        self.dbHE.curfb.execute('SELECT COUNT(*) FROM SCHACHT')
+        self.assertEqual(self.dbHE.curfb.fetchone()[0], 6)
+        writer.aufraeumen()
+        self.assertIsNone(writer.pipeline)
+
+    def test_indexpause_fehler(self):
+        """Teilweise deaktivierte Indizes werden nach einem Rollback wiederhergestellt, eine
+        fehlgeschlagene Aktivierung wird als IndexFehler gemeldet."""
+        writer = HEWriter(self.dbHE, blockgroesse=2, indexpause=True)
+        ausgefuehrt = []
+
+        def ddl(sql):
+            if sql in (u'ALTER INDEX IX_B INACTIVE', u'ALTER INDEX IX_A ACTIVE'):
+                raise RuntimeError(u'gesperrt')
+            ausgefuehrt.append(sql)
+
+        writer.indizes = lambda tabelle: [u'IX_A', u'IX_B']
+        writer.ddl = ddl
+        anweisung = writer.insert('SCHACHT', ('NAME', 'SOHLHOEHE', 'ID'))
+        self.assertEqual(writer.pausiert, [u'IX_A'])
+        self.assertEqual(len(writer.warnungen), 1)
+        self.assertTrue(anweisung.execute(('S2', 11.0, 2)))
+
+        writer.ddl = lambda sql: ausgefuehrt.append(sql)
+        writer.rollback()
+        self.assertEqual(ausgefuehrt, [u'ALTER INDEX IX_A INACTIVE', u'ALTER INDEX IX_A ACTIVE'])
+        self.assertEqual(writer.pausiert, [])
+
+        writer.pausiert = [u'IX_A', u'IX_C']
+        writer.ddl = ddl
+        with self.assertRaises(IndexFehler) as fehler:
+            writer.aufraeumen()
+        self.assertEqual(fehler.exception.indizes, [u'IX_A'])
+        self.assertEqual(ausgefuehrt[-1], u'ALTER INDEX IX_C ACTIVE')
+
+    def test_stagetabellen_nach_rollback(self):
+        """Die temporaeren Tabellen werden auch nach einem Rollback entfernt, ein Fehler beim
+        Entfernen einer Tabelle verhindert das Entfernen der uebrigen nicht."""
+        anweisung = self.writer.merge('SCHACHT', ('NAME', 'SOHLHOEHE'))
+        anweisung.execute(('S1', 9.5))
+        self.writer.rollback()
+        self.assertEqual(self.writer.stagetabellen, [u'QKAN_STAGE_SCHACHT'])
+        self.writer.stagetabellen_entfernen()
+        self.assertEqual(self.writer.stagetabellen, [])
+        self.dbHE.curfb.execute(u"SELECT COUNT(*) FROM sqlite_temp_master WHERE name = 'QKAN_STAGE_SCHACHT'")
+        self.assertEqual(self.dbHE.curfb.fetchone()[0], 0)
+
+        ausgefuehrt = []
+
+        def ddl(sql):
+            ausgefuehrt.append(sql)
+            if sql == u'DROP TABLE IF EXISTS QKAN_STAGE_A':
+                raise RuntimeError(u'gesperrt')
+
+        self.writer.ddl = ddl
+        self.writer.stagetabellen = [u'QKAN_STAGE_A', u'QKAN_STAGE_B']
+        with self.assertRaises(RuntimeError):
+            self.writer.stagetabellen_entfernen()
+        self.assertEqual(ausgefuehrt, [u'DROP TABLE IF EXISTS QKAN_STAGE_A',
+                                       u'DROP TABLE IF EXISTS QKAN_STAGE_B'])
+        self.assertEqual(self.writer.stagetabellen, [])
+
+
+class _Cursor(object):
+    """Cursor, der die ausgefuehrten Anweisungen aufzeichnet."""
+
+    def __init__(self):
+        self.aufrufe = []
+
+    def execute(self, sql, parameter=()):
+        self.aufrufe.append((sql, list(parameter)))
+
+
+class HEExecuteBlockTest(unittest.TestCase):
+    """Test der Aufteilung auf EXECUTE BLOCK-Anweisungen."""
+
+    def test_text(self):
+        """Je Datensatz eine Anweisung mit eigenen Parametern."""
+        bloecke = HEExecuteBlock(u'INSERT INTO SCHACHT (NAME, ID) VALUES (?, ?)', [u'VARCHAR(30)', u'INTEGER'])
+        self.assertEqual(bloecke.text(2), u'EXECUTE BLOCK (P0 VARCHAR(30) = ?, P1 INTEGER = ?, '
+                                          u'P2 VARCHAR(30) = ?, P3 INTEGER = ?)\nAS BEGIN\n'
+                                          u'  INSERT INTO SCHACHT (NAME, ID) VALUES (:P0, :P1);\n'
+                                          u'  INSERT INTO SCHACHT (NAME, ID) VALUES (:P2, :P3);\nEND')
+
+    def test_grenzen(self):
+        """Breite Datensaetze ergeben kleinere Bloecke innerhalb der Grenzen von Firebird."""
+        schmal = HEExecuteBlock(u'INSERT INTO T (A, B) VALUES (?, ?)', [u'INTEGER', u'DOUBLE PRECISION'])
+        breit = HEExecuteBlock(u'INSERT INTO T ({}) VALUES ({})'.format(
+            u', '.join([u'SPALTE{}'.format(i) for i in range(40)]), u', '.join([u'?'] * 40)),
+            [u'VARCHAR(80)'] * 40)
+        self.assertLess(breit.max_zeilen, schmal.max_zeilen)
+        for bloecke in (schmal, breit):
+            self.assertTrue(bloecke.passt(bloecke.max_zeilen))
+            self.assertTrue(bloecke.max_zeilen == HEExecuteBlock.MAX_ZEILEN or not bloecke.passt(bloecke.max_zeilen + 1))
+            self.assertLessEqual(len(bloecke.text(bloecke.max_zeilen)), HEExecuteBlock.MAX_ANWEISUNG)
+
+    def test_schreiben(self):
+        """Alle Datensaetze werden in Bloecken der Stufen in der Reihenfolge geschrieben."""
+        bloecke = HEExecuteBlock(u'INSERT INTO SCHACHT (NAME, ID) VALUES (?, ?)', [u'VARCHAR(30)', u'INTEGER'])
+        cursor = _Cursor()
+        puffer = [(u'S{}'.format(i), i) for i in range(100)]
+        bloecke.schreiben(cursor, puffer)
+        parameter = []
+        for sql, werte in cursor.aufrufe:
+            zeilen = sql.count(u'INSERT')
+            self.assertIn(zeilen, bloecke.stufen)
+            self.assertEqual(len(werte), 2 * zeilen)
+            parameter.extend(werte)
+        self.assertEqual(parameter, [wert for zeile in puffer for wert in zeile])
+        self.assertLess(len(cursor.aufrufe), 20)
+
+    def test_anpassung(self):
+        """Bei hoher Latenz waechst der Block bis zur Grenze, bei Kosten je Block bleibt er klein."""
+        bloecke = HEExecuteBlock(u'INSERT INTO T (A) VALUES (?)', [u'INTEGER'])
+        for i in range(20):
+            bloecke.messen(bloecke.zeilen, 0.01 + bloecke.zeilen * 1e-5)
+        self.assertEqual(bloecke.zeilen, bloecke.max_zeilen)
+
+        bloecke = HEExecuteBlock(u'INSERT INTO T (A) VALUES (?)', [u'INTEGER'])
+        for i in range(20):
+            bloecke.messen(bloecke.zeilen, bloecke.zeilen * 1e-4 * (1 + bloecke.zeilen / 16.))
+        self.assertLessEqual(bloecke.zeilen, HEExecuteBlock.START)
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(HEWriterTest)
+    suite.addTests(unittest.makeSuite(HEExecuteBlockTest))
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
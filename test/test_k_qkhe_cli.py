@@ -0,0 +1,57 @@
+# coding=utf-8
+"""Kommandozeile test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import io
+import json
+import unittest
+
+from exportoptionen import STANDARD_OPTIONEN, ZUSATZOPTIONEN
+from k_qkhe_cli import Konsolenausgabe, parameter, textausgabe
+
+
+class KonsolenausgabeTest(unittest.TestCase):
+    """Test der Ausgabe auf umgeleitete Stroeme."""
+
+    def test_bytestrom(self):
+        """Umlaute werden in einen Bytestrom (umgeleitetes stdout unter Python 2) als UTF-8 geschrieben."""
+        strom = io.BytesIO()
+        ausgabe = Konsolenausgabe(ausgabe=strom)
+        ausgabe.fortschritt(u'Anzahl Schächte: 12', 0.1)
+        ausgabe.fehlermeldung(u'Fehler', u'Fläche ungültig', 0)
+        text = strom.getvalue().decode('utf-8')
+        self.assertIn(u'Anzahl Schächte: 12', text)
+        self.assertIn(u'Fläche ungültig', text)
+
+        strom = io.BytesIO()
+        Konsolenausgabe(json_ausgabe=True, ausgabe=strom).fortschritt(u'Anzahl Schächte', 0.5)
+        self.assertEqual(json.loads(strom.getvalue().decode('utf-8'))['text'], u'Anzahl Schächte')
+
+    def test_textstrom(self):
+        """Textstroeme im Speicher werden unveraendert verwendet."""
+        strom = io.StringIO()
+        self.assertIs(textausgabe(strom), strom)
+
+    def test_optionen(self):
+        """Die Exportoptionen werden aus der gemeinsamen Tabelle ergaenzt und durch Argumente ueberschrieben."""
+        check_export = parameter(optionen={'pipeline': 2, 'init_haltungen': True})['check_export']
+        self.assertEqual(set(check_export), set(STANDARD_OPTIONEN))
+        self.assertEqual(check_export['pipeline'], 2)
+        self.assertTrue(check_export['init_haltungen'])
+        self.assertFalse(check_export['verschneidungscache'])
+        self.assertTrue(all(name in STANDARD_OPTIONEN for name, standard, text in ZUSATZOPTIONEN))
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(KonsolenausgabeTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,74 @@
+# coding=utf-8
+"""Synthetisches Kanalnetz test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = 'hoettges@fh-aachen.de'
+__date__ = '2017-10-17'
+__copyright__ = 'Copyright 2017, Jörg Höttge/FH Aachen'
+
+import unittest
+
+from qkan_testnetz import Testnetz, EINFUEGEN
+
+
+def _tabellen(netz):
+    tabellen = dict((tabelle, []) for tabelle, _, _ in EINFUEGEN)
+    for daten in netz.datensaetze():
+        for tabelle, zeilen in daten.items():
+            tabellen[tabelle].extend(zeilen)
+    return tabellen
+
+
+class TestnetzTest(unittest.TestCase):
+    """Test des Netzgenerators ohne SpatiaLite."""
+
+    def test_topologie(self):
+        """Jeder Schacht entwaessert ueber die Haltungen zu einem Auslass."""
+        netz = Testnetz(schaechte=500, speicher=5, auslaesse=3, anteil_aufteilen=0.5)
+        tabellen = _tabellen(netz)
+        schachttyp = dict((zeile[0], zeile[8]) for zeile in tabellen['schaechte'])
+        unten = dict((zeile[1], zeile[2]) for zeile in tabellen['haltungen'])
+        self.assertEqual(len(tabellen['haltungen']), 500)
+        self.assertEqual(len(tabellen['tezg']), 500)
+        self.assertEqual(sorted(schachttyp.values()).count(u'Auslass'), 3)
+        self.assertEqual(sorted(schachttyp.values()).count(u'Speicher'), 5)
+        for schnam in schachttyp:
+            weg = 0
+            while schachttyp[schnam] != u'Auslass':
+                schnam = unten[schnam]
+                weg += 1
+                self.assertLess(weg, 500)
+
+        speicher = set(zeile[0] for zeile in tabellen['speicherkennlinien'])
+        self.assertEqual(speicher, set(s for s, typ in schachttyp.items() if typ == u'Speicher'))
+
+        # Jede Flaeche hat eine linkfl, zu verschneidende Flaechen je Teil eine
+        aufteilen = [zeile[0] for zeile in tabellen['flaechen'] if zeile[10] == u'ja']
+        self.assertTrue(aufteilen)
+        linkfl = {}
+        for zeile in tabellen['linkfl']:
+            linkfl[zeile[0]] = linkfl.get(zeile[0], 0) + 1
+        for zeile in tabellen['flaechen']:
+            self.assertEqual(linkfl[zeile[0]], 2 if zeile[10] == u'ja' else 1)
+
+    def test_reproduzierbar(self):
+        """Gleicher Startwert, gleiches Netz."""
+        self.assertEqual(_tabellen(Testnetz(schaechte=200, seed=7)), _tabellen(Testnetz(schaechte=200, seed=7)))
+        self.assertNotEqual(_tabellen(Testnetz(schaechte=200, seed=7)), _tabellen(Testnetz(schaechte=200, seed=8)))
+
+    def test_fuer_objekte(self):
+        """Die Gesamtzahl der Objekte entspricht etwa der Vorgabe."""
+        tabellen = _tabellen(Testnetz.fuer_objekte(10000))
+        anzahl = sum(len(tabellen[t]) for t in ('schaechte', 'haltungen', 'tezg', 'flaechen', 'linkfl'))
+        self.assertAlmostEqual(anzahl / 10000., 1., delta=0.1)
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TestnetzTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)